@@ -1,18 +1,36 @@
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from datetime import datetime, date
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.urls import replace_query_param
+from datetime import datetime, date, timedelta
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from booking.authentication import CachedJWTAuthentication
+from booking.instrumentation import phase, registry
+from booking.middleware import instrumentation_settings
 from booking.orm_manager.booking_manager import BookingManager
 from booking.orm_manager.team_manager import TeamManager
+from booking.orm_manager.usage_manager import UsageManager
 from booking.orm_manager.user_manager import UserManager
 from booking.permissions import IsAdminUserCustom
+from booking.models import RoomClosure
 from booking.serializers import BookingSerializer, AdminBookingSerializer, TeamSerializer, UserSerializer, \
-    CustomTokenObtainPairSerializer
+    CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, RoomClosureSerializer
+from booking.services.availability_events import AvailabilityEvents
+from booking.services.booking_request import BookingError, SiteTable
+from booking.services.closure_service import ClosureService
+from booking.services.idempotency_service import IdempotencyService
 from booking.services.redis_booking_service import RedisBookingService
+from booking.services.upcoming_bookings import UpcomingBookingsService
+from booking.services.waitlist_service import WaitlistService
+from booking.services.write_behind_service import WriteBehindService, write_behind_settings
+from booking.throttling import BOOKING_WRITE_THROTTLES, admission_control
+from booking.tokens import RedisBlacklistRefreshToken
 from booking.utils import StandardResultsSetPagination
 
 
@@ -23,6 +41,7 @@ class AvailableSlotsView(APIView):
 
        GET Params:
            - date (optional): Date in 'YYYY-MM-DD' format. Defaults to today's date.
+           - site (optional): Site code. Defaults to the main site.
 
        Response:
            A structured list of available rooms and types per time slot.
@@ -30,11 +49,80 @@ class AvailableSlotsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        date_str = request.data.get("date")
-        query_date = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else date.today()
-        available_slots = BookingManager.get_available_slots_for_date(query_date)
+        date_str = request.query_params.get("date")
+        try:
+            query_date = datetime.strptime(date_str, "%Y-%m-%d").date() if date_str else date.today()
+        except ValueError:
+            return Response({"detail": "Invalid date format. Expected YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        site = SiteTable.get(request.query_params.get("site"))
+        if site is None:
+            return Response({"detail": "Invalid site"}, status=status.HTTP_400_BAD_REQUEST)
+        with phase("availability"):
+            available_slots = BookingManager.get_available_slots_for_date(query_date, site)
         return Response(available_slots)
 
+class AvailabilityStreamView(View):
+    """
+       Server-sent event stream of availability changes for the given dates.
+       Each event carries the new value of one (date, slot, room type, room)
+       counter whenever a booking or cancellation changes it. Each open
+       stream holds a worker thread for up to AvailabilityEvents.MAX_SECONDS,
+       after which the client reconnects.
+
+       GET Params:
+           - dates: Comma separated dates in 'YYYY-MM-DD' format.
+           - site (optional): Site code; defaults to the main site.
+           - token (optional): Access token, for clients such as EventSource
+             that cannot send an Authorization header.
+
+       Response:
+           text/event-stream of "availability" events.
+    """
+    MAX_DATES = 14
+
+    @staticmethod
+    def _authenticate(request):
+        authentication = CachedJWTAuthentication()
+        raw_token = request.GET.get("token")
+        if not raw_token:
+            header = authentication.get_header(request)
+            raw_token = authentication.get_raw_token(header) if header else None
+        if not raw_token:
+            return None
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    def get(self, request):
+        user = self._authenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."},
+                                status=status.HTTP_401_UNAUTHORIZED)
+
+        date_strs = [d for d in request.GET.get("dates", "").split(",") if d]
+        if not date_strs or len(date_strs) > self.MAX_DATES:
+            return JsonResponse({"detail": f"Provide between 1 and {self.MAX_DATES} dates."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_strs = [datetime.strptime(d, "%Y-%m-%d").date().isoformat() for d in date_strs]
+        except ValueError:
+            return JsonResponse({"detail": "Invalid date format. Expected YYYY-MM-DD"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        site = SiteTable.get(request.GET.get("site"))
+        if site is None:
+            return JsonResponse({"detail": "Invalid site"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            AvailabilityEvents.stream(site.code, date_strs), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 class CreateBookingView(APIView):
     """
        Create a booking for a selected room and time slot.
@@ -45,30 +133,202 @@ class CreateBookingView(APIView):
                "date": "YYYY-MM-DD",
                "team_name": "Team Alpha",
                "room_type": "private",
-               "room_name": "p1"
+               "room_name": "p1",
+               "site": "hq"  (optional, defaults to the main site),
+               "near_team": "Team Alpha"  (optional, shared rooms: sit next to members of this team)
            }
 
+       Shared-room bookings are given a seat, listed with the booking.
+
+       Headers:
+           - Idempotency-Key (optional): Retries with the same key and body get the first
+             response back instead of booking again, without counting against the rate limits.
+
        Response:
            - booking_id: ID of the created booking.
            - message: Confirmation or error message.
+           - On a rejected request: 400 with `error` and a stable `code` (e.g. "already_booked",
+             "slot_started", "unavailable").
+           - In write-behind mode: 202 with a `reference` to poll at bookings/status/<reference>/
+             instead of booking_id.
+           - 429 with Retry-After when a rate limit or the in-flight booking cap is hit.
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = BOOKING_WRITE_THROTTLES
+
+    def check_throttles(self, request):
+        # A retry is answered from the stored response before the rate limits, so it spends no tokens.
+        self.idempotency_key = request.headers.get("Idempotency-Key")
+        self.replay = None
+        if not self.idempotency_key or len(self.idempotency_key) > 255:
+            return super().check_throttles(request)
+
+        self.fingerprint = IdempotencyService.fingerprint(request.data)
+        self.replay = IdempotencyService.begin(
+            user_id=request.user.id, idempotency_key=self.idempotency_key, fingerprint=self.fingerprint
+        )
+        if self.replay is not None:
+            return None
+        try:
+            return super().check_throttles(request)
+        except BaseException:
+            IdempotencyService.abandon(user_id=request.user.id, idempotency_key=self.idempotency_key)
+            raise
 
     def post(self, request):
+        idempotency_key = self.idempotency_key
+        if not idempotency_key:
+            return self._book(request)
+        if len(idempotency_key) > 255:
+            return Response({"error": "Idempotency-Key must be at most 255 characters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if self.replay is not None:
+            replay_status, body = self.replay
+            return Response(body, status=replay_status)
+
+        try:
+            response = self._book(request)
+        except BaseException:
+            IdempotencyService.abandon(user_id=request.user.id, idempotency_key=idempotency_key)
+            raise
+        IdempotencyService.complete(
+            user_id=request.user.id, idempotency_key=idempotency_key, fingerprint=self.fingerprint,
+            status=response.status_code, body=response.data,
+        )
+        return response
+
+    @staticmethod
+    def _book(request):
+        with admission_control("book_room"):
+            return CreateBookingView._book_admitted(request)
+
+    @staticmethod
+    def _book_admitted(request):
         try:
             user = request.user
             data = request.data
             BookingManager.create_rooms()
-            booking_id, message = RedisBookingService.book_room(user=user, data=data)
+            if write_behind_settings()["ENABLED"]:
+                with phase("book_room"):
+                    reference, message = WriteBehindService.book_room(user=user, data=data)
+                return Response({'booking_id': None, 'reference': reference, 'message': message},
+                                status=status.HTTP_202_ACCEPTED if reference else status.HTTP_200_OK)
+            with phase("book_room"):
+                booking_id, message = RedisBookingService.book_room(user=user, data=data)
             return Response({'booking_id': booking_id, 'message': message})
 
+        except BookingError as e:
+            return Response({"error": str(e), "code": e.code}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+class BookingStatusView(APIView):
+    """
+       Confirmation status of a booking made in write-behind mode.
+
+       URL Param:
+           - reference: Reference returned by book-room.
+
+       Response:
+           - status: PENDING, CONFIRMED or FAILED.
+           - booking_id: ID of the booking once confirmed.
+           - error: Reason the booking could not be written, if FAILED.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, reference):
+        result = WriteBehindService.get_status(reference, request.user)
+        if result is None:
+            return Response({"detail": "Unknown booking reference."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result)
+
+
+class WaitlistJoinView(APIView):
+    """
+       Join the waitlist for a fully booked slot. When a booking for the same
+       date, slot and room type is cancelled, the head of the queue is booked
+       automatically and notified.
+
+       Request body:
+           Same as book-room.
+
+       Response:
+           - position: 1-based position in the waitlist.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = BOOKING_WRITE_THROTTLES
+
+    def post(self, request):
+        try:
+            position = WaitlistService.join(user=request.user, data=request.data)
+            return Response({'position': position, 'message': "Added to the waitlist"})
+
+        except BookingError as e:
+            return Response({"error": str(e), "code": e.code}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class WaitlistLeaveView(APIView):
+    """
+    Leave the waitlist for a slot.
+
+    Request body:
+        {
+            "slot_id": int,
+            "date": "YYYY-MM-DD",
+            "room_type": "private",
+            "site": "hq"  (optional),
+            "team_name": "Team Alpha"  (optional)
+        }
+
+    Response:
+        - Success or error message.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        date_str = request.data.get('date')
+        slot_id = request.data.get('slot_id')
+        room_type = request.data.get('room_type')
+
+        if not all([date_str, slot_id, room_type]):
+            return Response({"detail": "date, slot_id and room_type are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        result = WaitlistService.leave(
+            user=request.user, site_code=request.data.get('site') or settings.BOOKING_DEFAULT_SITE,
+            date_str=date_str, slot_id=slot_id, room_type=room_type,
+            team_name=request.data.get('team_name')
+        )
+
+        if "error" in result:
+            return Response({"detail": result["error"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"detail": result["success"]}, status=status.HTTP_200_OK)
+
+
+class NotificationsView(APIView):
+    """
+    Retrieve and clear pending notifications (e.g. waitlist promotions) for the logged-in user.
+
+    Response:
+        - List of notifications, newest first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"notifications": WaitlistService.pop_notifications(request.user.id)})
+
+
 class BookingHistoryView(APIView):
     """
     Retrieve paginated booking history for the logged-in user.
 
+    Query Params:
+        - include_archived (optional): "true" to also return bookings moved to the archive.
+
     Response:
         - Paginated list of past bookings (individual or team).
     """
@@ -77,14 +337,52 @@ class BookingHistoryView(APIView):
 
     def get(self, request):
         try:
-            bookings = BookingManager.get_user_bookings(request.user)
+            include_archived = request.query_params.get('include_archived') == 'true'
+            bookings = BookingManager.get_user_bookings(request.user, include_archived=include_archived)
             paginator = StandardResultsSetPagination()
             result_page = paginator.paginate_queryset(bookings, request)
-            serializer = BookingSerializer(result_page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            with phase("serialize"):
+                data = BookingSerializer(result_page, many=True).data
+            return paginator.get_paginated_response(data)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class UpcomingBookingsView(APIView):
+    """
+    Upcoming bookings of the logged-in user, individual and team, in date and slot order.
+
+    Query Params:
+        - cursor (optional): "next_cursor" of the previous page.
+        - page_size (optional): Bookings per page, up to 100. Defaults to 10.
+
+    Response:
+        {
+            "next": URL of the next page, or null,
+            "next_cursor": cursor of the next page, or null,
+            "results": [...]
+        }
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_PAGE_SIZE = 100
+
+    def get(self, request):
+        try:
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+            page_size = min(int(request.query_params.get('page_size') or 10), self.MAX_PAGE_SIZE)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            return Response({"detail": "Invalid cursor or page_size"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with phase("upcoming"):
+            page = UpcomingBookingsService.get(request.user, after=cursor, limit=page_size)
+        next_url = None
+        if page["next_cursor"] is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', page["next_cursor"])
+        return Response({"next": next_url, **page})
+
+
 class AllBookingsView(APIView):
     """
     Admin only: Retrieve paginated list of all bookings in the system.
@@ -92,6 +390,9 @@ class AllBookingsView(APIView):
     Requires:
         - Admin permissions.
 
+    Query Params:
+        - include_archived (optional): "true" to also return bookings moved to the archive.
+
     Response:
         - Paginated list of all bookings with user/team details.
     """
@@ -99,15 +400,143 @@ class AllBookingsView(APIView):
 
     def get(self, request):
         try:
-            bookings = BookingManager.get_all_bookings()
+            include_archived = request.query_params.get('include_archived') == 'true'
+            bookings = BookingManager.get_all_bookings(include_archived=include_archived)
             paginator = StandardResultsSetPagination()
             result_page = paginator.paginate_queryset(bookings, request)
-            serializer = AdminBookingSerializer(result_page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            with phase("serialize"):
+                data = AdminBookingSerializer(result_page, many=True).data
+            return paginator.get_paginated_response(data)
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class UtilizationAnalyticsView(APIView):
+    """
+    Admin only: Booking counts and utilization over a date range, served from the daily rollups.
+
+    Query Params:
+        - start_date, end_date: 'YYYY-MM-DD', inclusive. Default to the last 30 days.
+        - room_type (optional): Restrict to one room type.
+        - site (optional): Restrict to one site code.
+        - group_by (optional): "day" (default, per day and room type) or "room".
+
+    Response:
+        - {"results": [...]} with bookings, cancellations, team/individual bookings,
+          active bookings and utilization for each group.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserCustom]
+
+    def get(self, request):
+        try:
+            end_str = request.query_params.get("end_date")
+            start_str = request.query_params.get("start_date")
+            end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else date.today()
+            start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else end_date - timedelta(days=29)
+            results = UsageManager.utilization(
+                start_date=start_date,
+                end_date=end_date,
+                room_type=request.query_params.get("room_type"),
+                site_code=request.query_params.get("site"),
+                group_by=request.query_params.get("group_by", "day"),
+            )
+            return Response({"results": results})
+        except Exception as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RoomClosureView(APIView):
+    """
+    Admin only: List, create or lift room closures (blackout windows).
+
+    A closure covers every combination of the selected rooms, dates and slots.
+
+    GET Params:
+        - site (optional), start_date, end_date (optional, 'YYYY-MM-DD').
+
+    Request body (POST closes, DELETE reopens):
+        {
+            "site": "hq"  (optional),
+            "start_date": "YYYY-MM-DD",
+            "end_date": "YYYY-MM-DD"  (optional, defaults to start_date),
+            "rooms": ["P1", "P2"]  (optional),
+            "floor": "Ground"  (optional),
+            "room_type": "private"  (optional),
+            "slot_ids": [1, 2]  (optional, defaults to all active slots),
+            "reason": "Maintenance"  (POST only, optional),
+            "cancel_bookings": true  (POST only, optional)
+        }
+
+    Response:
+        - POST: counts of closed and already closed cells, and the ids of cancelled or
+          conflicting bookings.
+        - DELETE: the number of cells reopened.
+        - On an invalid request: 400 with `detail` and a stable `code` (e.g. "invalid_window",
+          "too_many_cells").
+    """
+    permission_classes = [IsAuthenticated, IsAdminUserCustom]
+
+    @staticmethod
+    def _selection(data):
+        site = SiteTable.get(data.get("site"))
+        if site is None:
+            raise BookingError("invalid_site", "Invalid site")
+        start_str = data.get("start_date")
+        if not start_str:
+            raise BookingError("missing_fields", "start_date is required.")
+        end_str = data.get("end_date")
+        try:
+            start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else start_date
+        except (TypeError, ValueError):
+            raise BookingError("invalid_date", "Invalid date format. Expected YYYY-MM-DD")
+        return {
+            "site": site,
+            "start_date": start_date,
+            "end_date": end_date,
+            "room_names": data.get("rooms"),
+            "floor": data.get("floor"),
+            "room_type": data.get("room_type"),
+            "slot_ids": data.get("slot_ids"),
+        }
+
+    def get(self, request):
+        try:
+            site = SiteTable.get(request.query_params.get("site"))
+            if site is None:
+                raise BookingError("invalid_site", "Invalid site")
+            closures = RoomClosure.objects.select_related('room', 'time_slot', 'created_by').filter(
+                room__site=site
+            ).order_by('date', 'time_slot__start_time', 'room__name')
+            if request.query_params.get("start_date"):
+                closures = closures.filter(date__gte=request.query_params["start_date"])
+            if request.query_params.get("end_date"):
+                closures = closures.filter(date__lte=request.query_params["end_date"])
+            paginator = StandardResultsSetPagination()
+            result_page = paginator.paginate_queryset(closures, request)
+            return paginator.get_paginated_response(RoomClosureSerializer(result_page, many=True).data)
+        except Exception as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def post(self, request):
+        try:
+            result = ClosureService.close(
+                user=request.user, reason=request.data.get("reason", ""),
+                cancel_bookings=bool(request.data.get("cancel_bookings")),
+                **self._selection(request.data),
+            )
+            return Response(result, status=status.HTTP_201_CREATED)
+        except BookingError as e:
+            return Response({"detail": str(e), "code": e.code}, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request):
+        try:
+            reopened = ClosureService.reopen(**self._selection(request.data))
+            return Response({"reopened": reopened})
+        except BookingError as e:
+            return Response({"detail": str(e), "code": e.code}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class CustomTokenView(TokenObtainPairView):
     """
     Refresh the access token using the refresh token.
@@ -126,7 +555,7 @@ class CustomTokenView(TokenObtainPairView):
 
 
 class CustomTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = CustomTokenRefreshSerializer
 
 class CancelBookingView(APIView):
     """
@@ -139,6 +568,7 @@ class CancelBookingView(APIView):
         - Success or error message.
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = BOOKING_WRITE_THROTTLES
 
     def post(self, request, booking_id):
         result = BookingManager.cancel_booking(booking_id, request.user)
@@ -171,7 +601,7 @@ class LogoutView(APIView):
             return Response({"detail": "refresh token is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            token = RefreshToken(refresh_token)
+            token = RedisBlacklistRefreshToken(refresh_token)
             token.blacklist()
             return Response({"detail": "Logout successful."}, status=status.HTTP_200_OK)
         except Exception:
@@ -337,4 +767,18 @@ class ActivateUserView(APIView):
         if "error" in result:
             return Response({"detail": result["error"]}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"detail": result["success"]}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"detail": result["success"]}, status=status.HTTP_200_OK)
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint for the request, DB and Redis counters of the worker that serves it.
+
+    Requires "Authorization: Bearer <METRICS_TOKEN>" when BOOKING_INSTRUMENTATION["METRICS_TOKEN"] is set.
+    """
+
+    def get(self, request):
+        token = instrumentation_settings()["METRICS_TOKEN"]
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
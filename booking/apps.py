@@ -1,6 +1,57 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+from django.db.models.signals import post_migrate
+
+
+def _is_test_database(connection):
+    name = str(connection.settings_dict["NAME"])
+    if connection.vendor == "sqlite" and connection.creation.is_in_memory_db(name):
+        return True
+    return name == connection.settings_dict.get("TEST", {}).get("NAME") or name.startswith(TEST_DATABASE_PREFIX)
+
+
+def _fully_migrated(connection):
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    return not executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def seed_redis_after_migrate(sender, using=DEFAULT_DB_ALIAS, verbosity=1, stdout=None, plan=None, apps=None,
+                             **kwargs):
+    """
+    Seed Redis availability for the booking horizon once `migrate` has brought the database up
+    to date, or queue the seeding for the next startup if Redis cannot be reached.
+
+    Skipped for `flush` (which sends no plan), backward or partial migrations, schemas without
+    the booking tables, and test databases.
+    """
+    if not settings.BOOKING_REDIS_SEED_AFTER_MIGRATE or using != DEFAULT_DB_ALIAS:
+        return
+    if plan is None or any(backwards for _, backwards in plan):
+        return
+    try:
+        apps.get_model("booking", "Site")
+    except (AttributeError, LookupError):
+        return
+    connection = connections[using]
+    if _is_test_database(connection) or not _fully_migrated(connection):
+        return
+    from booking.services import redis_setup
+
+    seeded = redis_setup.seed_when_reachable()
+    if verbosity >= 1 and stdout is not None:
+        if seeded is None:
+            stdout.write("Redis or the database unavailable: availability seeding queued for the next startup.\n")
+        else:
+            stdout.write(f"Redis availability seeded for {len(seeded)} site day(s).\n")
 
 
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'booking'
+
+    def ready(self):
+        post_migrate.connect(seed_redis_after_migrate, sender=self)
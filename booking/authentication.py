@@ -0,0 +1,86 @@
+import json
+from datetime import date
+
+import redis
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from booking.models import User
+from booking.redis_config import redis_client
+
+
+class ActiveUserCache:
+    """
+    Short-lived cache of the user fields that the access token does not carry.
+
+    Entries are dropped by UserManager when a user is activated or deactivated, and the TTL
+    bounds staleness for any other change.
+    """
+    TTL = 60
+
+    @staticmethod
+    def _key(user_id):
+        return f"auth_user/{user_id}"
+
+    @staticmethod
+    def get(user_id):
+        try:
+            cached = redis_client.get(ActiveUserCache._key(user_id))
+        except redis.RedisError:
+            cached = None
+        if cached is not None:
+            return json.loads(cached)
+
+        row = User.objects.filter(id=user_id).values("is_active", "dob", "username", "is_admin").first()
+        if row is None:
+            return None
+        row["dob"] = row["dob"].isoformat() if row["dob"] else None
+        try:
+            redis_client.set(ActiveUserCache._key(user_id), json.dumps(row), ex=ActiveUserCache.TTL)
+        except redis.RedisError:
+            pass
+        return row
+
+    @staticmethod
+    def invalidate(user_id):
+        try:
+            redis_client.delete(ActiveUserCache._key(user_id))
+        except redis.RedisError:
+            # An unreachable cache cannot serve the stale entry either; get() falls back to the DB.
+            pass
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token claims and ActiveUserCache
+    instead of loading the User row on every request.
+
+    The returned User is an unsaved-looking instance with only id, username, is_admin,
+    is_active and dob populated. It can be used for permission checks and as a foreign key
+    value, but must not be saved.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed(_("Token contained no recognizable user identification"))
+
+        cached = ActiveUserCache.get(user_id)
+        if cached is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not cached["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        user = User(
+            id=user_id,
+            username=validated_token.get("username", cached["username"]),
+            is_admin=validated_token.get("is_admin", cached["is_admin"]),
+            is_active=True,
+            dob=date.fromisoformat(cached["dob"]) if cached["dob"] else None,
+        )
+        user._state.adding = False
+        user._state.db = User.objects.db
+        return user
@@ -0,0 +1,86 @@
+import random
+import time as clock
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+
+from booking.models import User, Team, TeamMember, Room, Site, TimeSlot, Booking
+from booking.services.redis_setup import generate_time_slots
+
+
+BENCHMARK_PREFIX = "bench"
+
+
+def seed_benchmark_data(*, users, teams, team_size, rooms_per_type, slot_minutes, history_days, bookings_per_day,
+                        future_days=0, cancelled_ratio=0.1, seed=0):
+    """
+    Populate the (empty, throwaway) database with a synthetic workload.
+
+    Returns the row counts and the wall time spent per table so seeding throughput
+    can be tracked alongside the other benchmarks.
+    """
+    rng = random.Random(seed)
+    timings = {}
+    password = make_password(None)
+
+    started = clock.perf_counter()
+    User.objects.bulk_create([
+        User(username=f"{BENCHMARK_PREFIX}_user{i}", email=f"{BENCHMARK_PREFIX}_user{i}@example.com",
+             password=password, dob=date(1990, 1, 1))
+        for i in range(users)
+    ], batch_size=1000)
+    user_ids = list(User.objects.filter(username__startswith=f"{BENCHMARK_PREFIX}_user").values_list("id", flat=True))
+    timings["users"] = clock.perf_counter() - started
+
+    started = clock.perf_counter()
+    Team.objects.bulk_create([
+        Team(name=f"{BENCHMARK_PREFIX}_team{i}", team_lead_id=rng.choice(user_ids)) for i in range(teams)
+    ], batch_size=1000)
+    team_ids = list(Team.objects.filter(name__startswith=f"{BENCHMARK_PREFIX}_team").values_list("id", flat=True))
+    TeamMember.objects.bulk_create([
+        TeamMember(team_id=team_id, user_id=user_id)
+        for team_id in team_ids
+        for user_id in rng.sample(user_ids, min(team_size, len(user_ids)))
+    ], batch_size=1000, ignore_conflicts=True)
+    timings["teams"] = clock.perf_counter() - started
+
+    started = clock.perf_counter()
+    site = Site.objects.create(code=BENCHMARK_PREFIX, name="Benchmark site")
+    Room.objects.bulk_create([
+        Room(site=site, name=f"{room_type[0].upper()}{i}", room_type=room_type,
+             capacity=1 if room_type != "shared" else 4)
+        for room_type, _ in Room.ROOM_TYPES
+        for i in range(1, rooms_per_type + 1)
+    ])
+    generate_time_slots(slot_minutes=slot_minutes)
+    room_ids = list(Room.objects.filter(site=site).values_list("id", flat=True))
+    slot_ids = list(TimeSlot.objects.values_list("id", flat=True))
+    timings["rooms_and_slots"] = clock.perf_counter() - started
+
+    started = clock.perf_counter()
+    cells = [(room_id, slot_id) for room_id in room_ids for slot_id in slot_ids]
+    per_day = min(bookings_per_day, len(cells))
+    bookings = []
+    # Past history plus upcoming bookings from the day after tomorrow on (tomorrow is left to the storm).
+    offsets = [-offset for offset in range(1, history_days + 1)] + list(range(2, future_days))
+    for offset in offsets:
+        booking_date = date.today() + timedelta(days=offset)
+        for room_id, slot_id in rng.sample(cells, per_day):
+            cancelled = rng.random() < cancelled_ratio
+            bookings.append(Booking(
+                room_id=room_id, time_slot_id=slot_id, booked_by_user_id=rng.choice(user_ids), date=booking_date,
+                status="CANCELLED" if cancelled else "ACTIVE",
+            ))
+    Booking.objects.bulk_create(bookings, batch_size=1000)
+    timings["bookings"] = clock.perf_counter() - started
+
+    return {
+        "counts": {
+            "users": len(user_ids),
+            "teams": len(team_ids),
+            "rooms": len(room_ids),
+            "slots": len(slot_ids),
+            "bookings": len(bookings),
+        },
+        "seconds": timings,
+    }
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+from booking.benchmarks.runner import summarize
+
+
+def login(base_url, username, password):
+    """
+    An access token for `username`, from the login endpoint.
+    """
+    request = urllib.request.Request(
+        f"{base_url}/api/login/",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["access"]
+
+
+def run_http_load(urls, *, concurrency, duration, headers=None):
+    """
+    Send GET requests to `urls` (in turn) from `concurrency` threads for `duration` seconds.
+
+    Every thread waits for its response before sending the next request, like a client
+    with `concurrency` connections. Returns throughput, latency statistics and status counts.
+    """
+    headers = headers or {}
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [None]
+
+    def worker(offset):
+        barrier.wait()
+        sent = offset
+        while time.perf_counter() < deadline[0]:
+            request = urllib.request.Request(urls[sent % len(urls)], headers=headers)
+            sent += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as err:
+                status = err.code
+            except OSError as err:
+                status = type(err).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    started = time.perf_counter()
+    barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(count for status, count in statuses.items() if status == 200)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "ok_per_second": round(ok / elapsed, 1),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency": summarize(latencies),
+    }
@@ -0,0 +1,95 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Reduce a list of durations (seconds) to the millisecond statistics we track across commits.
+    """
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def measure(fn, iterations, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_concurrently(fn, args_list, threads):
+    """
+    Call fn(*args) for every entry in args_list from `threads` threads released at the same moment.
+
+    Returns a list of (duration, result, exception) tuples in completion order.
+    """
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+    chunks = [args_list[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        barrier.wait()
+        try:
+            for args in chunk:
+                started = time.perf_counter()
+                try:
+                    outcome, error = fn(*args), None
+                except Exception as err:
+                    outcome, error = None, err
+                with lock:
+                    results.append((time.perf_counter() - started, outcome, error))
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+@contextmanager
+def use_redis_client(client):
+    """
+    Point every loaded booking module at `client` instead of the configured Redis server.
+    """
+    from booking import redis_config
+
+    original = redis_config.redis_client
+    patched = [
+        module for name, module in list(sys.modules.items())
+        if name.startswith("booking") and getattr(module, "redis_client", None) is original
+    ]
+    for module in patched:
+        module.redis_client = client
+    try:
+        yield client
+    finally:
+        for module in patched:
+            module.redis_client = original
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from booking.benchmarks.runner import summarize
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# What a process has to import before it can do its job.
+TARGETS = {
+    # A web worker: settings, apps, the WSGI handler and the URLconf with every view.
+    "web": (
+        "import django; django.setup()\n"
+        "from django.core.wsgi import get_wsgi_application; get_wsgi_application()\n"
+        "from django.urls import resolve; resolve('/api/book-room/')\n"
+    ),
+    # A cron run of the availability seeder.
+    "cron": (
+        "import django; django.setup()\n"
+        "from django.core.management import load_command_class\n"
+        "load_command_class('booking', 'init_redis_availability')\n"
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """
+    Total import time and self time per top-level package (in microseconds) from `-X importtime` output.
+    """
+    total, packages = 0, Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+        if not name.startswith("  "):
+            total += int(cumulative_us)
+    return total, packages
+
+
+def measure_startup(target, settings_module, runs=5):
+    """
+    Start `runs` fresh interpreters that import what `target` needs, under `settings_module`.
+
+    Returns wall-clock and import-time statistics plus the packages that cost the most.
+    """
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module, "PYTHONDONTWRITEBYTECODE": "1"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BASE_DIR), env.get("PYTHONPATH")]))
+    command = [sys.executable, "-X", "importtime", "-c", TARGETS[target]]
+
+    wall, imports, packages = [], [], Counter()
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, env=env, cwd=BASE_DIR, capture_output=True, text=True)
+        wall.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise RuntimeError(f"{target} startup failed:\n{result.stderr[-2000:]}")
+        total, run_packages = parse_importtime(result.stderr)
+        imports.append(total / 1e6)
+        packages.update(run_packages)
+
+    return {
+        "settings": settings_module,
+        "wall": summarize(wall),
+        "imports": summarize(imports),
+        "top_packages_ms": {
+            package: round(self_us / runs / 1000, 1) for package, self_us in packages.most_common(10)
+        },
+    }
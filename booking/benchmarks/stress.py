@@ -0,0 +1,206 @@
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db import connection
+
+from booking.models import Booking, Room, User
+from booking.redis_config import redis_client
+from booking.orm_manager.booking_manager import BookingManager
+from booking.services import redis_setup
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import BookingError
+from booking.services.redis_booking_service import RedisBookingService
+from booking.services.seat_map import SeatMap
+from booking.services.write_behind_service import WriteBehindService
+
+
+def build_plan(*, user_ids, cells, operations, cancel_ratio, workers, seed):
+    """
+    The operations of one run, split between `workers`: ("book" or "cancel", user id, cell), where a
+    cell is (room type, room name, slot id). The same arguments always give the same plan.
+    """
+    rng = random.Random(seed)
+    ops = [
+        ("cancel" if rng.random() < cancel_ratio else "book", rng.choice(user_ids), rng.choice(cells))
+        for _ in range(operations)
+    ]
+    return [ops[worker::workers] for worker in range(workers)]
+
+
+def _execute(op, site, day, users):
+    action, user_id, (room_type, room_name, slot_id) = op
+    user = users.get(user_id)
+    if user is None:
+        user = users[user_id] = User.objects.get(id=user_id)
+
+    if action == "book":
+        data = {
+            "site": site.code, "date": day.isoformat(), "slot_id": slot_id, "room_type": room_type,
+            "room_name": room_name,
+        }
+        try:
+            booking_id, _ = RedisBookingService.book_room(user=user, data=data)
+        except BookingError as err:
+            return f"book:{err.code}"
+        return "book:ok" if booking_id is not None else "book:room_taken"
+
+    booking_id = Booking.objects.filter(
+        booked_by_user_id=user_id, date=day, time_slot_id=slot_id, status='ACTIVE'
+    ).values_list('id', flat=True).first()
+    if booking_id is None:
+        return "cancel:nothing_booked"
+    result = BookingManager.cancel_booking(booking_id, user)
+    return "cancel:ok" if "success" in result else f"cancel:{result['error']}"
+
+
+def _run_worker(ops, site, day, barrier):
+    """
+    Wait for every worker to be ready, then run `ops` back to back. Returns (duration, outcome) pairs.
+    """
+    users, results = {}, []
+    barrier.wait()
+    try:
+        for op in ops:
+            started = time.perf_counter()
+            try:
+                outcome = _execute(op, site, day, users)
+            except Exception as err:
+                outcome = f"error:{type(err).__name__}"
+            results.append((time.perf_counter() - started, outcome))
+    finally:
+        connection.close()
+    return results
+
+
+def _process_worker(ops, site, day, barrier, queue):
+    # Forked from the parent: drop its DB connection rather than share the socket.
+    connection.close()
+    queue.put(_run_worker(ops, site, day, barrier))
+
+
+def run_plan(plan, site, day, mode="threads"):
+    """
+    Run every worker's operations at once, in threads or in forked processes.
+
+    Returns the wall time and all (duration, outcome) pairs.
+    """
+    results = []
+    if mode == "threads":
+        barrier = threading.Barrier(len(plan))
+        lock = threading.Lock()
+
+        def worker(ops):
+            outcomes = _run_worker(ops, site, day, barrier)
+            with lock:
+                results.extend(outcomes)
+
+        workers = [threading.Thread(target=worker, args=(ops,)) for ops in plan]
+    else:
+        # Workers are forked, so they share the parent's settings, caches and Redis stand-in address.
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(len(plan))
+        queue = context.Queue()
+        workers = [context.Process(target=_process_worker, args=(ops, site, day, barrier, queue)) for ops in plan]
+        connection.close()
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    if mode != "threads":
+        for _ in workers:
+            results.extend(queue.get())
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started, results
+
+
+def check_invariants(site, day, user_ids):
+    """
+    Check the booking state of `day` at `site` once the dust has settled:
+
+    - every Redis counter equals the seats taken by active bookings (and closures);
+    - no room holds more active bookings than its capacity, and no whole room is booked twice;
+    - no user holds two active bookings in the same slot;
+    - each user's booking index lists exactly their active bookings;
+    - every shared-room booking holds its own seat, and each seat map marks exactly those seats
+      as taken, by their holders.
+    """
+    active = list(Booking.objects.filter(date=day, status='ACTIVE', room__site=site).values_list(
+        'id', 'room_id', 'time_slot_id', 'booked_by_user_id', 'seat'
+    ))
+    rooms = {room.id: room for room in Room.objects.filter(site=site)}
+
+    per_cell = Counter((room_id, slot_id) for _, room_id, slot_id, _, _ in active)
+    over_capacity = [
+        {"room": rooms[room_id].name, "slot_id": slot_id, "active": count, "capacity": rooms[room_id].capacity}
+        for (room_id, slot_id), count in per_cell.items() if count > rooms[room_id].capacity
+    ]
+    double_assigned = [
+        {"room": rooms[room_id].name, "slot_id": slot_id, "active": count}
+        for (room_id, slot_id), count in per_cell.items()
+        if count > 1 and rooms[room_id].room_type != Room.SHARED
+    ]
+    per_user = Counter((user_id, slot_id) for _, _, slot_id, user_id, _ in active)
+    double_booked = [
+        {"user_id": user_id, "slot_id": slot_id, "active": count}
+        for (user_id, slot_id), count in per_user.items() if count > 1
+    ]
+
+    counters = [
+        {"field": field, "redis": actual, "expected": expected}
+        for site_code, _, field, actual, expected in WriteBehindService.check_consistency([day])
+        if site_code == site.code
+    ]
+
+    booked_by_user = defaultdict(dict)
+    for booking_id, _, slot_id, user_id, _ in active:
+        booked_by_user[user_id][slot_id] = booking_id
+    index = []
+    for user_id in user_ids:
+        indexed = {
+            item["slot_id"]: item["booking_id"]
+            for item in BookingIndex.upcoming(redis_setup.booking_owner(user_id=user_id), limit=10000)
+            if item["date"] == day.isoformat()
+        }
+        if indexed != booked_by_user.get(user_id, {}):
+            index.append({"user_id": user_id, "index": indexed, "db": booked_by_user.get(user_id, {})})
+
+    seated = defaultdict(dict)
+    seat_maps = []
+    for booking_id, room_id, slot_id, user_id, seat in active:
+        if rooms[room_id].room_type != Room.SHARED:
+            continue
+        if seat is None or seat in seated[(room_id, slot_id)]:
+            seat_maps.append({"booking_id": booking_id, "seat": seat, "problem": "missing or shared seat"})
+        else:
+            seated[(room_id, slot_id)][seat] = user_id
+    # Every shared cell booked that day, cancelled bookings included, so seats left taken show up.
+    for room_id, slot_id in set(Booking.objects.filter(
+        date=day, room__site=site, room__room_type=Room.SHARED
+    ).values_list('room_id', 'time_slot_id')):
+        room = rooms[room_id]
+        bitmap = redis_client.get(redis_setup.seat_map_key(site.code, day.isoformat(), slot_id, room.name)) or b""
+        bits = {n for n in range(len(bitmap) * 8) if bitmap[n // 8] & (0x80 >> (n % 8))}
+        holders = SeatMap.holders(site.code, day.isoformat(), slot_id, room.name)
+        if bits != set(seated[(room_id, slot_id)]) or holders != seated[(room_id, slot_id)]:
+            seat_maps.append({
+                "room": room.name, "slot_id": slot_id, "bitmap": sorted(bits), "holders": holders,
+                "db": seated[(room_id, slot_id)],
+            })
+
+    violations = {
+        "counter_mismatches": counters,
+        "over_capacity": over_capacity,
+        "double_assigned_rooms": double_assigned,
+        "double_booked_users": double_booked,
+        "index_mismatches": index,
+        "seat_map_mismatches": seat_maps,
+    }
+    return {
+        "active_bookings": len(active),
+        **{name: found[:20] for name, found in violations.items()},
+        "ok": not any(violations.values()),
+    }
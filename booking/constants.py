@@ -5,7 +5,8 @@ class Constants:
     "shared": 3
     }
 
-    ROOM_CAPACITY_MAPPING = {
+    # Capacity given to rooms created by `create_site`. Bookings use each room's own capacity.
+    DEFAULT_ROOM_CAPACITY = {
         "private": 1,
         "conference": 1,
         "shared": 4
@@ -0,0 +1,162 @@
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+_current = contextvars.ContextVar("booking_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    Per-request counters filled in by the DB execute wrapper, the Redis client hook and phase().
+    """
+    __slots__ = ("started", "db_queries", "db_time", "redis_commands", "redis_round_trips", "redis_time", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.redis_commands = 0
+        self.redis_round_trips = 0
+        self.redis_time = 0.0
+        self.phases = {}
+
+    def server_timing(self, total):
+        entries = [
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.db_queries} queries"',
+            f'redis;dur={self.redis_time * 1000:.2f};desc="{self.redis_commands} commands"',
+        ]
+        entries += [f"{name};dur={duration * 1000:.2f}" for name, duration in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+    def as_dict(self, total):
+        return {
+            "total_ms": round(total * 1000, 2),
+            "db_queries": self.db_queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "redis_commands": self.redis_commands,
+            "redis_round_trips": self.redis_round_trips,
+            "redis_ms": round(self.redis_time * 1000, 2),
+            "phases_ms": {name: round(duration * 1000, 2) for name, duration in self.phases.items()},
+        }
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a named section of the current request (e.g. "serialize"). A no-op outside sampled requests.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def record_redis(duration, commands=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.redis_commands += commands
+        metrics.redis_round_trips += 1
+        metrics.redis_time += duration
+
+
+class MetricsRegistry:
+    """
+    Process-local counters and histograms rendered in the Prometheus text exposition format.
+
+    Every gunicorn worker keeps its own registry, so each series carries a `pid` label and a
+    scrape returns only the worker that served it; sum over `pid` in queries.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, help_text="", **labels):
+        with self._lock:
+            self._help.setdefault(name, (help_text, "counter"))
+            self._counters[(name, self._labels(labels))] += value
+
+    def observe(self, name, value, help_text="", **labels):
+        with self._lock:
+            self._help.setdefault(name, (help_text, "histogram"))
+            key = (name, self._labels(labels))
+            buckets, total, count = self._histograms.get(key, ([0] * len(self.BUCKETS), 0.0, 0))
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            self._histograms[key] = (buckets, total + value, count + 1)
+
+    def render(self):
+        # Read at render time: with preload_app the registry is created before the fork.
+        pid = [("pid", os.getpid())]
+
+        def fmt(labels, extra=()):
+            pairs = pid + list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, (help_text, kind) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{fmt(labels)} {value}")
+                else:
+                    for (metric, labels), (buckets, total, count) in sorted(self._histograms.items()):
+                        if metric != name:
+                            continue
+                        for bound, bucket_count in zip(self.BUCKETS, buckets):
+                            lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {bucket_count}")
+                        lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+                        lines.append(f"{name}_sum{fmt(labels)} {total}")
+                        lines.append(f"{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,30 @@
+import time
+
+import redis
+
+from booking import instrumentation
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        commands = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            instrumentation.record_redis(time.perf_counter() - started, commands=commands)
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    Redis client that reports command counts and latency to the current request's metrics.
+    """
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            instrumentation.record_redis(time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
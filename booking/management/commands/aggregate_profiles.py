@@ -0,0 +1,88 @@
+import io
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.profiling import ProfileStore, profiling_settings
+
+
+class _LoadedProfile:
+    # pstats.Stats accepts any object exposing create_stats() and a stats dict.
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Aggregate the profile dumps collected by ProfilingMiddleware, per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", action="append", help="Endpoint (URL name) to report; defaults to all.")
+        parser.add_argument("--top", type=int, default=25)
+        parser.add_argument("--sort", default="cumulative", help="pstats sort key for cProfile dumps.")
+        parser.add_argument("--collapsed-output",
+                            help="Also write merged stack samples in collapsed format (for flamegraph tools).")
+
+    def handle(self, *args, **options):
+        config = profiling_settings()
+        store = ProfileStore(config["DIRECTORY"], config["MAX_DUMPS_PER_ENDPOINT"])
+        endpoints = options["endpoint"] or store.endpoints()
+        if not endpoints:
+            raise CommandError(f"No profile dumps found in {store.directory}")
+
+        collapsed = Counter()
+        for endpoint in endpoints:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {endpoint}"))
+            self._report_cprofile(store, endpoint, options["sort"], options["top"])
+            collapsed.update(self._report_samples(store, endpoint, options["top"]))
+
+        if options["collapsed_output"]:
+            with open(options["collapsed_output"], "w") as fh:
+                for stack, count in collapsed.most_common():
+                    fh.write(f"{stack} {count}\n")
+            self.stdout.write(self.style.SUCCESS(f"Collapsed stacks written to {options['collapsed_output']}"))
+
+    def _report_cprofile(self, store, endpoint, sort, top):
+        stats = None
+        dumps = 0
+        for raw in store.load_cprofiles(endpoint):
+            dumps += 1
+            if stats is None:
+                stats = pstats.Stats(_LoadedProfile(raw), stream=io.StringIO())
+            else:
+                stats.add(_LoadedProfile(raw))
+        if stats is None:
+            return
+
+        self.stdout.write(f"cProfile: {dumps} request(s)")
+        stats.stream = io.StringIO()
+        stats.sort_stats(sort).print_stats(top)
+        self.stdout.write(stats.stream.getvalue())
+
+    def _report_samples(self, store, endpoint, top):
+        merged = Counter()
+        durations = []
+        for dump in store.load_samples(endpoint):
+            durations.append(dump["duration_ms"])
+            merged.update(dump["samples"])
+        if not durations:
+            return merged
+
+        durations.sort()
+        self.stdout.write(
+            f"Slow requests: {len(durations)}, median {durations[len(durations) // 2]} ms, max {durations[-1]} ms"
+        )
+        # Attribute samples to the frame that was running and to the innermost frame of our own code.
+        hotspots = Counter()
+        for stack, count in merged.items():
+            frames = stack.split(";")
+            own = [f for f in frames if "/booking/" in f and "/booking/profiling.py" not in f
+                   and "/booking/middleware.py" not in f]
+            hotspots[(frames[-1], own[-1] if own else "-")] += count
+        total = sum(hotspots.values())
+        for (leaf, own), count in hotspots.most_common(top):
+            self.stdout.write(f"{count / total:6.1%}  {leaf}  (via {own})")
+        return merged
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from booking.orm_manager.archive_manager import ArchiveManager
+
+
+class Command(BaseCommand):
+    help = "Move old and cancelled bookings from booking_data into booking_data_archive in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=settings.BOOKING_ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--cancelled-grace-days", type=int, default=1,
+                            help="Archive cancelled bookings once their cancellation is this old.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches; rerun to continue.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            count = ArchiveManager.archivable_bookings(
+                older_than_days=options["older_than_days"], cancelled_grace_days=options["cancelled_grace_days"]
+            ).count()
+            self.stdout.write(f"{count} booking(s) would be archived.")
+            return
+
+        archived = ArchiveManager.archive_bookings(
+            older_than_days=options["older_than_days"],
+            cancelled_grace_days=options["cancelled_grace_days"],
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            pause=options["pause"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} booking(s)."))
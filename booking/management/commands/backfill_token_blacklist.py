@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from booking.services.token_blacklist_service import RedisTokenBlacklist
+
+
+class Command(BaseCommand):
+    help = "Copy unexpired blacklisted refresh tokens from the token_blacklist tables into Redis"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow()).values_list(
+            "token__jti", "token__expires_at"
+        )
+        written = 0
+        batch = []
+        for jti, expires_at in rows.iterator(chunk_size=options["batch_size"]):
+            batch.append((jti, expires_at.timestamp()))
+            if len(batch) >= options["batch_size"]:
+                written += RedisTokenBlacklist.add_many(batch)
+                batch = []
+        if batch:
+            written += RedisTokenBlacklist.add_many(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {written} blacklisted token(s) into Redis."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from booking.services.redis_setup import horizon_dates
+from booking.services.write_behind_service import WriteBehindService
+
+
+class Command(BaseCommand):
+    help = "Compare the Redis availability counters with the DB and the write-behind queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true",
+                            help="Overwrite mismatched counters. Run when no bookings are in flight.")
+
+    def handle(self, *args, **options):
+        queue = WriteBehindService.describe_queue()
+        self.stdout.write(f"Write-behind queue: {queue['length']} queued, {queue['pending']} being written.")
+
+        mismatches = WriteBehindService.check_consistency(horizon_dates(), fix=options["fix"])
+        for site_code, day, field, actual, expected in mismatches:
+            self.stdout.write(f"{site_code} {day} {field}: redis={actual} expected={expected}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Redis counters match the database."))
+        elif options["fix"]:
+            self.stdout.write(self.style.WARNING(f"Fixed {len(mismatches)} counter(s)."))
+        else:
+            self.stdout.write(self.style.ERROR(f"{len(mismatches)} counter(s) out of sync; rerun with --fix."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.constants import Constants
+from booking.orm_manager.site_manager import SiteManager
+from booking.services.redis_setup import seed_availability_horizon
+
+
+class Command(BaseCommand):
+    help = "Create a site with its floors and rooms, and seed its Redis availability"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--code", required=True, help="Short identifier used in the API and Redis keys.")
+        parser.add_argument("--name", required=True)
+        parser.add_argument("--floors", type=int, default=1)
+        for room_type, count in Constants.ROOM_TYPES.items():
+            parser.add_argument(f"--{room_type}", type=int, default=count, help=f"Number of {room_type} rooms.")
+
+    def handle(self, *args, **options):
+        room_counts = {room_type: options[room_type] for room_type in Constants.ROOM_TYPES}
+        result = SiteManager.create_site(options["code"], options["name"], options["floors"], room_counts)
+        if "error" in result:
+            raise CommandError(result["error"])
+
+        seeded = seed_availability_horizon(sites=[result["site"]])
+        self.stdout.write(self.style.SUCCESS(f"{result['success']} Seeded {len(seeded)} day(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.services.redis_setup import generate_time_slots
+
+
+class Command(BaseCommand):
+    help = "Create time slots for the configured granularity (BOOKING_SLOT_MINUTES) and retire the others"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, help="Override BOOKING_SLOT_MINUTES.")
+
+    def handle(self, *args, **options):
+        created, deactivated = generate_time_slots(slot_minutes=options["minutes"])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} slot(s), deactivated {deactivated} slot(s)."))
@@ -1,9 +1,24 @@
-from django.core.management.base import BaseCommand
-from booking.services.redis_setup import create_or_update_weekly_availability
+from django.core.management.base import BaseCommand, CommandError
+from booking.services.redis_setup import seed_when_reachable, purge_legacy_keys
 
 class Command(BaseCommand):
-    help = "Initialize or refresh Redis availability keys for upcoming week"
+    help = "Seed Redis availability keys for any day of the booking horizon that is not seeded yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purge-legacy", action="store_true",
+                            help="Also delete past-day keys left without an expiry by the old weekly seeder.")
 
     def handle(self, *args, **options):
-        create_or_update_weekly_availability()
-        self.stdout.write(self.style.SUCCESS("Redis availability initialized for the upcoming week."))
\ No newline at end of file
+        if options["purge_legacy"]:
+            deleted = purge_legacy_keys()
+            self.stdout.write(f"Deleted {deleted} legacy past-day key(s).")
+
+        # Also clears seeding queued by a `migrate` that ran while Redis was down.
+        seeded = seed_when_reachable()
+        if seeded is None:
+            raise CommandError("Redis is unreachable; seeding is queued for the next startup.")
+        if seeded:
+            days = ", ".join(f"{site_code}/{day.isoformat()}" for site_code, day in seeded)
+            self.stdout.write(self.style.SUCCESS(f"Redis availability seeded for: {days}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Redis availability already seeded for the whole horizon."))
@@ -0,0 +1,59 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.benchmarks.http_load import login, run_http_load
+
+
+DEFAULT_PATHS = ["/api/bookings-available/?date={today}", "/api/bookings/history/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server (runserver or gunicorn) with concurrent GET requests and report "
+        "requests per second and latency as JSON. See docs/deployment.md."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--path", action="append",
+                            help="Path to request ({today} is replaced); repeat for several. "
+                                 "Defaults to the availability listing and booking history.")
+        parser.add_argument("--username", help="Log in as this user and send its access token.")
+        parser.add_argument("--password")
+        parser.add_argument("--concurrency", type=int, action="append",
+                            help="Concurrent clients; repeat to run several levels. Defaults to 1, 8 and 32.")
+        parser.add_argument("--duration", type=float, default=20, help="Seconds per concurrency level.")
+        parser.add_argument("--label", default="", help="Name of the setup under test, stored with the results.")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        today = date.today().isoformat()
+        urls = [base_url + path.format(today=today) for path in options["path"] or DEFAULT_PATHS]
+
+        headers = {}
+        if options["username"]:
+            try:
+                token = login(base_url, options["username"], options["password"] or "")
+            except (OSError, KeyError, ValueError) as exc:
+                raise CommandError(f"Login failed: {exc}")
+            headers["Authorization"] = f"Bearer {token}"
+
+        levels = []
+        for concurrency in options["concurrency"] or [1, 8, 32]:
+            result = run_http_load(urls, concurrency=concurrency, duration=options["duration"], headers=headers)
+            levels.append(result)
+            self.stderr.write(
+                f"{options['label'] or base_url} c={concurrency}: {result['requests_per_second']} req/s, "
+                f"p50 {result['latency'].get('p50_ms')}ms, p99 {result['latency'].get('p99_ms')}ms"
+            )
+
+        payload = json.dumps({"label": options["label"], "urls": urls, "levels": levels}, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Load test results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
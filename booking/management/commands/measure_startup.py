@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.benchmarks.startup import TARGETS, measure_startup
+
+
+# p50 import time budgets (ms) under the lean settings.
+DEFAULT_BUDGETS_MS = {"web": 800, "cron": 600}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start of a web worker and a cron run with `python -X importtime` "
+        "and fail if the median import time exceeds its budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", choices=sorted(TARGETS),
+                            help="Process to measure; repeat for several. Defaults to all.")
+        parser.add_argument("--settings-module", default="workspace_booking.settings_lean")
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--budget-ms", type=float,
+                            help="p50 import time budget for every target; defaults to a budget per target.")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        results, over_budget = {}, []
+        for target in options["target"] or sorted(TARGETS):
+            try:
+                result = measure_startup(target, options["settings_module"], runs=options["runs"])
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+            budget = options["budget_ms"] or DEFAULT_BUDGETS_MS[target]
+            result["budget_ms"] = budget
+            results[target] = result
+            if result["imports"]["p50_ms"] > budget:
+                over_budget.append(f"{target}: {result['imports']['p50_ms']}ms > {budget}ms")
+
+        payload = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Startup results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+        if over_budget:
+            raise CommandError("Import time over budget: " + "; ".join(over_budget))
@@ -0,0 +1,27 @@
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.orm_manager.usage_manager import UsageManager
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily room usage rollups from live and archived bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-date", help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--end-date", help="Last day to rebuild (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument("--days", type=int, default=7,
+                            help="Number of days ending at --end-date to rebuild when --start-date is not given.")
+
+    def handle(self, *args, **options):
+        try:
+            end_date = (datetime.strptime(options["end_date"], "%Y-%m-%d").date() if options["end_date"]
+                        else date.today() - timedelta(days=1))
+            start_date = (datetime.strptime(options["start_date"], "%Y-%m-%d").date() if options["start_date"]
+                          else end_date - timedelta(days=options["days"] - 1))
+        except ValueError:
+            raise CommandError("Dates must be in YYYY-MM-DD format")
+
+        rows = UsageManager.rebuild(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup row(s) for {start_date} to {end_date}."))
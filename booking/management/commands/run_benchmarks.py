@@ -0,0 +1,231 @@
+import json
+import platform
+import subprocess
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils.timezone import now
+
+from booking.benchmarks.data import seed_benchmark_data, BENCHMARK_PREFIX
+from booking.benchmarks.runner import measure, run_concurrently, summarize, use_redis_client
+from booking.models import User, Room, Site, TimeSlot, Booking
+from booking.orm_manager.booking_manager import BookingManager
+from booking.serializers import BookingSerializer
+from booking.services.redis_booking_service import RedisBookingService
+from booking.services.redis_setup import seed_availability_horizon, seeded_marker_key, horizon_dates, \
+    availability_key, availability_field
+
+
+SCENARIOS = ["seed_redis", "availability", "history", "storm"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the booking benchmark suite against a throwaway database and write p50/p99 results as JSON. "
+        "Uses an in-process fake Redis (fakeredis) unless --redis=real is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--teams", type=int, default=50)
+        parser.add_argument("--team-size", type=int, default=5)
+        parser.add_argument("--rooms-per-type", type=int, default=8)
+        parser.add_argument("--slot-minutes", type=int, default=60)
+        parser.add_argument("--horizon-days", type=int, default=7,
+                            help="Booking horizon to seed; future bookings are spread across it.")
+        parser.add_argument("--history-days", type=int, default=90)
+        parser.add_argument("--bookings-per-day", type=int, default=60)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--storm-threads", type=int, default=16)
+        parser.add_argument("--storm-requests", type=int, default=200)
+        parser.add_argument("--storm-room-type", default=Room.PRIVATE, choices=[t for t, _ in Room.ROOM_TYPES])
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                            help="Scenario to run; repeat for several. Defaults to all.")
+        parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        client = self._redis_client(options["redis"])
+        # The benchmark seeds its own Redis stand-in; the throwaway database must not seed the real one.
+        with override_settings(BOOKING_REDIS_SEED_AFTER_MIGRATE=False):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with use_redis_client(client), override_settings(
+                BOOKING_AVAILABILITY_HORIZON_DAYS=options["horizon_days"]
+            ):
+                results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {"meta": self._meta(options), "results": results}
+        payload = json.dumps(report, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Benchmark results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+        storm = results.get("storm")
+        if storm and not storm["invariants"]["ok"]:
+            raise CommandError("Overbooking detected during the booking storm.")
+
+    @staticmethod
+    def _redis_client(mode):
+        if mode == "real":
+            from booking.redis_config import redis_client
+            return redis_client
+        try:
+            import fakeredis
+        except ImportError:
+            raise CommandError("fakeredis is required for --redis=fake (pip install -r requirements-dev.txt)")
+        return fakeredis.FakeRedis()
+
+    def _run(self, options):
+        results = {}
+        seeded = seed_benchmark_data(
+            users=options["users"], teams=options["teams"], team_size=options["team_size"],
+            rooms_per_type=options["rooms_per_type"], slot_minutes=options["slot_minutes"],
+            history_days=options["history_days"], bookings_per_day=options["bookings_per_day"],
+            future_days=options["horizon_days"], seed=options["seed"],
+        )
+        results["seed_db"] = {
+            **seeded,
+            "rows_per_second": round(
+                sum(seeded["counts"].values()) / max(sum(seeded["seconds"].values()), 1e-9), 1
+            ),
+        }
+
+        scenarios = options["scenario"] or SCENARIOS
+        if "seed_redis" in scenarios:
+            results["seed_redis"] = self._bench_seed_redis(options["horizon_days"])
+        if "availability" in scenarios:
+            results["availability"] = self._bench_availability(options["iterations"])
+        if "history" in scenarios:
+            results["history"] = self._bench_history(options["iterations"])
+        if "storm" in scenarios:
+            results["storm"] = self._bench_storm(
+                options["storm_threads"], options["storm_requests"], options["storm_room_type"]
+            )
+        return results
+
+    @staticmethod
+    def _bench_seed_redis(horizon_days):
+        from booking.redis_config import redis_client
+
+        dates = horizon_dates(horizon_days=horizon_days)
+        site = Site.objects.get(code=BENCHMARK_PREFIX)
+
+        def seed():
+            # Drop the per-day markers so every run walks the full horizon again.
+            redis_client.delete(*[seeded_marker_key(site.code, day.isoformat()) for day in dates])
+            seed_availability_horizon(horizon_days=horizon_days, sites=[site])
+
+        result = summarize(measure(seed, iterations=3, warmup=0))
+        pipe = redis_client.pipeline(transaction=False)
+        for day in dates:
+            pipe.hlen(availability_key(site.code, day.isoformat()))
+        result["horizon_days"] = horizon_days
+        result["redis_keys"] = 2 * len(dates)
+        result["redis_fields"] = sum(pipe.execute())
+        return result
+
+    @staticmethod
+    def _bench_availability(iterations):
+        busy_day = date.today() - timedelta(days=1)
+        site = Site.objects.get(code=BENCHMARK_PREFIX)
+        return {
+            "busy_day": summarize(measure(
+                lambda: BookingManager.get_available_slots_for_date(busy_day, site), iterations
+            )),
+            "empty_day": summarize(measure(
+                lambda: BookingManager.get_available_slots_for_date(date.today() + timedelta(days=30), site),
+                iterations,
+            )),
+        }
+
+    @staticmethod
+    def _bench_history(iterations):
+        user_id = (
+            Booking.objects.values("booked_by_user_id").order_by("-booked_by_user_id").first()["booked_by_user_id"]
+        )
+        user = User.objects.get(id=user_id)
+        paginator = Paginator(BookingManager.get_user_bookings(user), 10)
+
+        def page(number):
+            return lambda: BookingSerializer(paginator.page(number).object_list, many=True).data
+
+        return {
+            "first_page": summarize(measure(page(1), iterations)),
+            "last_page": summarize(measure(page(paginator.num_pages), iterations)),
+            "user_bookings": paginator.count,
+        }
+
+    @staticmethod
+    def _bench_storm(threads, requests, room_type):
+        from booking.redis_config import redis_client
+
+        booking_date = date.today() + timedelta(days=1)
+        slot = TimeSlot.objects.order_by("start_time").first()
+        site = Site.objects.get(code=BENCHMARK_PREFIX)
+        room = Room.objects.filter(site=site, room_type=room_type).order_by("id").first()
+        users = list(User.objects.filter(username__startswith=f"{BENCHMARK_PREFIX}_user").order_by("id")[:requests])
+        data = {
+            "site": site.code, "date": booking_date.isoformat(), "slot_id": slot.id, "room_type": room_type,
+            "room_name": room.name,
+        }
+
+        started = time.perf_counter()
+        outcomes = run_concurrently(
+            lambda user: RedisBookingService.book_room(user=user, data=data), [(u,) for u in users], threads
+        )
+        elapsed = time.perf_counter() - started
+
+        booked = [outcome for _, outcome, error in outcomes if outcome and outcome[0] is not None]
+        errors = Counter(str(error) for _, _, error in outcomes if error is not None)
+
+        active = Booking.objects.filter(room=room, time_slot=slot, date=booking_date, status="ACTIVE").count()
+        capacity = Room.bookings_per_slot(room.room_type, room.capacity)
+        # The raw counter, not the clamped availability, so an oversold cell shows up.
+        consumed = int(redis_client.hget(
+            availability_key(site.code, booking_date.isoformat()),
+            availability_field(slot.id, room_type, room.name),
+        ) or 0)
+        return {
+            "requests": len(outcomes),
+            "threads": threads,
+            "throughput_rps": round(len(outcomes) / max(elapsed, 1e-9), 1),
+            "latency": summarize([duration for duration, _, _ in outcomes]),
+            "booked": len(booked),
+            "errors": dict(errors.most_common(10)),
+            "invariants": {
+                "active_bookings": active,
+                "capacity": capacity,
+                "redis_consumed": consumed,
+                "ok": consumed <= capacity and consumed == active == len(booked),
+            },
+        }
+
+    @staticmethod
+    def _meta(options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "timestamp": now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "options": {k: v for k, v in options.items() if k not in ("stdout", "stderr", "skip_checks")},
+        }
@@ -0,0 +1,50 @@
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+
+from booking.services import redis_setup
+from booking.services.write_behind_service import WriteBehindService
+
+
+class Command(BaseCommand):
+    help = "Write bookings queued by the write-behind mode to the database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}",
+                            help="Consumer name. Reuse it across restarts to replay this worker's own "
+                                 "unacknowledged entries immediately.")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is drained.")
+
+    def handle(self, *args, **options):
+        consumer = options["consumer"]
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        redis_setup.seed_if_pending()
+        WriteBehindService.ensure_group()
+
+        # Entries this consumer read but never acknowledged (it crashed mid-batch) come first.
+        own_pending = True
+        while not self.stopping:
+            batch = WriteBehindService.read_batch(
+                consumer, own_pending=own_pending, block_ms=1 if options["once"] else None
+            )
+            if not batch:
+                if own_pending:
+                    own_pending = False
+                    continue
+                if options["once"]:
+                    break
+                continue
+
+            confirmed, failed = WriteBehindService.write_batch(batch)
+            self.stdout.write(f"Wrote batch of {len(batch)}: {confirmed} confirmed, {failed} failed.")
+
+        self.stdout.write(self.style.SUCCESS("Booking writer stopped."))
+
+    def _stop(self, signum, frame):
+        # Finish the batch in hand; anything unacknowledged is replayed by the next worker.
+        self.stopping = True
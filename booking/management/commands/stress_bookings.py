@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from booking.benchmarks.data import seed_benchmark_data, BENCHMARK_PREFIX
+from booking.benchmarks.runner import summarize, use_redis_client
+from booking.benchmarks.stress import build_plan, check_invariants, run_plan
+from booking.models import Room, Site, TimeSlot, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent bookings and cancellations at the same slots from many threads or processes, "
+        "then check the overbooking invariants and report throughput as JSON. Runs against a throwaway "
+        "database and, unless --redis=real is given, a local fakeredis server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["threads", "processes"], default="threads")
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--operations", type=int, default=2000, help="Operations per round.")
+        parser.add_argument("--rounds", type=int, default=3,
+                            help="Rounds to run; invariants are checked after each. State carries over.")
+        parser.add_argument("--cancel-ratio", type=float, default=0.3)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--rooms-per-type", type=int, default=2)
+        parser.add_argument("--slots", type=int, default=2, help="Slots the operations are aimed at.")
+        parser.add_argument("--room-type", action="append", choices=[t for t, _ in Room.ROOM_TYPES],
+                            help="Room types to book; repeat for several. Defaults to private and shared.")
+        parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        server = None
+        if options["redis"] == "real":
+            from booking.redis_config import redis_client as client
+        else:
+            server, client = self._fake_redis()
+
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        database_file = None
+        if options["mode"] == "processes" and connection.vendor == "sqlite":
+            # Forked workers cannot share an in-memory database.
+            database_file = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False).name
+            test_settings["NAME"] = database_file
+        # The benchmark seeds its own Redis stand-in; the throwaway database must not seed the real one.
+        with override_settings(BOOKING_REDIS_SEED_AFTER_MIGRATE=False):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with use_redis_client(client):
+                report = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if database_file:
+                test_settings.pop("NAME", None)
+                if os.path.exists(database_file):
+                    os.remove(database_file)
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        payload = json.dumps(report, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(payload + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Stress results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+        failed = [result["round"] for result in report["rounds"] if not result["invariants"]["ok"]]
+        if failed:
+            raise CommandError(f"Booking invariants violated after round(s) {failed}.")
+
+    @staticmethod
+    def _fake_redis():
+        """
+        A fakeredis server on a free local port, reachable from forked workers too.
+        """
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError("fakeredis is required for --redis=fake (pip install -r requirements-dev.txt)")
+        from booking.instrumented_redis import InstrumentedRedis
+
+        server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        return server, InstrumentedRedis(host=host, port=port, db=0)
+
+    def _run(self, options):
+        seed_benchmark_data(
+            users=options["users"], teams=0, team_size=0, rooms_per_type=options["rooms_per_type"],
+            slot_minutes=60, history_days=0, bookings_per_day=0, seed=options["seed"],
+        )
+        site = Site.objects.get(code=BENCHMARK_PREFIX)
+        day = date.today() + timedelta(days=1)
+        slot_ids = list(TimeSlot.objects.filter(is_active=True).order_by("start_time").values_list(
+            "id", flat=True
+        )[:options["slots"]])
+        room_types = options["room_type"] or [Room.PRIVATE, Room.SHARED]
+        cells = [
+            (room.room_type, room.name, slot_id)
+            for room in Room.objects.filter(site=site, room_type__in=room_types).order_by("id")
+            for slot_id in slot_ids
+        ]
+        user_ids = list(User.objects.filter(username__startswith=f"{BENCHMARK_PREFIX}_user").order_by(
+            "id"
+        ).values_list("id", flat=True))
+
+        rounds = []
+        for number in range(options["rounds"]):
+            plan = build_plan(
+                user_ids=user_ids, cells=cells, operations=options["operations"],
+                cancel_ratio=options["cancel_ratio"], workers=options["workers"], seed=options["seed"] + number,
+            )
+            elapsed, results = run_plan(plan, site, day, mode=options["mode"])
+            started = time.perf_counter()
+            invariants = check_invariants(site, day, user_ids)
+            rounds.append({
+                "round": number + 1,
+                "operations": len(results),
+                "seconds": round(elapsed, 3),
+                "throughput_ops": round(len(results) / max(elapsed, 1e-9), 1),
+                "latency": summarize([duration for duration, _ in results]),
+                "outcomes": dict(Counter(outcome for _, outcome in results).most_common()),
+                "invariants": invariants,
+                "check_seconds": round(time.perf_counter() - started, 3),
+            })
+            self.stderr.write(
+                f"round {number + 1}: {rounds[-1]['throughput_ops']} ops/s, "
+                f"invariants {'ok' if invariants['ok'] else 'VIOLATED'}"
+            )
+
+        return {
+            "mode": options["mode"],
+            "workers": options["workers"],
+            "cells": len(cells),
+            "users": len(user_ids),
+            "date": day.isoformat(),
+            "rounds": rounds,
+        }
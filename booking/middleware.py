@@ -0,0 +1,106 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from booking import instrumentation
+
+
+logger = logging.getLogger("booking.instrumentation")
+
+DEFAULT_INSTRUMENTATION = {
+    "ENABLED": True,
+    # Fraction of requests that get per-query/per-command timing. Request counts and
+    # latency histograms are recorded for every request regardless.
+    "SAMPLE_RATE": 1.0,
+    "SERVER_TIMING": True,
+    "LOG": True,
+    # When set, the metrics endpoint requires "Authorization: Bearer <token>".
+    "METRICS_TOKEN": None,
+}
+
+
+def instrumentation_settings():
+    return {**DEFAULT_INSTRUMENTATION, **getattr(settings, "BOOKING_INSTRUMENTATION", {})}
+
+
+class InstrumentationMiddleware:
+    """
+    Break each request's time down into DB queries, Redis commands and named phases.
+
+    Sampled requests get a Server-Timing header and a structured log line; every request
+    feeds the Prometheus metrics served by MetricsView.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = instrumentation_settings()
+        self.enabled = config["ENABLED"]
+        self.sample_rate = config["SAMPLE_RATE"]
+        self.server_timing = config["SERVER_TIMING"]
+        self.log = config["LOG"]
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            self._record(request, response, time.perf_counter() - started, None)
+            return response
+
+        metrics, token = instrumentation.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(instrumentation.db_execute_wrapper))
+                with instrumentation.phase("view"):
+                    response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+
+        total = time.perf_counter() - metrics.started
+        self._record(request, response, total, metrics)
+
+        if self.server_timing:
+            response["Server-Timing"] = metrics.server_timing(total)
+        if self.log:
+            logger.info(json.dumps({
+                "event": "request_timing",
+                "method": request.method,
+                "path": request.path,
+                "endpoint": self._endpoint(request),
+                "status": response.status_code,
+                **metrics.as_dict(total),
+            }))
+        return response
+
+    @staticmethod
+    def _endpoint(request):
+        match = getattr(request, "resolver_match", None)
+        return match.url_name if match and match.url_name else "unmatched"
+
+    def _record(self, request, response, total, metrics):
+        endpoint = self._endpoint(request)
+        registry = instrumentation.registry
+        registry.inc("booking_http_requests_total", help_text="HTTP requests handled.",
+                     endpoint=endpoint, method=request.method, status=response.status_code)
+        registry.observe("booking_http_request_duration_seconds", total,
+                         help_text="End-to-end request latency.", endpoint=endpoint)
+        if metrics is None:
+            return
+        registry.inc("booking_db_queries_total", metrics.db_queries,
+                     help_text="DB queries issued by sampled requests.", endpoint=endpoint)
+        registry.inc("booking_db_seconds_total", metrics.db_time,
+                     help_text="Time spent in DB queries by sampled requests.", endpoint=endpoint)
+        registry.inc("booking_redis_commands_total", metrics.redis_commands,
+                     help_text="Redis commands issued by sampled requests.", endpoint=endpoint)
+        registry.inc("booking_redis_seconds_total", metrics.redis_time,
+                     help_text="Time spent in Redis round trips by sampled requests.", endpoint=endpoint)
+        registry.inc("booking_sampled_requests_total",
+                     help_text="Requests with detailed DB/Redis instrumentation.", endpoint=endpoint)
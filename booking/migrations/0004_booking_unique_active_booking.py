@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_seed_initial_redis_data'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('status', 'ACTIVE')),
+                fields=('room', 'date', 'time_slot'),
+                name='unique_active_booking_per_room_slot',
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_booking_unique_active_booking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Inactive slots are kept for past bookings but not offered'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_archivedbooking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRoomUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('room_type', models.CharField(choices=[('private', 'Private'), ('conference', 'Conference'), ('shared', 'Shared')], max_length=20)),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('team_bookings', models.PositiveIntegerField(default=0)),
+                ('individual_bookings', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='booking.room')),
+            ],
+            options={
+                'db_table': 'booking_daily_usage',
+                'indexes': [models.Index(fields=['room_type', 'date'], name='usage_room_type_date_idx')],
+                'unique_together': {('date', 'room')},
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_dailyroomusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='reference',
+            field=models.CharField(blank=True, editable=False, help_text='Write-behind request id, so a replayed queue entry is not inserted twice', max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_site(apps, schema_editor):
+    """
+    Put every existing room on the ground floor of the default site.
+    """
+    Site = apps.get_model('booking', 'Site')
+    Floor = apps.get_model('booking', 'Floor')
+    Room = apps.get_model('booking', 'Room')
+
+    site, _ = Site.objects.get_or_create(
+        code=getattr(settings, 'BOOKING_DEFAULT_SITE', 'hq'), defaults={'name': 'Headquarters'}
+    )
+    floor, _ = Floor.objects.get_or_create(site=site, name='Ground', defaults={'level': 0})
+    Room.objects.filter(site__isnull=True).update(site=site, floor=floor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_booking_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Site',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(help_text='Short identifier used in the API and Redis keys', max_length=32, unique=True)),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'sites',
+            },
+        ),
+        migrations.CreateModel(
+            name='Floor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('level', models.IntegerField(default=0)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='floors', to='booking.site')),
+            ],
+            options={
+                'db_table': 'floors',
+                'unique_together': {('site', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='site',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rooms', to='booking.site'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='floor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rooms', to='booking.floor'),
+        ),
+        migrations.RunPython(assign_default_site, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='room',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rooms', to='booking.site'),
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='room',
+            constraint=models.UniqueConstraint(fields=('site', 'name'), name='unique_room_name_per_site'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['site', 'room_type'], name='room_site_type_idx'),
+        ),
+    ]
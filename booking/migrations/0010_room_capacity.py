@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+# Seats per room type before capacity was read from the rooms table.
+LEGACY_CAPACITY = {'private': 1, 'conference': 1, 'shared': 4}
+
+
+def fill_capacity(apps, schema_editor):
+    Room = apps.get_model('booking', 'Room')
+    for room_type, capacity in LEGACY_CAPACITY.items():
+        Room.objects.filter(room_type=room_type, capacity__isnull=True).update(capacity=capacity)
+    Room.objects.filter(capacity__isnull=True).update(capacity=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_site_floor'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_capacity, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='room',
+            name='capacity',
+            field=models.PositiveIntegerField(default=1, help_text='Seats that can be booked per slot'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_room_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='room_closures', to=settings.AUTH_USER_MODEL)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closures', to='booking.room')),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closures', to='booking.timeslot')),
+            ],
+            options={
+                'db_table': 'room_closures',
+                'indexes': [models.Index(fields=['date'], name='closure_date_idx')],
+                'unique_together': {('room', 'date', 'time_slot')},
+            },
+        ),
+    ]
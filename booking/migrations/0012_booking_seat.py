@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def number_shared_seats(apps, schema_editor):
+    """
+    Give active shared-room bookings seats 0, 1, ... per (room, date, slot), oldest booking first.
+    """
+    Booking = apps.get_model('booking', 'Booking')
+    taken = defaultdict(int)
+    for booking in Booking.objects.filter(status='ACTIVE', room__room_type='shared').order_by('id'):
+        cell = (booking.room_id, booking.date, booking.time_slot_id)
+        booking.seat = taken[cell]
+        taken[cell] += 1
+        booking.save(update_fields=['seat'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_roomclosure'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='unique_active_booking_per_room_slot',
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='seat',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Seat within a shared room, from 0; empty for whole rooms', null=True),
+        ),
+        migrations.RunPython(number_shared_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('seat__isnull', True), ('status', 'ACTIVE')), fields=('room', 'date', 'time_slot'), name='unique_active_booking_per_room_slot'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('seat__isnull', False), ('status', 'ACTIVE')), fields=('room', 'date', 'time_slot', 'seat'), name='unique_active_booking_per_seat'),
+        ),
+    ]
@@ -48,6 +48,33 @@ class TeamMember(models.Model):
         db_table = "team_members"
         unique_together = ('team', 'user')
 
+class Site(models.Model):
+    """
+    An office. Availability in Redis is kept per site, so each site's bookings only touch its own keys.
+    """
+    code = models.SlugField(max_length=32, unique=True, help_text="Short identifier used in the API and Redis keys")
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = "sites"
+
+
+class Floor(models.Model):
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='floors')
+    name = models.CharField(max_length=100)
+    level = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.site.code}/{self.name}"
+
+    class Meta:
+        db_table = "floors"
+        unique_together = ('site', 'name')
+
+
 class Room(models.Model):
     PRIVATE = 'private'
     CONFERENCE = 'conference'
@@ -58,17 +85,34 @@ class Room(models.Model):
         (CONFERENCE, 'Conference'),
         (SHARED, 'Shared'),
     ]
-    name = models.CharField(max_length=100, unique=True)
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='rooms')
+    floor = models.ForeignKey(Floor, on_delete=models.SET_NULL, related_name='rooms', null=True, blank=True)
+    name = models.CharField(max_length=100)
     room_type = models.CharField(max_length=20, choices=ROOM_TYPES)
-    capacity = models.PositiveIntegerField(null=True, blank=True, help_text="Leave blank for unlimited capacity")
+    capacity = models.PositiveIntegerField(default=1, help_text="Seats that can be booked per slot")
+
+    @staticmethod
+    def bookings_per_slot(room_type, capacity):
+        """
+        Active bookings a room takes per slot: one per seat in shared rooms, one in every other
+        room, which is booked whole. Redis availability counters count in these units.
+        """
+        return (capacity or 1) if room_type == Room.SHARED else 1
 
     class Meta:
         db_table = "rooms"
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'name'], name='unique_room_name_per_site'),
+        ]
+        indexes = [
+            models.Index(fields=['site', 'room_type'], name='room_site_type_idx'),
+        ]
 
 
 class TimeSlot(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
+    is_active = models.BooleanField(default=True, help_text="Inactive slots are kept for past bookings but not offered")
 
     class Meta:
         db_table = 'time_slot'
@@ -88,8 +132,95 @@ class Booking(models.Model):
     booked_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ACTIVE')
     cancelled_at = models.DateTimeField(null=True, blank=True)
+    reference = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False,
+                                 help_text="Write-behind request id, so a replayed queue entry is not inserted twice")
+    seat = models.PositiveSmallIntegerField(null=True, blank=True,
+                                            help_text="Seat within a shared room, from 0; empty for whole rooms")
 
 
     class Meta:
         db_table = "booking_data"
+        constraints = [
+            # Cancelled rows must not block the slot from being booked again. Whole rooms take one
+            # active booking per slot, shared rooms one per seat.
+            models.UniqueConstraint(
+                fields=['room', 'date', 'time_slot'],
+                condition=models.Q(status='ACTIVE', seat__isnull=True),
+                name='unique_active_booking_per_room_slot',
+            ),
+            models.UniqueConstraint(
+                fields=['room', 'date', 'time_slot', 'seat'],
+                condition=models.Q(status='ACTIVE', seat__isnull=False),
+                name='unique_active_booking_per_seat',
+            ),
+        ]
+
+
+class ArchivedBooking(models.Model):
+    """
+    Bookings moved out of booking_data by `manage.py archive_bookings`. Keeps the original id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="archived_bookings")
+    booked_by_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_user_bookings",
+                                       null=True, blank=True)
+    booked_by_team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="archived_team_bookings",
+                                       null=True, blank=True)
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, related_name="archived_bookings")
+    date = models.DateField()
+    booked_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    reference = models.CharField(max_length=32, null=True, blank=True, editable=False)
+    seat = models.PositiveSmallIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "booking_data_archive"
+        indexes = [
+            models.Index(fields=['booked_by_user', 'booked_at'], name='archive_user_booked_at_idx'),
+            models.Index(fields=['date'], name='archive_date_idx'),
+        ]
+
+
+class DailyRoomUsage(models.Model):
+    """
+    Per-day, per-room booking counters kept up to date by UsageManager, so utilization
+    reports never have to scan booking_data.
+    """
+    date = models.DateField()
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="daily_usage")
+    room_type = models.CharField(max_length=20, choices=Room.ROOM_TYPES)
+    bookings = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    team_bookings = models.PositiveIntegerField(default=0)
+    individual_bookings = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "booking_daily_usage"
+        unique_together = ('date', 'room')
+        indexes = [
+            models.Index(fields=['room_type', 'date'], name='usage_room_type_date_idx'),
+        ]
+
+
+class RoomClosure(models.Model):
+    """
+    A (room, date, slot) cell taken out of service by an admin, e.g. for maintenance. While it
+    exists the cell's Redis counter carries redis_setup.CLOSED_SEATS, so it can never be reserved.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="closures")
+    date = models.DateField()
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, related_name="closures")
+    reason = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="room_closures",
+                                   null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "room_closures"
         unique_together = ('room', 'date', 'time_slot')
+        indexes = [
+            models.Index(fields=['date'], name='closure_date_idx'),
+        ]
@@ -0,0 +1,97 @@
+import heapq
+import time
+from datetime import timedelta
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from booking.models import Booking, ArchivedBooking
+
+
+class BookingsWithArchive:
+    """
+    Live and archived bookings as one sequence ordered by -booked_at, for the paginators.
+
+    Slicing only fetches offset + limit rows from each table and merges them, so a page of
+    history never loads the whole archive.
+    """
+
+    def __init__(self, live, archived):
+        self.live = live.order_by('-booked_at')
+        self.archived = archived.order_by('-booked_at')
+
+    def __len__(self):
+        return self.live.count() + self.archived.count()
+
+    def count(self):
+        return len(self)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        if stop is None:
+            stop = len(self)
+        merged = heapq.merge(self.live[:stop], self.archived[:stop], key=attrgetter('booked_at'), reverse=True)
+        return list(merged)[start:stop]
+
+
+class ArchiveManager:
+    ARCHIVED_FIELDS = [
+        'id', 'room_id', 'booked_by_user_id', 'booked_by_team_id', 'time_slot_id', 'date', 'booked_at', 'status',
+        'cancelled_at', 'reference', 'seat',
+    ]
+
+    @staticmethod
+    def with_archived(live, archived):
+        return BookingsWithArchive(live, archived)
+
+    @staticmethod
+    def archivable_bookings(*, older_than_days, cancelled_grace_days):
+        """
+        Bookings dated before the cutoff, plus cancelled bookings whose cancellation is older than the grace period.
+        """
+        today = timezone.localdate()
+        return Booking.objects.filter(
+            Q(date__lt=today - timedelta(days=older_than_days))
+            | Q(status='CANCELLED', cancelled_at__lt=timezone.now() - timedelta(days=cancelled_grace_days))
+        )
+
+    @staticmethod
+    def archive_bookings(*, older_than_days, cancelled_grace_days=1, batch_size=1000, max_batches=None, pause=0.0):
+        """
+        Move archivable bookings into booking_data_archive in id-ordered batches.
+
+        Each batch is copied and deleted in its own short transaction so the hot table is never
+        locked for long; the command can be stopped and resumed at any point.
+
+        Returns the number of bookings archived.
+        """
+        candidates = ArchiveManager.archivable_bookings(
+            older_than_days=older_than_days, cancelled_grace_days=cancelled_grace_days
+        ).order_by('id')
+
+        archived = 0
+        batches = 0
+        last_id = 0
+        while max_batches is None or batches < max_batches:
+            ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            with transaction.atomic():
+                rows = Booking.objects.filter(id__in=ids).values(*ArchiveManager.ARCHIVED_FIELDS)
+                ArchivedBooking.objects.bulk_create(
+                    [ArchivedBooking(**row) for row in rows], ignore_conflicts=True
+                )
+                Booking.objects.filter(id__in=ids).delete()
+
+            archived += len(ids)
+            batches += 1
+            last_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+
+        return archived
@@ -1,53 +1,83 @@
 from collections import defaultdict
+from django.conf import settings
 from django.utils.timezone import now
+from django.db import DatabaseError, transaction
 from django.db.models import Q
 from datetime import date
-from booking.constants import Constants
-from booking.models import Booking, TimeSlot, Room, TeamMember
+from booking.models import Booking, Room, RoomClosure, ArchivedBooking
+from booking.orm_manager.archive_manager import ArchiveManager
+from booking.orm_manager.site_manager import SiteManager
+from booking.orm_manager.usage_manager import UsageManager
+from booking.services.booking_request import RoomTable, SiteTable, SlotTable
+from booking.services import redis_setup
+from booking.services.redis_booking_service import RedisBookingService
+from booking.services.seat_map import SeatMap
+from booking.services.upcoming_bookings import TeamMembershipCache
+from booking.services.waitlist_service import WaitlistService
+from booking.services.write_behind_service import WriteBehindService
 
 
 class BookingManager:
     @staticmethod
-    def get_available_slots_for_date(query_date: date):
-        # Fetch all rooms and timeslots
-        rooms = Room.objects.values('id', 'name', 'room_type', 'capacity')
-        slots = TimeSlot.objects.values('id', 'start_time', 'end_time', 'id')
+    def get_available_slots_for_date(query_date: date, site=None):
+        site = site or SiteTable.get()
+
+        # The site's rooms and all timeslots, both cached
+        rooms = RoomTable.at_site(site.id)
+        slots = SlotTable.active().values()
 
         # Get count of bookings grouped by (room_id, slot_id)
         booking_counts = defaultdict(int)
-        for booking in Booking.objects.filter(date=query_date, status='ACTIVE').values('room_id', 'time_slot_id'):
+        for booking in Booking.objects.filter(
+            date=query_date, status='ACTIVE', room__site=site
+        ).values('room_id', 'time_slot_id'):
             booking_counts[(booking['room_id'], booking['time_slot_id'])] += 1
 
+        # Within the horizon, seats taken in shared rooms come from their seat maps, which also
+        # hold write-behind bookings not written yet. Other rooms add the queued bookings.
+        if query_date in redis_setup.horizon_dates():
+            room_ids = {(room_type, name): room_id for room_id, room_type, name, _ in rooms}
+            for (_, slot_id, room_type, name), places in WriteBehindService.pending_counts(site, [query_date]).items():
+                if room_type != 'shared' and (room_type, name) in room_ids:
+                    booking_counts[(room_ids[(room_type, name)], slot_id)] += places
+            shared = [(room_id, name) for room_id, room_type, name, _ in rooms if room_type == 'shared']
+            cells = [(room_id, slot.id, name) for slot in slots for room_id, name in shared]
+            taken = SeatMap.taken_counts(site, query_date, [(slot_id, name) for _, slot_id, name in cells])
+            for (room_id, slot_id, _), count in zip(cells, taken):
+                booking_counts[(room_id, slot_id)] = count
+
+        # Cells closed by an admin are not offered at all
+        closed = set(RoomClosure.objects.filter(
+            date=query_date, room__site=site
+        ).values_list('room_id', 'time_slot_id'))
+
         # Prepare structured output grouped by slot
         grouped = defaultdict(lambda: defaultdict(list))
 
         for slot in slots:
-            slot_id = slot['id']
-            slot_label = f"{slot['start_time']} - {slot['end_time']}"
-
-            for room in rooms:
-                key = (room['id'], slot_id)
-                booked_count = booking_counts.get(key, 0)
-                room_type = room['room_type']
-
-                if room_type == 'private' and booked_count == 0:
-                    grouped[(slot_label, slot_id)]['private'].append(room['name'])
-
-                elif room_type == 'shared':
-                    available_seats = room['capacity'] - booked_count
-                    if available_seats > 0:
-                        grouped[(slot_label, slot_id)]['shared'].append({
-                            "name": room['name'],
-                            "seats_available": available_seats
-                        })
-
-                elif room_type == 'conference':
-                    grouped[(slot_label, slot_id)]['conference'].append(room['name'])
+            slot_id = slot.id
+            slot_label = f"{slot.start_time} - {slot.end_time}"
+
+            for room_id, room_type, name, capacity in rooms:
+                if (room_id, slot_id) in closed:
+                    continue
+                available_seats = capacity - booking_counts.get((room_id, slot_id), 0)
+                if available_seats <= 0:
+                    continue
+
+                if room_type == 'shared':
+                    grouped[(slot_label, slot_id)]['shared'].append({
+                        "name": name,
+                        "seats_available": available_seats
+                    })
+                else:
+                    grouped[(slot_label, slot_id)][room_type].append(name)
 
         # Final structured list
         response = []
         for (slot_label, slot_id), roomtypes in grouped.items():
             response.append({
+                "site": site.code,
                 "date": query_date,
                 "slot_id": slot_id,
                 "slot": slot_label,
@@ -68,58 +98,74 @@ class BookingManager:
 
     @staticmethod
     def create_rooms():
-        if Room.objects.count() == 0:
-            rooms_to_create = []
-            for room_type, count in Constants.ROOM_TYPES.items():
-                capacity = 1 if room_type != "conference" else None
-                for i in range(1, count+1):
-                    rooms = Room(name=room_type[0].capitalize() +str(i), room_type=room_type, capacity=capacity)
-                    rooms_to_create.append(rooms)
-            Room.objects.bulk_create(rooms_to_create)
+        if not Room.objects.exists():
+            SiteManager.create_site(settings.BOOKING_DEFAULT_SITE, "Headquarters")
 
     @staticmethod
     def get_user_and_team_bookings(user):
         if getattr(user, 'is_admin', False):
             return Booking.objects.all()
 
-        user_teams = TeamMember.objects.filter(user=user).values_list('team_id', flat=True)
+        # Team ids from the membership cache rather than a subquery, so both sides of the OR use an index.
         return Booking.objects.filter(
-            Q(booked_by_user=user) | Q(booked_by_team__in=user_teams)
+            Q(booked_by_user=user) | Q(booked_by_team_id__in=TeamMembershipCache.get(user.id))
         )
 
     @staticmethod
     def cancel_booking(booking_id, user):
-        try:
-            booking = Booking.objects.get(id=booking_id)
-
-            if booking.booked_by_user != user:
-                return {"error": "You are not authorized to cancel this booking."}
-
-            if booking.status == "CANCELLED":
-                return {"error": "Booking is already cancelled."}
-
-            booking.status = "CANCELLED"
-            booking.cancelled_at = now()
-            booking.save()
-
-            return {"success": "Booking cancelled successfully."}
-
-        except Booking.DoesNotExist:
+        """
+        Cancel one of the user's bookings.
+
+        The status change is a conditional update, so of two concurrent cancels only one finds
+        the booking ACTIVE and goes on to give its place back. The usage rollup is written in
+        the same transaction, and the Redis release and waitlist promotion run once it has
+        committed. A failure there is logged rather than reported, since the booking is
+        cancelled either way.
+        """
+        booking = Booking.objects.select_related('room', 'time_slot', 'booked_by_team').filter(id=booking_id).first()
+        if booking is None:
             return {"error": "Booking not found."}
-        except Exception as e:
-            return {"error": str(e)}
+        if booking.booked_by_user != user:
+            return {"error": "You are not authorized to cancel this booking."}
+
+        try:
+            with transaction.atomic():
+                cancelled_at = now()
+                changed = Booking.objects.filter(id=booking.id, status='ACTIVE').update(
+                    status='CANCELLED', cancelled_at=cancelled_at
+                )
+                if changed != 1:
+                    return {"error": "Booking is already cancelled."}
+                booking.status, booking.cancelled_at = 'CANCELLED', cancelled_at
+                UsageManager.record_cancellation(booking)
+                transaction.on_commit(lambda: RedisBookingService.release_booking(booking), robust=True)
+                transaction.on_commit(lambda: WaitlistService.promote(booking), robust=True)
+        except DatabaseError:
+            return {"error": "The booking could not be cancelled. Please try again."}
+
+        return {"success": "Booking cancelled successfully."}
 
     @staticmethod
-    def get_user_bookings(user):
-        return Booking.objects.select_related(
+    def get_user_bookings(user, include_archived=False):
+        bookings = Booking.objects.select_related(
             'room', 'time_slot', 'booked_by_user', 'booked_by_team'
         ).filter(booked_by_user=user).order_by('-booked_at')
+        if not include_archived:
+            return bookings
+        archived = ArchivedBooking.objects.select_related(
+            'room', 'time_slot', 'booked_by_user', 'booked_by_team'
+        ).filter(booked_by_user=user)
+        return ArchiveManager.with_archived(bookings, archived)
 
     @staticmethod
-    def get_all_bookings():
-        return Booking.objects.select_related(
+    def get_all_bookings(include_archived=False):
+        bookings = Booking.objects.select_related(
             'room', 'time_slot', 'booked_by_user', 'booked_by_team'
         ).all().order_by('-booked_at')
+        if not include_archived:
+            return bookings
+        archived = ArchivedBooking.objects.select_related('room', 'time_slot', 'booked_by_user', 'booked_by_team')
+        return ArchiveManager.with_archived(bookings, archived)
 
     @staticmethod
     def get_booking_by_id(booking_id):
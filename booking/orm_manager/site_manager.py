@@ -0,0 +1,39 @@
+from django.db import transaction
+
+from booking.constants import Constants
+from booking.models import Floor, Room, Site
+
+
+class SiteManager:
+
+    @staticmethod
+    def room_name(room_type, number):
+        return room_type[0].capitalize() + str(number)
+
+    @staticmethod
+    @transaction.atomic
+    def create_site(code, name, floors=1, room_counts=None):
+        """
+        Create a site with `floors` floors and its rooms spread over them, round-robin.
+
+        `room_counts` maps room type to number of rooms and defaults to Constants.ROOM_TYPES.
+        Returns {"error"} if the code is taken.
+        """
+        if Site.objects.filter(code=code).exists():
+            return {"error": f"Site {code} already exists."}
+
+        site = Site.objects.create(code=code, name=name)
+        site_floors = Floor.objects.bulk_create(
+            [Floor(site=site, name=f"Floor {level}", level=level) for level in range(max(floors, 1))]
+        )
+
+        rooms = []
+        for room_type, count in (room_counts or Constants.ROOM_TYPES).items():
+            capacity = Constants.DEFAULT_ROOM_CAPACITY.get(room_type, 1)
+            for number in range(1, count + 1):
+                rooms.append(Room(
+                    site=site, floor=site_floors[(number - 1) % len(site_floors)],
+                    name=SiteManager.room_name(room_type, number), room_type=room_type, capacity=capacity,
+                ))
+        Room.objects.bulk_create(rooms)
+        return {"success": f"Site {code} created with {len(rooms)} rooms.", "site": site}
@@ -1,6 +1,7 @@
 from django.core.exceptions import ObjectDoesNotExist
 
 from booking.models import Team, User, TeamMember
+from booking.services.upcoming_bookings import TeamMembershipCache
 
 
 class TeamManager:
@@ -20,6 +21,7 @@ class TeamManager:
                 return {"error": "User already in team."}
 
             TeamMember.objects.create(team=team, user=user)
+            TeamMembershipCache.invalidate(user.id)
             return {"success": "User added to team."}
 
         except ObjectDoesNotExist:
@@ -32,6 +34,7 @@ class TeamManager:
         try:
             team_member = TeamMember.objects.get(team_id=team_id, user_id=user_id)
             team_member.delete()
+            TeamMembershipCache.invalidate(user_id)
             return {"success": "User removed from team."}
 
         except TeamMember.DoesNotExist:
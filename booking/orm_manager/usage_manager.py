@@ -0,0 +1,137 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from booking.models import ArchivedBooking, Booking, DailyRoomUsage, Room, TimeSlot
+
+
+class UsageManager:
+    COUNTERS = ['bookings', 'cancellations', 'team_bookings', 'individual_bookings']
+
+    @staticmethod
+    def _bump(day, room, **deltas):
+        """
+        Add `deltas` to the (day, room) rollup row, creating it on first use.
+        """
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if DailyRoomUsage.objects.filter(date=day, room=room).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                DailyRoomUsage.objects.create(date=day, room=room, room_type=room.room_type, **deltas)
+        except IntegrityError:
+            # Another request created the row first.
+            DailyRoomUsage.objects.filter(date=day, room=room).update(**changes)
+
+    @staticmethod
+    def record_booking(booking):
+        UsageManager.record_bookings([booking])
+
+    @staticmethod
+    def record_bookings(bookings):
+        """
+        Count new bookings, with one update per (date, room) however many bookings share it.
+        """
+        grouped = defaultdict(Counter)
+        for booking in bookings:
+            deltas = grouped[(booking.date, booking.room)]
+            deltas['bookings'] += 1
+            deltas['team_bookings' if booking.booked_by_team_id else 'individual_bookings'] += 1
+        for (day, room), deltas in grouped.items():
+            UsageManager._bump(day, room, **deltas)
+
+    @staticmethod
+    def record_cancellation(booking):
+        UsageManager.record_cancellations([booking])
+
+    @staticmethod
+    def record_cancellations(bookings):
+        grouped = Counter((booking.date, booking.room) for booking in bookings)
+        for (day, room), count in grouped.items():
+            UsageManager._bump(day, room, cancellations=count)
+
+    @staticmethod
+    def rebuild(start_date, end_date):
+        """
+        Recompute the rollups for start_date..end_date (inclusive) from live and archived bookings.
+
+        Used to backfill and, from cron, to correct any drift in the incremental counters.
+        Returns the number of rollup rows written.
+        """
+        totals = {}
+        for model in (Booking, ArchivedBooking):
+            rows = (
+                model.objects.filter(date__range=(start_date, end_date))
+                .values('date', 'room_id', 'room__room_type')
+                .annotate(
+                    bookings=Count('id'),
+                    cancellations=Count('id', filter=Q(status='CANCELLED')),
+                    team_bookings=Count('id', filter=Q(booked_by_team__isnull=False)),
+                    individual_bookings=Count('id', filter=Q(booked_by_team__isnull=True)),
+                )
+            )
+            for row in rows:
+                key = (row['date'], row['room_id'])
+                entry = totals.setdefault(
+                    key, {'room_type': row['room__room_type'], **dict.fromkeys(UsageManager.COUNTERS, 0)}
+                )
+                for field in UsageManager.COUNTERS:
+                    entry[field] += row[field]
+
+        with transaction.atomic():
+            DailyRoomUsage.objects.filter(date__range=(start_date, end_date)).delete()
+            DailyRoomUsage.objects.bulk_create([
+                DailyRoomUsage(date=day, room_id=room_id, **values) for (day, room_id), values in totals.items()
+            ])
+        return len(totals)
+
+    @staticmethod
+    def utilization(*, start_date, end_date, room_type=None, site_code=None, group_by='day'):
+        """
+        Booking counts and utilization from the rollups, grouped by day or by room.
+
+        Utilization is active bookings divided by the bookings the group could hold: one per
+        slot for whole rooms, and one per seat and slot for shared rooms.
+        """
+        if group_by not in ('day', 'room'):
+            raise Exception("group_by must be 'day' or 'room'")
+        if end_date < start_date:
+            raise Exception("end_date must not be before start_date")
+
+        usage = DailyRoomUsage.objects.filter(date__range=(start_date, end_date))
+        rooms = Room.objects.all()
+        if room_type:
+            usage = usage.filter(room_type=room_type)
+        if site_code:
+            usage = usage.filter(room__site__code=site_code)
+            rooms = rooms.filter(site__code=site_code)
+
+        slots_per_day = TimeSlot.objects.filter(is_active=True).count()
+        if group_by == 'day':
+            usage = usage.values('date', 'room_type').order_by('date', 'room_type')
+            places_per_type = Counter()
+            for room_type, capacity in rooms.values_list('room_type', 'capacity'):
+                places_per_type[room_type] += Room.bookings_per_slot(room_type, capacity)
+        else:
+            usage = usage.values('room__name', 'room_type', 'room__capacity').order_by('room_type', 'room__name')
+            days = (end_date - start_date + timedelta(days=1)).days
+
+        results = []
+        # Annotation names must not clash with the model's own counter fields.
+        for row in usage.annotate(**{f'total_{field}': Sum(field) for field in UsageManager.COUNTERS}):
+            if group_by == 'day':
+                cells = places_per_type[row['room_type']] * slots_per_day
+                group = {'date': row['date'], 'room_type': row['room_type']}
+            else:
+                cells = Room.bookings_per_slot(row['room_type'], row['room__capacity']) * days * slots_per_day
+                group = {'room_name': row['room__name'], 'room_type': row['room_type']}
+            active = row['total_bookings'] - row['total_cancellations']
+            results.append({
+                **group,
+                **{field: row[f'total_{field}'] for field in UsageManager.COUNTERS},
+                'active_bookings': active,
+                'utilization': round(active / cells, 4) if cells else None,
+            })
+        return results
@@ -1,5 +1,6 @@
 from django.core.exceptions import ObjectDoesNotExist
 
+from booking.authentication import ActiveUserCache
 from booking.models import User
 
 
@@ -22,6 +23,7 @@ class UserManager:
 
             user.is_active = False
             user.save()
+            ActiveUserCache.invalidate(user.id)
             return {"success": "User deactivated successfully."}
 
         except ObjectDoesNotExist:
@@ -38,6 +40,7 @@ class UserManager:
 
             user.is_active = True
             user.save()
+            ActiveUserCache.invalidate(user.id)
             return {"success": "User activated successfully."}
 
         except ObjectDoesNotExist:
@@ -0,0 +1,203 @@
+import cProfile
+import gzip
+import hmac
+import json
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+DEFAULT_PROFILING = {
+    "ENABLED": False,
+    # Requests running longer than this get their stacks sampled until they finish.
+    "SLOW_THRESHOLD_MS": 1000,
+    "SAMPLE_INTERVAL_MS": 10,
+    # Fraction of requests (or of requests sending HEADER) that run fully under cProfile.
+    "SAMPLE_RATE": 0.0,
+    "HEADER": "X-Profile",
+    # The header only counts when its value equals HEADER_TOKEN; without a token it is ignored.
+    "HEADER_TOKEN": None,
+    "HEADER_SAMPLE_RATE": 1.0,
+    "DIRECTORY": "profiles",
+    "MAX_DUMPS_PER_ENDPOINT": 200,
+}
+
+
+def profiling_settings():
+    return {**DEFAULT_PROFILING, **getattr(settings, "BOOKING_PROFILING", {})}
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SlowRequestSampler(threading.Thread):
+    """
+    Background thread that samples the stacks of in-flight requests once they pass the slow threshold.
+
+    Fast requests only pay for a dict insert and delete.
+    """
+
+    def __init__(self, threshold, interval):
+        super().__init__(name="slow-request-sampler", daemon=True)
+        self.threshold = threshold
+        self.interval = interval
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def begin(self):
+        samples = Counter()
+        self._inflight[threading.get_ident()] = (time.perf_counter(), samples)
+        return samples
+
+    def end(self):
+        # Taking the lock guarantees the sampler is no longer writing to this request's samples.
+        with self._lock:
+            self._inflight.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frames = None
+            with self._lock:
+                for thread_id, (started, samples) in list(self._inflight.items()):
+                    if now - started < self.threshold:
+                        continue
+                    if frames is None:
+                        frames = sys._current_frames()
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+
+
+class ProfileStore:
+    """
+    Compressed profile dumps on disk, one directory per endpoint.
+    """
+
+    def __init__(self, directory, max_dumps):
+        self.directory = Path(directory)
+        if not self.directory.is_absolute():
+            self.directory = Path(settings.BASE_DIR) / self.directory
+        self.max_dumps = max_dumps
+
+    def _path(self, endpoint, kind):
+        folder = self.directory / endpoint
+        folder.mkdir(parents=True, exist_ok=True)
+        return folder / f"{time.time_ns()}.{kind}.gz"
+
+    def save_cprofile(self, endpoint, profiler):
+        profiler.create_stats()
+        self._write(self._path(endpoint, "cprofile"), marshal.dumps(profiler.stats))
+        self._prune(endpoint)
+
+    def save_samples(self, endpoint, duration, samples):
+        payload = {"endpoint": endpoint, "duration_ms": round(duration * 1000, 2), "samples": dict(samples)}
+        self._write(self._path(endpoint, "stacks"), json.dumps(payload).encode())
+        self._prune(endpoint)
+
+    @staticmethod
+    def _write(path, data):
+        with gzip.open(path, "wb") as fh:
+            fh.write(data)
+
+    def _prune(self, endpoint):
+        dumps = sorted((self.directory / endpoint).glob("*.gz"))
+        for path in dumps[:-self.max_dumps]:
+            path.unlink(missing_ok=True)
+
+    def endpoints(self):
+        if not self.directory.exists():
+            return []
+        return sorted(path.name for path in self.directory.iterdir() if path.is_dir())
+
+    def load_cprofiles(self, endpoint):
+        for path in sorted((self.directory / endpoint).glob("*.cprofile.gz")):
+            with gzip.open(path, "rb") as fh:
+                yield marshal.loads(fh.read())
+
+    def load_samples(self, endpoint):
+        for path in sorted((self.directory / endpoint).glob("*.stacks.gz")):
+            with gzip.open(path, "rb") as fh:
+                yield json.loads(fh.read())
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in profiling for slow or explicitly selected requests.
+
+    Removed from the middleware chain entirely unless BOOKING_PROFILING["ENABLED"] is set.
+
+    The sampler thread is started by the first request in each process: with gunicorn's
+    preload_app the middleware is built in the master, and threads do not survive the fork.
+    """
+
+    def __init__(self, get_response):
+        config = profiling_settings()
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.sample_rate = config["SAMPLE_RATE"]
+        self.header = config["HEADER"]
+        self.header_token = config["HEADER_TOKEN"]
+        self.header_sample_rate = config["HEADER_SAMPLE_RATE"]
+        self.store = ProfileStore(config["DIRECTORY"], config["MAX_DUMPS_PER_ENDPOINT"])
+        self.threshold = config["SLOW_THRESHOLD_MS"] / 1000
+        self.interval = config["SAMPLE_INTERVAL_MS"] / 1000
+        self._sampler = None
+        self._sampler_pid = None
+        self._sampler_lock = threading.Lock()
+
+    @property
+    def sampler(self):
+        if self._sampler_pid != os.getpid():
+            with self._sampler_lock:
+                if self._sampler_pid != os.getpid():
+                    self._sampler = SlowRequestSampler(self.threshold, self.interval)
+                    self._sampler.start()
+                    self._sampler_pid = os.getpid()
+        return self._sampler
+
+    def _use_cprofile(self, request):
+        value = request.headers.get(self.header)
+        if value and self.header_token and hmac.compare_digest(value, self.header_token):
+            return random.random() < self.header_sample_rate
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def _endpoint(request):
+        match = getattr(request, "resolver_match", None)
+        return match.url_name if match and match.url_name else "unmatched"
+
+    def __call__(self, request):
+        if self._use_cprofile(request):
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            self.store.save_cprofile(self._endpoint(request), profiler)
+            return response
+
+        started = time.perf_counter()
+        sampler = self.sampler
+        samples = sampler.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.end()
+        if samples:
+            self.store.save_samples(self._endpoint(request), time.perf_counter() - started, samples)
+        return response
@@ -1,6 +1,37 @@
 import os
-import redis
+import threading
+
 redis_host = os.getenv('REDIS_HOST', 'localhost')
+# Fail fast rather than hang when the server is down or unreachable.
+redis_connect_timeout = float(os.getenv('REDIS_CONNECT_TIMEOUT', 5))
+
+# redis-py is imported and the client built on first use, not at import time, so processes
+# that never reach Redis (most cron commands, `manage.py check`) do not pay for it.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from booking.instrumented_redis import InstrumentedRedis
+                _client = InstrumentedRedis(host=redis_host, port=6379, db=0,
+                                            socket_connect_timeout=redis_connect_timeout)
+    return _client
+
+
+class LazyRedisClient:
+    """
+    Stands in for the shared Redis client and forwards everything to it, creating it on first use.
+    """
+    def __getattr__(self, name):
+        return getattr(get_redis_client(), name)
+
+    def __repr__(self):
+        return f"<LazyRedisClient {redis_host}:6379>"
+
 
+redis_client = LazyRedisClient()
 
-redis_client = redis.Redis(host=redis_host, port=6379, db=0)
@@ -1,10 +1,13 @@
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
-from booking.models import User, Team, TeamMember, Booking
+from booking.models import User, Team, TeamMember, Booking, RoomClosure
+from booking.tokens import RedisBlacklistRefreshToken
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RedisBlacklistRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
@@ -12,6 +15,11 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['is_admin'] = user.is_admin
         return token
 
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RedisBlacklistRefreshToken
+
+
 class BookingSerializer(serializers.ModelSerializer):
     room_name = serializers.CharField(source='room.name', read_only=True)
     room_type = serializers.CharField(source='room.room_type', read_only=True)
@@ -20,11 +28,12 @@ class BookingSerializer(serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     booked_at = serializers.DateTimeField(read_only=True)
     cancelled_at = serializers.DateTimeField(read_only=True)
+    seat = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Booking
-        fields = ['id', 'room_name', 'room_type', 'date', 'start_time', 'end_time', 'status', 'status_display',
-                  'booked_at', 'cancelled_at']
+        fields = ['id', 'room_name', 'room_type', 'seat', 'date', 'start_time', 'end_time', 'status',
+                  'status_display', 'booked_at', 'cancelled_at']
 
 
 class AdminBookingSerializer(BookingSerializer):
@@ -58,4 +67,17 @@ class TeamSerializer(serializers.ModelSerializer):
 class TeamMemberSerializer(serializers.ModelSerializer):
     class Meta:
         model = TeamMember
-        fields = ['id', 'team', 'user']
\ No newline at end of file
+        fields = ['id', 'team', 'user']
+
+
+class RoomClosureSerializer(serializers.ModelSerializer):
+    room_name = serializers.CharField(source='room.name', read_only=True)
+    room_type = serializers.CharField(source='room.room_type', read_only=True)
+    start_time = serializers.TimeField(source='time_slot.start_time', read_only=True)
+    end_time = serializers.TimeField(source='time_slot.end_time', read_only=True)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = RoomClosure
+        fields = ['id', 'room_name', 'room_type', 'date', 'time_slot', 'start_time', 'end_time', 'reason',
+                  'created_by_username', 'created_at']
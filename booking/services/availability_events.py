@@ -0,0 +1,75 @@
+import json
+import time
+
+from booking.redis_config import redis_client
+
+
+class AvailabilityEvents:
+    KEEPALIVE_SECONDS = 15
+    MAX_SECONDS = 300
+
+    @staticmethod
+    def _channel(site_code, date_str):
+        return f"availability_events/{site_code}/{date_str}"
+
+    @staticmethod
+    def _payload(*, site_code, date_str, slot_time_str, room_type, room_name, available):
+        return json.dumps({
+            "site": site_code,
+            "date": date_str,
+            "slot": slot_time_str,
+            "room_type": room_type,
+            "room_name": room_name,
+            "available": int(available),
+        })
+
+    @staticmethod
+    def publish(*, site_code, date_str, **event):
+        """
+        Publish the new value of a single availability counter to subscribers of its site and date.
+        """
+        payload = AvailabilityEvents._payload(site_code=site_code, date_str=date_str, **event)
+        redis_client.publish(AvailabilityEvents._channel(site_code, date_str), payload)
+
+    @staticmethod
+    def publish_many(events):
+        """
+        Publish several counter changes (dicts of publish() arguments) in one round trip.
+        """
+        pipe = redis_client.pipeline(transaction=False)
+        for event in events:
+            pipe.publish(AvailabilityEvents._channel(event["site_code"], event["date_str"]),
+                         AvailabilityEvents._payload(**event))
+        pipe.execute()
+
+    @staticmethod
+    def stream(site_code, date_strs):
+        """
+        Yield server-sent events carrying availability deltas for the given dates at a site.
+
+        A plain generator, so it streams under the WSGI server: the response holds one worker
+        thread while the client is connected. A keepalive comment goes out every
+        KEEPALIVE_SECONDS, which is also when a disconnected client is noticed (the write fails
+        and the generator is closed). After MAX_SECONDS the stream ends and the client
+        reconnects, so no thread is held indefinitely.
+        """
+        pubsub = redis_client.pubsub()
+        pubsub.subscribe(*[AvailabilityEvents._channel(site_code, date_str) for date_str in date_strs])
+        deadline = time.monotonic() + AvailabilityEvents.MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=AvailabilityEvents.KEEPALIVE_SECONDS
+                )
+                # None also comes back at once for the (ignored) subscribe confirmations.
+                if message is None:
+                    if time.monotonic() - last_sent >= AvailabilityEvents.KEEPALIVE_SECONDS:
+                        yield ": keepalive\n\n"
+                        last_sent = time.monotonic()
+                    continue
+                yield f"event: availability\ndata: {message['data'].decode()}\n\n"
+                last_sent = time.monotonic()
+        finally:
+            pubsub.close()
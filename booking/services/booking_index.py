@@ -0,0 +1,202 @@
+from django.utils import timezone
+
+from booking.models import Booking
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+
+
+# Trim cells from past days, then add the cell unless the owner already holds it.
+# Returns -1 if the index has not been loaded from the DB, 0 if the cell is taken, 1 if claimed.
+CLAIM_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return -1
+end
+local past = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[4])
+if #past > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[4])
+    redis.call('HDEL', KEYS[2], unpack(past))
+end
+if redis.call('ZADD', KEYS[1], 'NX', ARGV[2], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+redis.call('INCR', KEYS[4])
+for i = 1, 4 do
+    redis.call('EXPIREAT', KEYS[i], ARGV[5])
+end
+return 1
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, so importing this module does not create the Redis client.
+    if source not in _scripts:
+        _scripts[source] = redis_client.register_script(source)
+    return _scripts[source]
+
+
+def slot_score(day, start_time):
+    """
+    Sort key of a (date, slot): minutes since 0001-01-01 at the slot's start.
+    """
+    return day.toordinal() * 1440 + start_time.hour * 60 + start_time.minute
+
+
+def _cell(date_str, slot_id):
+    return f"{date_str}/{slot_id}"
+
+
+class BookingIndex:
+    """
+    Per-user and per-team index in Redis of the (date, slot) cells they hold a booking in.
+
+    Claiming a cell is the duplicate-booking check: one script call adds the cell unless the
+    owner already holds it, so concurrent requests for the same slot cannot both pass. Booking
+    and cancellation keep the index up to date, and upcoming() lists an owner's bookings in
+    date and slot order, so neither needs the DB.
+
+    An index is loaded from the owner's active bookings the first time it is needed (and again
+    if Redis loses it). Past days are trimmed on every claim, and the keys expire at the end of
+    the booking horizon unless the owner books again.
+    """
+
+    @staticmethod
+    def _keys(owner):
+        return [
+            redis_setup.booking_index_key(owner),
+            redis_setup.booking_index_ids_key(owner),
+            redis_setup.booking_index_marker_key(owner),
+            redis_setup.booking_index_version_key(owner),
+        ]
+
+    @staticmethod
+    def _expire_at():
+        return redis_setup.day_expiry(redis_setup.horizon_dates()[-1])
+
+    @staticmethod
+    def load(owner):
+        """
+        Rebuild the owner's index from its active bookings from today on.
+
+        Cells are only added, so a claim made meanwhile is kept; a booking cancelled while
+        this runs can be re-added, which only happens when the index is missing.
+        """
+        kind, owner_id = owner.split("/")
+        today = timezone.localdate()
+        bookings = Booking.objects.filter(status='ACTIVE', date__gte=today)
+        if kind == "team":
+            bookings = bookings.filter(booked_by_team_id=owner_id)
+        else:
+            # Team bookings also name the member who made them, but belong to the team's index.
+            bookings = bookings.filter(booked_by_user_id=owner_id, booked_by_team__isnull=True)
+
+        scores, ids = {}, {}
+        for booking_id, day, slot_id, start_time in bookings.values_list(
+            'id', 'date', 'time_slot_id', 'time_slot__start_time'
+        ):
+            cell = _cell(day.isoformat(), slot_id)
+            scores[cell] = slot_score(day, start_time)
+            ids[cell] = booking_id
+
+        index_key, ids_key, marker_key, version_key = BookingIndex._keys(owner)
+        expire_at = BookingIndex._expire_at()
+        pipe = redis_client.pipeline(transaction=False)
+        if scores:
+            pipe.zadd(index_key, scores)
+            pipe.hset(ids_key, mapping=ids)
+            pipe.expireat(index_key, expire_at)
+            pipe.expireat(ids_key, expire_at)
+        pipe.set(marker_key, 1, exat=expire_at)
+        pipe.incr(version_key)
+        pipe.expireat(version_key, expire_at)
+        pipe.execute()
+
+    @staticmethod
+    def claim(owner, day, slot, value=""):
+        """
+        Record that `owner` holds (day, slot). Returns False if it already does.
+
+        `value` is stored against the cell until confirm() replaces it with the booking id.
+        """
+        args = [
+            _cell(day.isoformat(), slot.id), slot_score(day, slot.start_time), value,
+            timezone.localdate().toordinal() * 1440, BookingIndex._expire_at(),
+        ]
+        claim = _script(CLAIM_LUA)
+        claimed = claim(keys=BookingIndex._keys(owner), args=args, client=redis_client)
+        if claimed == -1:
+            BookingIndex.load(owner)
+            claimed = claim(keys=BookingIndex._keys(owner), args=args, client=redis_client)
+        return claimed == 1
+
+    @staticmethod
+    def confirm(owner, date_str, slot_id, booking_id, pipe=None):
+        """
+        Store the booking id of a claimed (date, slot), on the given pipeline if there is one.
+        """
+        own_pipe = pipe is None
+        pipe = redis_client.pipeline(transaction=False) if own_pipe else pipe
+        pipe.hset(redis_setup.booking_index_ids_key(owner), _cell(date_str, slot_id), booking_id)
+        pipe.incr(redis_setup.booking_index_version_key(owner))
+        pipe.expireat(redis_setup.booking_index_version_key(owner), BookingIndex._expire_at())
+        if own_pipe:
+            pipe.execute()
+
+    @staticmethod
+    def release(owner, date_str, slot_id, pipe=None):
+        """
+        Drop (date, slot) from the owner's index, on the given pipeline if there is one.
+        """
+        own_pipe = pipe is None
+        pipe = redis_client.pipeline(transaction=False) if own_pipe else pipe
+        cell = _cell(date_str, slot_id)
+        pipe.zrem(redis_setup.booking_index_key(owner), cell)
+        pipe.hdel(redis_setup.booking_index_ids_key(owner), cell)
+        pipe.incr(redis_setup.booking_index_version_key(owner))
+        pipe.expireat(redis_setup.booking_index_version_key(owner), BookingIndex._expire_at())
+        if own_pipe:
+            pipe.execute()
+
+    @staticmethod
+    def versions(owners):
+        """
+        The current version of each owner's index (0 if it has never changed).
+        """
+        values = redis_client.mget([redis_setup.booking_index_version_key(owner) for owner in owners])
+        return [int(value or 0) for value in values]
+
+    @staticmethod
+    def upcoming(owner, after=None, limit=50):
+        """
+        The owner's bookings from today on, in date and slot order: dicts with the date, slot id,
+        score and booking id (None while a write-behind booking is queued, with its reference).
+
+        Pass the score of the last item as `after` to get the next page.
+        """
+        index_key, ids_key, marker_key, _ = BookingIndex._keys(owner)
+        low = f"({after}" if after is not None else timezone.localdate().toordinal() * 1440
+
+        for _ in range(2):
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.exists(marker_key)
+            pipe.zrangebyscore(index_key, low, "+inf", start=0, num=limit, withscores=True)
+            loaded, cells = pipe.execute()
+            if loaded:
+                break
+            BookingIndex.load(owner)
+
+        values = redis_client.hmget(ids_key, [cell for cell, _ in cells]) if cells else []
+        items = []
+        for (cell, score), value in zip(cells, values):
+            date_str, slot_id = cell.decode().split("/")
+            value = (value or b"").decode()
+            items.append({
+                "date": date_str,
+                "slot_id": int(slot_id),
+                "score": int(score),
+                "booking_id": int(value) if value.isdigit() else None,
+                "reference": value[len("ref:"):] if value.startswith("ref:") else None,
+            })
+        return items
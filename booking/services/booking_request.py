@@ -0,0 +1,325 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from booking.models import Room, Site, Team, TimeSlot
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+
+
+ROOM_TYPES = dict(Room.ROOM_TYPES)
+
+
+class BookingError(Exception):
+    """
+    A booking request that cannot be honoured. `code` is a stable identifier clients can branch on;
+    the message is for people.
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class TableVersion:
+    """
+    Version of the lookup tables below, shared by every process through Redis.
+
+    Saving or deleting a TimeSlot, Site or Room bumps it once the transaction commits. Each
+    process reads it at most every CHECK_SECONDS and reloads its tables when it has moved, so
+    a change reaches every worker within seconds rather than at their next TTL reload.
+    """
+    KEY = "lookup_tables_version"
+    CHECK_SECONDS = 2
+    _lock = threading.Lock()
+    _value = 0
+    _checked_at = float("-inf")
+
+    @classmethod
+    def current(cls):
+        with cls._lock:
+            if time.monotonic() - cls._checked_at > cls.CHECK_SECONDS:
+                cls._value = int(redis_client.get(cls.KEY) or 0)
+                cls._checked_at = time.monotonic()
+            return cls._value
+
+    @classmethod
+    def bump(cls):
+        redis_client.incr(cls.KEY)
+
+
+class SlotTable:
+    """
+    Process-local cache of the active time slots and their labels.
+
+    Reloaded every TTL seconds or when the shared TableVersion moves, and straight away in
+    this process when a TimeSlot changes.
+    """
+    TTL = 60
+    _lock = threading.Lock()
+    _slots = None
+    _labels = None
+    _loaded_at = 0.0
+    _version = None
+
+    @classmethod
+    def _load(cls):
+        version = TableVersion.current()
+        with cls._lock:
+            if cls._slots is None or time.monotonic() - cls._loaded_at > cls.TTL or cls._version != version:
+                slots = {slot.id: slot for slot in TimeSlot.objects.filter(is_active=True).order_by('start_time')}
+                cls._labels = {slot_id: redis_setup.slot_time_str(slot) for slot_id, slot in slots.items()}
+                cls._slots = slots
+                cls._loaded_at = time.monotonic()
+                cls._version = version
+            return cls._slots, cls._labels
+
+    @classmethod
+    def active(cls):
+        return cls._load()[0]
+
+    @classmethod
+    def get(cls, slot_id):
+        slots, labels = cls._load()
+        slot = slots.get(slot_id)
+        return (slot, labels[slot_id]) if slot else (None, None)
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._slots = None
+
+
+class SiteTable:
+    """
+    Process-local cache of the sites, by code and by id. Same refresh rules as SlotTable.
+    """
+    TTL = 60
+    _lock = threading.Lock()
+    _by_code = None
+    _by_id = None
+    _loaded_at = 0.0
+    _version = None
+
+    @classmethod
+    def _load(cls):
+        version = TableVersion.current()
+        with cls._lock:
+            if cls._by_code is None or time.monotonic() - cls._loaded_at > cls.TTL or cls._version != version:
+                sites = list(Site.objects.all())
+                cls._by_id = {site.id: site for site in sites}
+                cls._by_code = {site.code: site for site in sites}
+                cls._loaded_at = time.monotonic()
+                cls._version = version
+            return cls._by_code, cls._by_id
+
+    @classmethod
+    def get(cls, code=None):
+        """
+        The site with `code`, or the default site (BOOKING_DEFAULT_SITE) when no code is given.
+        """
+        return cls._load()[0].get(code or settings.BOOKING_DEFAULT_SITE)
+
+    @classmethod
+    def get_by_id(cls, site_id):
+        site = cls._load()[1].get(site_id)
+        if site is None:
+            # Created by another process since the last reload.
+            cls.invalidate()
+            site = cls._load()[1].get(site_id)
+        return site
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._by_code = None
+
+
+class RoomTable:
+    """
+    Process-local lookup of every room's id and capacity by (site id, room type, room name).
+
+    The capacity here is Room.bookings_per_slot: seats for shared rooms and 1 for rooms that
+    are booked whole, the unit of the Redis availability counters. Built from one query and
+    refreshed like SlotTable, so capacity changes take effect without code changes.
+    """
+    TTL = 60
+    _lock = threading.Lock()
+    _rooms = None
+    _by_site = None
+    _loaded_at = 0.0
+    _version = None
+
+    @classmethod
+    def _load(cls):
+        version = TableVersion.current()
+        with cls._lock:
+            if cls._rooms is None or time.monotonic() - cls._loaded_at > cls.TTL or cls._version != version:
+                rooms, by_site = {}, defaultdict(list)
+                for room_id, site_id, room_type, name, capacity in Room.objects.order_by('id').values_list(
+                    'id', 'site_id', 'room_type', 'name', 'capacity'
+                ):
+                    capacity = Room.bookings_per_slot(room_type, capacity)
+                    rooms[(site_id, room_type, name)] = (room_id, capacity)
+                    by_site[site_id].append((room_id, room_type, name, capacity))
+                cls._rooms, cls._by_site = rooms, dict(by_site)
+                cls._loaded_at = time.monotonic()
+                cls._version = version
+            return cls._rooms, cls._by_site
+
+    @classmethod
+    def get(cls, site_id, room_type, room_name):
+        """
+        (room id, capacity) of the room, or None if the site has no such room.
+        """
+        return cls._load()[0].get((site_id, room_type, room_name))
+
+    @classmethod
+    def at_site(cls, site_id):
+        """
+        (room id, room type, name, capacity) of every room at the site.
+        """
+        return cls._load()[1].get(site_id, [])
+
+    @classmethod
+    def capacity(cls, site_id, room_type, room_name):
+        room = cls.get(site_id, room_type, room_name)
+        return room[1] if room else 0
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._rooms = None
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def _invalidate_slot_table(sender, **kwargs):
+    SlotTable.invalidate()
+    transaction.on_commit(TableVersion.bump)
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def _invalidate_site_table(sender, **kwargs):
+    SiteTable.invalidate()
+    transaction.on_commit(TableVersion.bump)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def _invalidate_room_table(sender, **kwargs):
+    RoomTable.invalidate()
+    transaction.on_commit(TableVersion.bump)
+
+
+class BookingRequest:
+    """
+    A validated booking request, carrying everything the booking paths need: the resolved site,
+    slot, room and team, the slot label and the Redis availability key and field.
+    """
+    __slots__ = (
+        "user", "site", "date", "date_str", "slot", "slot_label", "room_type", "room_name", "room_id",
+        "capacity", "team", "near_team", "availability_key", "availability_field",
+    )
+
+    def __init__(self, *, user, site, date, slot, slot_label, room_type, room_name, room_id, capacity, team=None,
+                 near_team=None):
+        self.user = user
+        self.site = site
+        self.date = date
+        self.date_str = date.isoformat()
+        self.slot = slot
+        self.slot_label = slot_label
+        self.room_type = room_type
+        self.room_name = room_name
+        self.room_id = room_id
+        self.capacity = capacity
+        self.team = team
+        self.near_team = near_team
+        self.availability_key = redis_setup.availability_key(site.code, self.date_str)
+        self.availability_field = redis_setup.availability_field(slot.id, room_type, room_name)
+
+    @staticmethod
+    def _team_of(user, team_name):
+        try:
+            team = Team.objects.prefetch_related("members__user").get(name=team_name)
+        except Team.DoesNotExist:
+            raise BookingError("invalid_team", "Invalid team name")
+        if not any(member.user_id == user.id for member in team.members.all()):
+            raise BookingError("not_team_member", "You are not a member of the team")
+        return team
+
+    @classmethod
+    def from_data(cls, user, data):
+        """
+        Validate request data (date, slot_id, room_type, room_name and optional site, team_name and
+        near_team, the team to be seated next to in a shared room).
+
+        Raises BookingError.
+        """
+        date_str = data.get("date")
+        slot_id = data.get("slot_id")
+        room_type = data.get("room_type")
+        room_name = data.get("room_name")
+        team_name = data.get("team_name")
+
+        if not all([date_str, slot_id, room_type, room_name]):
+            raise BookingError("missing_fields", "Missing required booking fields")
+
+        try:
+            if len(date_str) != 10:
+                raise ValueError(date_str)
+            date_obj = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            raise BookingError("invalid_date", "Invalid date format. Expected YYYY-MM-DD")
+
+        try:
+            slot, slot_label = SlotTable.get(int(slot_id))
+        except (TypeError, ValueError):
+            slot = None
+        if slot is None:
+            raise BookingError("invalid_slot", "Invalid slot ID")
+
+        if room_type not in ROOM_TYPES:
+            raise BookingError("invalid_room_type", "Invalid room type")
+
+        site = SiteTable.get(data.get("site"))
+        if site is None:
+            raise BookingError("invalid_site", "Invalid site")
+
+        room = RoomTable.get(site.id, room_type, room_name)
+        if room is None:
+            raise BookingError("invalid_room", "Invalid room")
+
+        now = timezone.localtime()
+        today = now.date()
+        if date_obj < today:
+            raise BookingError("past_date", "Cannot book a past date")
+
+        horizon_days = settings.BOOKING_AVAILABILITY_HORIZON_DAYS
+        if date_obj >= today + timedelta(days=horizon_days):
+            raise BookingError("beyond_horizon", f"Bookings can only be made up to {horizon_days} days in advance")
+
+        if date_obj == today and slot.start_time < now.time():
+            raise BookingError("slot_started", "Booking is only allowed for future time slots")
+
+        team = BookingRequest._team_of(user, team_name) if team_name else None
+        near_team = None
+        if data.get("near_team") and room_type == Room.SHARED:
+            near_team = BookingRequest._team_of(user, data["near_team"])
+
+        if not team and user.age is not None and user.age < 10:
+            raise BookingError("child_booking", "Children under 10 cannot book individually")
+
+        return cls(
+            user=user, site=site, date=date_obj, slot=slot, slot_label=slot_label, room_type=room_type,
+            room_name=room_name, room_id=room[0], capacity=room[1], team=team, near_team=near_team,
+        )
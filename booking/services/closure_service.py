@@ -0,0 +1,206 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from booking.models import Booking, Room, RoomClosure, TimeSlot
+from booking.orm_manager.usage_manager import UsageManager
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+from booking.services.availability_events import AvailabilityEvents
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import BookingError, RoomTable
+from booking.services.seat_map import SeatMap
+from booking.services.waitlist_service import WaitlistService
+
+
+class ClosureService:
+    """
+    Admin closures of (room, date, slot) cells, e.g. a floor shut for maintenance.
+
+    A closure is a RoomClosure row per cell, read by the availability listing, plus
+    redis_setup.CLOSED_SEATS added to the cell's Redis counter so no reservation fits.
+    Redis commands for all cells go out in pipelined chunks, so one call can cover
+    thousands of cells.
+    """
+    MAX_CELLS = 50000
+    BATCH_SIZE = 2000
+
+    @staticmethod
+    def _select(site, *, start_date, end_date, room_names=None, floor=None, room_type=None, slot_ids=None):
+        """
+        The rooms, days and slots whose cartesian product a request covers.
+
+        Raises BookingError.
+        """
+        if end_date < start_date:
+            raise BookingError("invalid_window", "end_date must not be before start_date")
+
+        rooms = Room.objects.filter(site=site)
+        if room_names:
+            rooms = rooms.filter(name__in=room_names)
+        if floor:
+            rooms = rooms.filter(floor__name=floor)
+        if room_type:
+            rooms = rooms.filter(room_type=room_type)
+        rooms = list(rooms)
+        if not rooms:
+            raise BookingError("no_rooms", "No rooms match the request")
+
+        slots = TimeSlot.objects.filter(id__in=slot_ids) if slot_ids else TimeSlot.objects.filter(is_active=True)
+        slots = list(slots)
+        if not slots:
+            raise BookingError("no_slots", "No time slots match the request")
+
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        if len(rooms) * len(days) * len(slots) > ClosureService.MAX_CELLS:
+            raise BookingError(
+                "too_many_cells", f"A request can cover at most {ClosureService.MAX_CELLS} (room, slot) cells"
+            )
+        return rooms, days, slots
+
+    @staticmethod
+    def _seeded_days(site, days):
+        pipe = redis_client.pipeline(transaction=False)
+        for day in days:
+            pipe.exists(redis_setup.seeded_marker_key(site.code, day.isoformat()))
+        return {day for day, seeded in zip(days, pipe.execute()) if seeded}
+
+    @staticmethod
+    def _adjust(site, deltas, seeded_days):
+        """
+        Add each (room, day, slot) delta to its Redis counter, skipping days that are not seeded
+        (seeding reads closures from the DB). Returns {cell: seats used afterwards}.
+        """
+        cells = [(cell, delta) for cell, delta in deltas.items() if delta and cell[1] in seeded_days]
+        used = {}
+        for start in range(0, len(cells), ClosureService.BATCH_SIZE):
+            chunk = cells[start:start + ClosureService.BATCH_SIZE]
+            pipe = redis_client.pipeline(transaction=False)
+            for (room, day, slot), delta in chunk:
+                pipe.hincrby(redis_setup.availability_key(site.code, day.isoformat()),
+                             redis_setup.availability_field(slot.id, room.room_type, room.name), delta)
+            used.update((cell, value) for (cell, _), value in zip(chunk, pipe.execute()))
+        return used
+
+    @staticmethod
+    def _publish(site, used):
+        AvailabilityEvents.publish_many(
+            {
+                "site_code": site.code, "date_str": day.isoformat(), "slot_time_str": redis_setup.slot_time_str(slot),
+                "room_type": room.room_type, "room_name": room.name,
+                "available": max(RoomTable.capacity(site.id, room.room_type, room.name) - value, 0),
+            }
+            for (room, day, slot), value in used.items()
+        )
+
+    @staticmethod
+    def close(*, site, user, start_date, end_date, room_names=None, floor=None, room_type=None, slot_ids=None,
+              reason="", cancel_bookings=False):
+        """
+        Close every matching (room, date, slot) cell. Cells already closed are left as they are.
+
+        Active bookings in the closed cells are cancelled (and their owners notified) when
+        `cancel_bookings` is set, and otherwise returned as conflicts for the admin to handle.
+        """
+        rooms, days, slots = ClosureService._select(
+            site, start_date=start_date, end_date=end_date, room_names=room_names, floor=floor,
+            room_type=room_type, slot_ids=slot_ids,
+        )
+        rooms_by_id = {room.id: room for room in rooms}
+        slots_by_id = {slot.id: slot for slot in slots}
+        already_closed = set(RoomClosure.objects.filter(
+            room_id__in=rooms_by_id, date__in=days, time_slot_id__in=slots_by_id
+        ).values_list('room_id', 'date', 'time_slot_id'))
+        new_cells = [
+            (room, day, slot) for room in rooms for day in days for slot in slots
+            if (room.id, day, slot.id) not in already_closed
+        ]
+
+        # Block Redis first so nothing can be reserved between the DB write and the conflict check.
+        seeded_days = ClosureService._seeded_days(site, days)
+        blocked = {cell: redis_setup.CLOSED_SEATS for cell in new_cells}
+        used = ClosureService._adjust(site, blocked, seeded_days)
+        try:
+            with transaction.atomic():
+                RoomClosure.objects.bulk_create(
+                    [RoomClosure(room=room, date=day, time_slot=slot, reason=reason, created_by=user)
+                     for room, day, slot in new_cells],
+                    batch_size=ClosureService.BATCH_SIZE, ignore_conflicts=True,
+                )
+                conflicts = list(Booking.objects.select_related('booked_by_team').filter(
+                    status='ACTIVE', room_id__in=rooms_by_id, date__in=days, time_slot_id__in=slots_by_id
+                ))
+                for booking in conflicts:
+                    booking.room, booking.time_slot = rooms_by_id[booking.room_id], slots_by_id[booking.time_slot_id]
+                if cancel_bookings and conflicts:
+                    Booking.objects.filter(id__in=[booking.id for booking in conflicts]).update(
+                        status='CANCELLED', cancelled_at=now()
+                    )
+                    UsageManager.record_cancellations(conflicts)
+        except Exception:
+            ClosureService._adjust(site, {cell: -delta for cell, delta in blocked.items()}, seeded_days)
+            raise
+
+        if cancel_bookings and conflicts:
+            released = Counter()
+            pipe = redis_client.pipeline(transaction=False)
+            for booking in conflicts:
+                released[(booking.room, booking.date, booking.time_slot)] -= 1
+                BookingIndex.release(
+                    redis_setup.booking_owner(user_id=booking.booked_by_user_id, team_id=booking.booked_by_team_id),
+                    booking.date.isoformat(), booking.time_slot_id, pipe=pipe,
+                )
+                if booking.seat is not None:
+                    SeatMap.release(
+                        site.code, booking.date.isoformat(), booking.time_slot_id, booking.room.name, booking.seat,
+                        pipe=pipe,
+                    )
+            pipe.execute()
+            used.update(ClosureService._adjust(site, released, seeded_days))
+            for booking in conflicts:
+                if not booking.booked_by_user_id:
+                    continue
+                WaitlistService.notify(
+                    booking.booked_by_user_id,
+                    f"Your booking of {booking.room.name} on {booking.date.isoformat()} was cancelled: "
+                    f"the room is closed{': ' + reason if reason else ''}.",
+                    booking_id=booking.id,
+                )
+
+        ClosureService._publish(site, used)
+        return {
+            "closed": len(new_cells),
+            "already_closed": len(already_closed),
+            "cancelled": [booking.id for booking in conflicts] if cancel_bookings else [],
+            "conflicts": [] if cancel_bookings else [booking.id for booking in conflicts],
+        }
+
+    @staticmethod
+    def reopen(*, site, start_date, end_date, room_names=None, floor=None, room_type=None, slot_ids=None):
+        """
+        Lift the closures of every matching cell. Returns the number of cells reopened.
+        """
+        rooms, days, slots = ClosureService._select(
+            site, start_date=start_date, end_date=end_date, room_names=room_names, floor=floor,
+            room_type=room_type, slot_ids=slot_ids,
+        )
+        rooms_by_id = {room.id: room for room in rooms}
+        slots_by_id = {slot.id: slot for slot in slots}
+        closures = list(RoomClosure.objects.filter(
+            room_id__in=rooms_by_id, date__in=days, time_slot_id__in=slots_by_id
+        ).values_list('id', 'room_id', 'date', 'time_slot_id'))
+
+        with transaction.atomic():
+            closure_ids = [closure_id for closure_id, _, _, _ in closures]
+            for start in range(0, len(closure_ids), ClosureService.BATCH_SIZE):
+                RoomClosure.objects.filter(id__in=closure_ids[start:start + ClosureService.BATCH_SIZE]).delete()
+
+        unblocked = {
+            (rooms_by_id[room_id], day, slots_by_id[slot_id]): -redis_setup.CLOSED_SEATS
+            for _, room_id, day, slot_id in closures
+        }
+        used = ClosureService._adjust(site, unblocked, ClosureService._seeded_days(site, days))
+        ClosureService._publish(site, used)
+        return len(closures)
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import time
+
+from booking.redis_config import redis_client
+
+
+class IdempotencyService:
+    """
+    Replay the stored response for a repeated Idempotency-Key instead of running the request again.
+
+    The first request claims the key with a short-lived "pending" entry; retries that arrive
+    while it runs wait for its result, and retries after it finished get the stored response
+    back from a single Redis command (SET NX GET).
+    """
+    RESPONSE_TTL = 24 * 60 * 60
+    PENDING_TTL = 30
+    WAIT_TIMEOUT = 10
+    POLL_INTERVAL = 0.05
+
+    @staticmethod
+    def _key(user_id, idempotency_key):
+        return f"idempotency/{user_id}/{idempotency_key}"
+
+    @staticmethod
+    def fingerprint(data):
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def _replay(entry, fingerprint):
+        if entry["fingerprint"] != fingerprint:
+            return 422, {"error": "Idempotency-Key was already used with a different request body"}
+        return entry["status"], entry["body"]
+
+    @staticmethod
+    def begin(*, user_id, idempotency_key, fingerprint):
+        """
+        Claim the key for this request.
+
+        Returns None when the caller should process the request (and then call complete() or
+        abandon()), or the (status, body) to send back for a repeated request.
+        """
+        key = IdempotencyService._key(user_id, idempotency_key)
+        pending = json.dumps({"state": "pending", "fingerprint": fingerprint})
+        deadline = time.monotonic() + IdempotencyService.WAIT_TIMEOUT
+
+        existing = redis_client.set(key, pending, nx=True, get=True, ex=IdempotencyService.PENDING_TTL)
+        while existing is not None:
+            entry = json.loads(existing)
+            if entry["state"] == "done" or entry["fingerprint"] != fingerprint:
+                return IdempotencyService._replay(entry, fingerprint)
+            if time.monotonic() >= deadline:
+                return 409, {"error": "A request with this Idempotency-Key is still being processed"}
+            time.sleep(IdempotencyService.POLL_INTERVAL)
+            # Re-claim if the first request gave up or its pending entry expired.
+            existing = redis_client.set(key, pending, nx=True, get=True, ex=IdempotencyService.PENDING_TTL)
+        return None
+
+    @staticmethod
+    def complete(*, user_id, idempotency_key, fingerprint, status, body):
+        entry = {"state": "done", "fingerprint": fingerprint, "status": status, "body": body}
+        redis_client.set(
+            IdempotencyService._key(user_id, idempotency_key), json.dumps(entry, default=str),
+            ex=IdempotencyService.RESPONSE_TTL,
+        )
+
+    @staticmethod
+    def abandon(*, user_id, idempotency_key):
+        # Let a retry run the request again rather than wait for a result that will never come.
+        redis_client.delete(IdempotencyService._key(user_id, idempotency_key))
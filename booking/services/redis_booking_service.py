@@ -1,156 +1,206 @@
 from django.db import transaction
-from django.db.models import Q
 
-from booking.constants import Constants
-from booking.models import Booking, Room, TimeSlot, Team, TeamMember
-from datetime import date, time, datetime
+from booking.models import Booking, Room, TeamMember
+from booking.orm_manager.usage_manager import UsageManager
 
 from booking.redis_config import redis_client
+from booking.services.availability_events import AvailabilityEvents
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import BookingError, BookingRequest, RoomTable, SiteTable
+from booking.services import redis_setup
+from booking.services.seat_map import SeatMap
 
 
 
 class RedisBookingService:
     @staticmethod
-    def _key(date_str, slot_time_str, room_type, room_name):
-        return f"room_availability/{date_str}/{slot_time_str}/{room_type}/{room_name}"
+    def _slot_time_str(slot):
+        return redis_setup.slot_time_str(slot)
 
     @staticmethod
-    def _validate_booking_request(user, data):
-        date_str = data.get("date")
-        slot_id = data.get("slot_id")
-        room_type = data.get("room_type")
-        room_name = data.get("room_name")
-        team_name = data.get("team_name")
-
-        if not all([date_str, slot_id, room_type, room_name]):
-            raise Exception("Missing required booking fields")
-
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
-            raise Exception("Invalid date format. Expected YYYY-MM-DD")
-
-        try:
-            slot = TimeSlot.objects.get(id=slot_id)
-        except TimeSlot.DoesNotExist:
-            raise Exception("Invalid slot ID")
-
-        if date_obj < date.today():
-            raise Exception("Cannot book a past date")
-
-        if date_obj == date.today():
-            now = datetime.now().time()
-            if slot.start_time < now < slot.end_time or slot.end_time < now:
-                raise Exception("Booking is only allowed for future time slots")
-
-        team = None
-        if team_name:
-            try:
-                team = Team.objects.prefetch_related("members__user").get(name=team_name)
-            except Team.DoesNotExist:
-                raise Exception("Invalid team name")
-            if user not in team.members.all():
-                raise Exception("You are not a member of the team")
-
-        if not team and user.age is not None and user.age < 10:
-            raise Exception("Children under 10 cannot book individually")
-
-        return date_obj, slot, room_type, room_name, team
+    def _reserve(booking_request):
+        """
+        Atomically take one booking's place in the request's (date, slot, room) counter.
+
+        The counter counts bookings against RoomTable capacity: seats in shared rooms, one
+        booking for rooms booked whole, team bookings included. Returns the places left
+        afterwards, or None (and takes nothing) if the room was full.
+        """
+        redis_setup.ensure_day_seeded(booking_request.site, booking_request.date)
+        key = booking_request.availability_key
+        field = booking_request.availability_field
+        capacity = booking_request.capacity
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hincrby(key, field, 1)
+        pipe.expireat(key, redis_setup.day_expiry(booking_request.date))
+        used, _ = pipe.execute()
+        if used > capacity:
+            redis_client.hincrby(key, field, -1)
+            return None
+        return capacity - used
 
     @staticmethod
-    def _get_or_create_redis_key(date_str, slot_time_str, room_type, room_name, query):
-        key = RedisBookingService._key(date_str, slot_time_str, room_type, room_name)
-
-        if not redis_client.exists(key):
-            room_capacity_mapping = Constants.ROOM_CAPACITY_MAPPING
-            new_query = query & Q(room__room_type=room_type, room__name=room_name)
-            count = room_capacity_mapping.get(room_type) - Booking.objects.filter(new_query).count()
-            redis_client.set(key, count)
-
-        return key
+    def _release(site, date_obj, slot, room_type, room_name, seats):
+        """
+        Give `seats` back to the site's (date, slot, room) counter and return the seats now available.
+
+        If the day is not seeded the counter is left alone: seeding reads the DB, which already
+        reflects the release.
+        """
+        if not redis_client.exists(redis_setup.seeded_marker_key(site.code, date_obj.isoformat())):
+            return RedisBookingService.get_available_count(
+                site=site, date_obj=date_obj, slot=slot, room_type=room_type, room_name=room_name
+            )
+        key = redis_setup.availability_key(site.code, date_obj.isoformat())
+        field = redis_setup.availability_field(slot.id, room_type, room_name)
+        used = redis_client.hincrby(key, field, -seats)
+        return max(RoomTable.capacity(site.id, room_type, room_name) - used, 0)
 
     @staticmethod
-    def book_room(*, user, data):
-        date_obj, slot, room_type, room_name, team = RedisBookingService._validate_booking_request(user, data)
-
-        query = Q(time_slot=slot, date=date_obj, status='ACTIVE')
+    def _check_booking_rules(booking_request):
+        """
+        Apply the room-type and team rules.
+        """
+        team = booking_request.team
+        room_type = booking_request.room_type
 
         if team:
             if room_type != 'conference':
-                raise Exception("Only conference rooms can be booked by teams.")
-
-            team_members = TeamMember.objects.select_related('user').filter(team=team)
-            team_size = team_members.count()
-            seat_needed = sum(1 for m in team_members if not m.user.age or m.user.age >= 10)
-
-            if team_size < 3:
-                raise Exception("Conference rooms require at least 3 team members")
-
-            if Booking.objects.filter(Q(booked_by_team=team) & query).exists():
-                raise Exception("This team already has a booking for the selected slot")
+                raise BookingError("team_room_type", "Only conference rooms can be booked by teams.")
 
-        else:
-            seat_needed = 1
-            if Booking.objects.filter(Q(booked_by_user=user) & query).exists():
-                raise Exception("You already have a booking for the selected slot")
+            if TeamMember.objects.filter(team=team).count() < 3:
+                raise BookingError("team_too_small", "Conference rooms require at least 3 team members")
 
         if room_type == 'shared' and team:
-            raise Exception("Teams cannot book shared desks")
+            raise BookingError("team_shared_desk", "Teams cannot book shared desks")
 
-        slot_time_str = f"{slot.start_time.strftime('%H:%M')}-{slot.end_time.strftime('%H:%M')}"
-        date_str = date_obj.isoformat()
-
-        key = RedisBookingService._get_or_create_redis_key(date_str, slot_time_str, room_type, room_name, query)
+    @staticmethod
+    def _claim(booking_request, value=""):
+        """
+        Claim the slot in the user's (or team's) booking index, which is the duplicate-booking rule.
+
+        Returns the owner to release the claim with if the booking does not go through.
+        """
+        team = booking_request.team
+        owner = redis_setup.booking_owner(user_id=booking_request.user.id, team_id=team.id if team else None)
+        if not BookingIndex.claim(owner, booking_request.date, booking_request.slot, value):
+            if team:
+                raise BookingError("team_already_booked", "This team already has a booking for the selected slot")
+            raise BookingError("already_booked", "You already have a booking for the selected slot")
+        return owner
 
+    @staticmethod
+    def book_room(*, user, data):
+        booking_request = BookingRequest.from_data(user, data)
+        RedisBookingService._check_booking_rules(booking_request)
+
+        site = booking_request.site
+        date_obj = booking_request.date
+        slot = booking_request.slot
+        room_type = booking_request.room_type
+        room_name = booking_request.room_name
+        team = booking_request.team
+        slot_time_str = booking_request.slot_label
+        date_str = booking_request.date_str
+
+        owner = RedisBookingService._claim(booking_request)
+        reserved = 0
+        seat = None
         try:
             with transaction.atomic():
-                available = redis_client.get(key) or 0
-                if available is None or int(available) < seat_needed:
-                    raise Exception("No available room for the selected slot and type")
-
-                val = redis_client.decrby(key, seat_needed)
-                if val < 0:
-                    raise Exception("No available room for the selected slot and type")
-
-                booked_ids = Booking.objects.filter(
-                    room__room_type=room_type,
-                    room__name=room_name,
-                    date=date_obj,
-                    time_slot=slot,
-                    status='ACTIVE'
-                ).values_list('room_id', flat=True)
-
-                candidate_rooms = Room.objects.filter(room_type=room_type, name=room_name).exclude(id__in=booked_ids)
-                assigned_room = None
+                val = RedisBookingService._reserve(booking_request)
+                if val is None:
+                    raise BookingError("unavailable", "No available room for the selected slot and type")
+                reserved = 1
 
+                # Shared desks hand out a seat from the room's seat map; other rooms are booked whole.
                 if room_type == 'shared':
-                    for room in Room.objects.filter(room_type='shared'):
-                        count = Booking.objects.filter(
-                            room=room,
-                            time_slot=slot,
-                            date=date_obj,
-                            status='ACTIVE'
-                        ).count()
-                        if count + seat_needed <= 4:
-                            assigned_room = room
-                            break
+                    seat = SeatMap.assign(booking_request)
+                    room_free = seat is not None
                 else:
-                    assigned_room = candidate_rooms.first()
+                    room_free = not Booking.objects.filter(
+                        room_id=booking_request.room_id, date=date_obj, time_slot=slot, status='ACTIVE'
+                    ).exists()
 
-                if not assigned_room:
-                    redis_client.incrby(key, seat_needed)
+                if not room_free:
+                    RedisBookingService._release(site, date_obj, slot, room_type, room_name, reserved)
+                    BookingIndex.release(owner, date_str, slot.id)
                     return None, "No available room for the selected slot and type"
 
+                # Built from the cached lookup rather than fetched again.
+                assigned_room = Room(
+                    id=booking_request.room_id, site=site, name=room_name, room_type=room_type,
+                    capacity=booking_request.capacity,
+                )
                 booking = Booking.objects.create(
                     room=assigned_room,
-                    booked_by_user=user if not team else None,
+                    # Team bookings record the member who made them.
+                    booked_by_user=user,
                     booked_by_team=team if team else None,
                     time_slot=slot,
                     date=date_obj,
+                    seat=seat,
                     status='ACTIVE'
                 )
+                UsageManager.record_booking(booking)
+                BookingIndex.confirm(owner, date_str, slot.id, booking.id)
+                transaction.on_commit(lambda: AvailabilityEvents.publish(
+                    site_code=site.code, date_str=date_str, slot_time_str=slot_time_str, room_type=room_type,
+                    room_name=room_name, available=val
+                ))
                 return booking.id, "Booking is successful"
 
-        except Exception as err:
-            redis_client.incrby(key, seat_needed)
-            raise Exception(str(err))
+        except Exception:
+            if reserved:
+                RedisBookingService._release(site, date_obj, slot, room_type, room_name, reserved)
+            if seat is not None:
+                SeatMap.release(site.code, date_str, slot.id, room_name, seat)
+            BookingIndex.release(owner, date_str, slot.id)
+            raise
+
+    @staticmethod
+    def get_available_count(*, site, date_obj, slot, room_type, room_name):
+        redis_setup.ensure_day_seeded(site, date_obj)
+        used = redis_client.hget(
+            redis_setup.availability_key(site.code, date_obj.isoformat()),
+            redis_setup.availability_field(slot.id, room_type, room_name),
+        )
+        return max(RoomTable.capacity(site.id, room_type, room_name) - int(used or 0), 0)
+
+    @staticmethod
+    def get_available_count_for_type(*, site, date_obj, slot, room_type):
+        """
+        Places left in the slot across every room of `room_type` at the site, in one HMGET.
+        """
+        rooms = [(name, capacity) for _, kind, name, capacity in RoomTable.at_site(site.id) if kind == room_type]
+        if not rooms:
+            return 0
+        redis_setup.ensure_day_seeded(site, date_obj)
+        used = redis_client.hmget(
+            redis_setup.availability_key(site.code, date_obj.isoformat()),
+            [redis_setup.availability_field(slot.id, room_type, name) for name, _ in rooms],
+        )
+        return sum(max(capacity - int(taken or 0), 0) for (_, capacity), taken in zip(rooms, used))
+
+    @staticmethod
+    def release_booking(booking):
+        """
+        Return the place held by a cancelled booking to its Redis availability counter and seat map.
+        """
+        room = booking.room
+        site = SiteTable.get_by_id(room.site_id)
+        available = RedisBookingService._release(
+            site, booking.date, booking.time_slot, room.room_type, room.name, 1
+        )
+        BookingIndex.release(
+            redis_setup.booking_owner(user_id=booking.booked_by_user_id, team_id=booking.booked_by_team_id),
+            booking.date.isoformat(), booking.time_slot_id,
+        )
+        if booking.seat is not None:
+            SeatMap.release(site.code, booking.date.isoformat(), booking.time_slot_id, room.name, booking.seat)
+
+        AvailabilityEvents.publish(
+            site_code=site.code, date_str=booking.date.isoformat(), slot_time_str=RedisBookingService._slot_time_str(booking.time_slot),
+            room_type=room.room_type, room_name=room.name, available=available
+        )
@@ -1,50 +1,312 @@
-from datetime import datetime, timedelta
-from booking.constants import Constants
-from booking.models import TimeSlot, Room
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count
+from django.utils import timezone
+
+from booking.models import TimeSlot, Booking, RoomClosure, Site
 from booking.redis_config import redis_client
 
+logger = logging.getLogger(__name__)
+
+
+# Availability is stored as one Redis hash per site and day holding the seats *consumed*
+# per (slot, room type, room). A cell without a field has nothing booked, so only booked
+# cells take space and seeding a day costs one marker plus one field per booked cell,
+# however fine the slots or long the horizon. The per-day marker records that the hash
+# reflects the DB, which is what makes a missing field trustworthy after a Redis flush.
+#
+# A closed (room, slot) cell carries CLOSED_SEATS on top of its bookings, so no reservation
+# can fit while the closure lasts and cancellations inside it still leave it full.
+#
+# Shared rooms also have a seat map per (slot, room): a bitmap with bit N set while seat N
+# is taken, plus a hash from each taken seat to the user holding it (see SeatMap). They are
+# seeded with the day, under a marker of their own so days seeded before seat maps existed
+# get theirs on first use, and expire with it.
+#
+# The site code sits in a {hash tag}, so on Redis Cluster all of a site's keys share a
+# slot and the sites spread over the shards; a request only ever reads its own site.
+
+
+CLOSED_SEATS = 1_000_000
+
+
+def slot_time_str(slot):
+    return f"{slot.start_time.strftime('%H:%M')}-{slot.end_time.strftime('%H:%M')}"
+
+
+def availability_key(site_code, date_str):
+    return f"room_availability/{{{site_code}}}/{date_str}"
+
+
+def availability_field(slot_id, room_type, room_name):
+    return f"{slot_id}/{room_type}/{room_name}"
+
+
+def write_behind_pending_key(site_code, date_str):
+    # Places held by write-behind bookings not yet in the DB, by availability_field.
+    return f"write_behind_pending/{{{site_code}}}/{date_str}"
+
+
+def seeded_marker_key(site_code, date_str):
+    return f"room_availability_seeded/{{{site_code}}}/{date_str}"
+
+
+def seat_map_key(site_code, date_str, slot_id, room_name):
+    return f"seat_map/{{{site_code}}}/{date_str}/{slot_id}/{room_name}"
+
+
+def seat_owners_key(site_code, date_str, slot_id, room_name):
+    return f"seat_owners/{{{site_code}}}/{date_str}/{slot_id}/{room_name}"
+
+
+def seat_maps_marker_key(site_code, date_str):
+    return f"seat_maps_seeded/{{{site_code}}}/{date_str}"
+
+
+def day_expiry(day):
+    """
+    Epoch seconds at the end of `day` in the project time zone; availability keys expire then.
+    """
+    end_of_day = datetime.combine(day + timedelta(days=1), time.min)
+    return int(timezone.make_aware(end_of_day).timestamp())
+
+
+def horizon_dates(today=None, horizon_days=None):
+    today = today or timezone.localdate()
+    horizon_days = horizon_days or settings.BOOKING_AVAILABILITY_HORIZON_DAYS
+    return [today + timedelta(days=offset) for offset in range(horizon_days)]
+
+
+def booking_owner(user_id=None, team_id=None):
+    """
+    Who holds a booking for the booking index: "team/<id>" for team bookings, else "user/<id>".
+    """
+    return f"team/{team_id}" if team_id else f"user/{user_id}"
+
+
+# An owner's booking index is a sorted set of the (date, slot) cells it holds, scored by
+# slot start (see booking_index.slot_score), a hash from each cell to its booking id (or
+# "ref:<reference>" while a write-behind booking is queued) and a marker that the index
+# was loaded from the DB. The owner sits in a {hash tag} so the three share a cluster slot.
+
+def booking_index_key(owner):
+    return f"booking_index/{{{owner}}}"
+
+
+def booking_index_ids_key(owner):
+    return f"booking_index_ids/{{{owner}}}"
+
+
+def booking_index_marker_key(owner):
+    return f"booking_index_seeded/{{{owner}}}"
+
+
+def booking_index_version_key(owner):
+    """
+    Counter bumped on every change to the owner's index, so caches built from it can be keyed by it.
+    """
+    return f"booking_index_version/{{{owner}}}"
+
+
+def booked_counts(days, site_id):
+    """
+    Active bookings at a site per (date, slot id, room type, room name), from one grouped query.
+    """
+    booked = Counter()
+    for row in (
+        Booking.objects.filter(date__in=days, status='ACTIVE', room__site_id=site_id)
+        .values('date', 'time_slot_id', 'room__room_type', 'room__name')
+        .annotate(total=Count('id'))
+    ):
+        booked[(row['date'], row['time_slot_id'], row['room__room_type'], row['room__name'])] = row['total']
+    return booked
+
+
+def closed_counts(days, site_id):
+    """
+    CLOSED_SEATS per closed (date, slot id, room type, room name) at a site.
+    """
+    closed = Counter()
+    for row in RoomClosure.objects.filter(date__in=days, room__site_id=site_id).values_list(
+        'date', 'time_slot_id', 'room__room_type', 'room__name'
+    ):
+        closed[row] = CLOSED_SEATS
+    return closed
+
+
+def seated_bookings(days, site_id):
+    """
+    (date, slot id, room name, seat, user id) of the active bookings at a site that hold a seat.
+    """
+    return Booking.objects.filter(
+        date__in=days, status='ACTIVE', room__site_id=site_id, seat__isnull=False
+    ).values_list('date', 'time_slot_id', 'room__name', 'seat', 'booked_by_user_id')
+
+
+def _seed_seat_maps(pipe, site, days):
+    for day, slot_id, room_name, seat, user_id in seated_bookings(days, site.id):
+        seat_keys = [seat_map_key(site.code, day.isoformat(), slot_id, room_name),
+                     seat_owners_key(site.code, day.isoformat(), slot_id, room_name)]
+        pipe.setbit(seat_keys[0], seat, 1)
+        pipe.hsetnx(seat_keys[1], seat, user_id)
+        for key in seat_keys:
+            pipe.expireat(key, day_expiry(day))
+    for day in days:
+        pipe.set(seat_maps_marker_key(site.code, day.isoformat()), 1, exat=day_expiry(day))
+
+
+def seed_days(site, days):
+    """
+    Write a site's consumed-seat hash, seat maps and markers for each of `days` from two booking queries.
+
+    Fields are written with HSETNX and seats with SETBIT, so a reservation that raced ahead of
+    the seeder is kept. Everything goes out in one MULTI/EXEC (the keys share the site's hash
+    tag), so a day's marker is never visible without its data.
+    """
+    if not days:
+        return
+
+    booked = booked_counts(days, site.id) + closed_counts(days, site.id)
+
+    pipe = redis_client.pipeline(transaction=True)
+    for (day, slot_id, room_type, room_name), total in booked.items():
+        pipe.hsetnx(availability_key(site.code, day.isoformat()), availability_field(slot_id, room_type, room_name),
+                    total)
+    _seed_seat_maps(pipe, site, days)
+    for day in days:
+        expires_at = day_expiry(day)
+        pipe.expireat(availability_key(site.code, day.isoformat()), expires_at)
+        pipe.set(seeded_marker_key(site.code, day.isoformat()), 1, exat=expires_at)
+    pipe.execute()
+
+
+def ensure_day_seeded(site, day):
+    if not redis_client.exists(seeded_marker_key(site.code, day.isoformat())):
+        seed_days(site, [day])
+
+
+def ensure_seat_maps_seeded(site, day):
+    if not redis_client.exists(seat_maps_marker_key(site.code, day.isoformat())):
+        pipe = redis_client.pipeline(transaction=False)
+        _seed_seat_maps(pipe, site, [day])
+        pipe.execute()
+
+
+def seed_availability_horizon(today=None, horizon_days=None, sites=None):
+    """
+    Make sure every day in the rolling booking horizon has been seeded, for every site.
+
+    Days already seeded are skipped via their marker and everything expires at the end of
+    its day, so running this every few minutes is cheap and safe alongside live bookings.
+
+    Returns the (site code, day) pairs that were seeded by this run.
+    """
+    dates = horizon_dates(today, horizon_days)
+    sites = list(Site.objects.all()) if sites is None else sites
+    cells = [(site, day) for site in sites for day in dates]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for site, day in cells:
+        pipe.exists(seeded_marker_key(site.code, day.isoformat()))
+    missing = defaultdict(list)
+    for (site, day), is_seeded in zip(cells, pipe.execute()):
+        if not is_seeded:
+            missing[site].append(day)
+
+    seeded = []
+    for site, days in missing.items():
+        seed_days(site, days)
+        seeded += [(site.code, day) for day in days]
+    return seeded
+
+
+# Seeding after `migrate` must not depend on Redis being up: if it cannot be reached, the
+# seeding is queued by creating BOOKING_REDIS_SEED_PENDING_FILE, and the next startup
+# (gunicorn, the booking writer) or init_redis_availability run picks it up.
+
+def seeding_pending():
+    return os.path.exists(settings.BOOKING_REDIS_SEED_PENDING_FILE)
+
+
+def _set_seeding_pending(pending):
+    path = settings.BOOKING_REDIS_SEED_PENDING_FILE
+    if pending:
+        open(path, "a").close()
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def seed_when_reachable():
+    """
+    Seed the booking horizon, or queue the seeding for the next startup if Redis cannot be
+    reached or the database cannot be read (e.g. a schema not migrated yet).
+
+    Returns the (site code, day) pairs that were seeded, or None if the seeding was queued.
+    """
+    import redis
+
+    try:
+        seeded = seed_availability_horizon()
+    except (redis.ConnectionError, redis.TimeoutError, DatabaseError) as err:
+        logger.warning("Availability seeding queued for the next startup: %s", err)
+        _set_seeding_pending(True)
+        return None
+    _set_seeding_pending(False)
+    return seeded
+
+
+def seed_if_pending():
+    """
+    Run seeding queued by an earlier seed_when_reachable(). Returns as seed_when_reachable(), or
+    None if nothing was queued.
+    """
+    return seed_when_reachable() if seeding_pending() else None
+
+
+def purge_legacy_keys():
+    """
+    One-off cleanup of keys written before availability was sharded by site: the per-cell
+    counters (room_availability/<date>/<slot>/<type>/<room>) and the per-day hashes and markers
+    (room_availability/<date>, room_availability_seeded/<date>).
+    """
+    deleted = 0
+    for pattern in ("room_availability/[0-9]*", "room_availability_seeded/[0-9]*"):
+        for key in redis_client.scan_iter(match=pattern, count=1000):
+            deleted += redis_client.delete(key)
+    return deleted
+
+
+def generate_time_slots(slot_minutes=None, day_start=None, day_end=None):
+    """
+    Create the TimeSlot rows for the configured granularity and deactivate any others.
+
+    Old slots are kept (bookings reference them) but are no longer offered or seeded.
+    Returns (created, deactivated).
+    """
+    slot_minutes = slot_minutes or settings.BOOKING_SLOT_MINUTES
+    day_start = day_start or time.fromisoformat(settings.BOOKING_DAY_START)
+    day_end = day_end or time.fromisoformat(settings.BOOKING_DAY_END)
 
-def create_or_update_weekly_availability():
-    room_name_mapping = {}
-    rooms = Room.objects.all()
-    for each in rooms:
-        if each.room_type in room_name_mapping:
-            room_name_mapping[each.room_type].append(each.name)
-        else:
-            room_name_mapping[each.room_type] = [each.name]
-    room_capacity = Constants.ROOM_CAPACITY_MAPPING
-    slot_times = [
-        f"{slot.start_time.strftime('%H:%M')}-{slot.end_time.strftime('%H:%M')}"
-        for slot in TimeSlot.objects.all()
-    ]
-
-    # Generate keys for the next 7 days
-    today = datetime.today()
-
-    # delete previous days data
-    all_keys = redis_client.keys("room_availability/*")
-    for key in all_keys:
-        try:
-            parts = key.decode().split("/")
-            key_date = datetime.strptime(parts[1], "%Y-%m-%d").date()
-            if key_date < today:
-                redis_client.delete(key)
-                print(f"Deleted past key: {key.decode()}")
-        except Exception as e:
-            print(f"Could not parse or delete key: {key.decode()} — {e}")
-
-    # Create availability keys for next 7 days
-    for offset in range(0, 7):
-        booking_date = today + timedelta(days=offset)
-        date_str = datetime.strftime(booking_date, '%Y-%m-%d')
-
-        for slot in slot_times:
-            for room_type, count in room_capacity.items():
-                for room_name in room_name_mapping.get(room_type):
-                    redis_key = f"room_availability/{date_str}/{slot}/{room_type}/{room_name}"
-                    if not redis_client.exists(redis_key):
-                        redis_client.set(redis_key, count)
-                        print(f"Created key: {redis_key} -> {count}")
-                    else:
-                        print(f"Key exists: {redis_key}")
+    wanted = []
+    current = datetime.combine(date.today(), day_start)
+    end = datetime.combine(date.today(), day_end)
+    step = timedelta(minutes=slot_minutes)
+    while current + step <= end:
+        wanted.append((current.time(), (current + step).time()))
+        current += step
 
+    created = 0
+    keep_ids = []
+    for start_time, end_time in wanted:
+        slot, was_created = TimeSlot.objects.update_or_create(
+            start_time=start_time, end_time=end_time, defaults={'is_active': True}
+        )
+        created += was_created
+        keep_ids.append(slot.id)
+    deactivated = TimeSlot.objects.filter(is_active=True).exclude(id__in=keep_ids).update(is_active=False)
+    return created, deactivated
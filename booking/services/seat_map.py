@@ -0,0 +1,130 @@
+from booking.models import TeamMember
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+
+
+# Take a free seat below the capacity and record who holds it. With preferred seats (where
+# teammates sit) the free seat nearest to one of them is taken, otherwise the lowest free one.
+# Returns the seat, or -1 if the room is full.
+ASSIGN_LUA = """
+local capacity = tonumber(ARGV[1])
+local seat = -1
+if #ARGV > 3 then
+    local best
+    for s = 0, capacity - 1 do
+        if redis.call('GETBIT', KEYS[1], s) == 0 then
+            for i = 4, #ARGV do
+                local distance = math.abs(s - tonumber(ARGV[i]))
+                if best == nil or distance < best then
+                    best = distance
+                    seat = s
+                end
+            end
+        end
+    end
+else
+    seat = redis.call('BITPOS', KEYS[1], 0)
+    if seat >= capacity then
+        seat = -1
+    end
+end
+if seat < 0 then
+    return -1
+end
+redis.call('SETBIT', KEYS[1], seat, 1)
+redis.call('HSET', KEYS[2], seat, ARGV[2])
+redis.call('EXPIREAT', KEYS[1], ARGV[3])
+redis.call('EXPIREAT', KEYS[2], ARGV[3])
+return seat
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, so importing this module does not create the Redis client.
+    if source not in _scripts:
+        _scripts[source] = redis_client.register_script(source)
+    return _scripts[source]
+
+
+class SeatMap:
+    """
+    Seat-level assignment in shared rooms, from a bitmap per (date, slot, room) in Redis.
+
+    Seats are numbered from 0 along the room, so adjacent numbers are neighbouring desks. The
+    bitmap is the source of truth while a booking is made: one script call picks a free seat
+    and takes it, and the Booking row stores the seat under a unique constraint. Seats taken
+    in a cell are a BITCOUNT away, which is what the availability listing shows.
+    """
+
+    @staticmethod
+    def _keys(site_code, date_str, slot_id, room_name):
+        return [
+            redis_setup.seat_map_key(site_code, date_str, slot_id, room_name),
+            redis_setup.seat_owners_key(site_code, date_str, slot_id, room_name),
+        ]
+
+    @staticmethod
+    def holders(site_code, date_str, slot_id, room_name):
+        """
+        {seat: user id} of the taken seats in a cell.
+        """
+        owners = redis_client.hgetall(SeatMap._keys(site_code, date_str, slot_id, room_name)[1])
+        return {int(seat): int(user_id) for seat, user_id in owners.items()}
+
+    @staticmethod
+    def team_seats(booking_request):
+        """
+        Seats held in the requested cell by members of the request's near_team.
+        """
+        team = booking_request.near_team
+        if team is None:
+            return []
+        members = set(TeamMember.objects.filter(team=team).values_list('user_id', flat=True))
+        members.discard(booking_request.user.id)
+        holders = SeatMap.holders(
+            booking_request.site.code, booking_request.date_str, booking_request.slot.id, booking_request.room_name
+        )
+        return sorted(seat for seat, user_id in holders.items() if user_id in members)
+
+    @staticmethod
+    def assign(booking_request):
+        """
+        Take a seat for the requesting user, next to their near_team if it has anyone in the room.
+
+        Returns the seat, or None if every seat is taken.
+        """
+        site = booking_request.site
+        redis_setup.ensure_seat_maps_seeded(site, booking_request.date)
+        keys = SeatMap._keys(site.code, booking_request.date_str, booking_request.slot.id, booking_request.room_name)
+        args = [
+            booking_request.capacity, booking_request.user.id, redis_setup.day_expiry(booking_request.date),
+            *SeatMap.team_seats(booking_request),
+        ]
+        seat = _script(ASSIGN_LUA)(keys=keys, args=args, client=redis_client)
+        return seat if seat >= 0 else None
+
+    @staticmethod
+    def release(site_code, date_str, slot_id, room_name, seat, pipe=None):
+        """
+        Free a seat, on the given pipeline if there is one.
+        """
+        own_pipe = pipe is None
+        pipe = redis_client.pipeline(transaction=False) if own_pipe else pipe
+        bitmap_key, owners_key = SeatMap._keys(site_code, date_str, slot_id, room_name)
+        pipe.setbit(bitmap_key, seat, 0)
+        pipe.hdel(owners_key, seat)
+        if own_pipe:
+            pipe.execute()
+
+    @staticmethod
+    def taken_counts(site, day, cells):
+        """
+        Seats taken in each (slot id, room name) of `cells` on `day`, in the same order.
+        """
+        redis_setup.ensure_seat_maps_seeded(site, day)
+        pipe = redis_client.pipeline(transaction=False)
+        for slot_id, room_name in cells:
+            pipe.bitcount(redis_setup.seat_map_key(site.code, day.isoformat(), slot_id, room_name))
+        return pipe.execute()
@@ -0,0 +1,38 @@
+import time
+
+from booking.redis_config import redis_client
+
+
+class RedisTokenBlacklist:
+    """
+    Blacklisted refresh-token ids kept in Redis until the token would have expired anyway.
+    """
+
+    @staticmethod
+    def _key(jti):
+        return f"token_blacklist/{jti}"
+
+    @staticmethod
+    def add(jti, exp):
+        if exp <= time.time():
+            return
+        redis_client.set(RedisTokenBlacklist._key(jti), 1, exat=int(exp))
+
+    @staticmethod
+    def add_many(entries):
+        """
+        entries: iterable of (jti, exp epoch seconds). Returns the number written.
+        """
+        now = time.time()
+        pipe = redis_client.pipeline(transaction=False)
+        written = 0
+        for jti, exp in entries:
+            if exp > now:
+                pipe.set(RedisTokenBlacklist._key(jti), 1, exat=int(exp))
+                written += 1
+        pipe.execute()
+        return written
+
+    @staticmethod
+    def contains(jti):
+        return bool(redis_client.exists(RedisTokenBlacklist._key(jti)))
@@ -0,0 +1,134 @@
+import json
+
+from booking.models import Booking, TeamMember
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import SiteTable, SlotTable
+
+
+class TeamMembershipCache:
+    """
+    Short-lived cache of the teams a user belongs to, as {team name: team id}.
+
+    Entries are dropped by TeamManager when the user joins or leaves a team.
+    """
+    TTL = 300
+
+    @staticmethod
+    def _key(user_id):
+        return f"user_team_names/{user_id}"
+
+    @staticmethod
+    def teams(user_id):
+        cached = redis_client.get(TeamMembershipCache._key(user_id))
+        if cached is not None:
+            return json.loads(cached)
+        teams = dict(TeamMember.objects.filter(user_id=user_id).values_list('team__name', 'team_id'))
+        redis_client.set(TeamMembershipCache._key(user_id), json.dumps(teams), ex=TeamMembershipCache.TTL)
+        return teams
+
+    @staticmethod
+    def get(user_id):
+        """
+        Ids of the user's teams, in ascending order.
+        """
+        return sorted(TeamMembershipCache.teams(user_id).values())
+
+    @staticmethod
+    def invalidate(user_id):
+        redis_client.delete(TeamMembershipCache._key(user_id))
+
+
+class UpcomingBookingsService:
+    """
+    A user's upcoming bookings, their own and their teams', in date and slot order.
+
+    Pages are merged from the user's and each team's BookingIndex, so the DB is only asked
+    for the bookings on the page, by primary key. The cursor is the score of the last
+    (date, slot) on the page, and a page never ends part-way through a (date, slot).
+
+    Pages are cached for CACHE_TTL seconds under a key that includes the version of every
+    index they were built from. Booking and cancelling bump the version, so the next request
+    builds a fresh page.
+    """
+    CACHE_TTL = 30
+
+    @staticmethod
+    def _merge(pages, limit):
+        """
+        The first `limit` items of the owners' pages in score order (more if the last score is
+        shared), and the cursor of the next page or None.
+        """
+        items = sorted((item for page in pages for item in page), key=lambda item: item["score"])
+        page = items[:limit]
+        while page and len(page) < len(items) and items[len(page)]["score"] == page[-1]["score"]:
+            page.append(items[len(page)])
+        return page, (page[-1]["score"] if len(page) < len(items) else None)
+
+    @staticmethod
+    def _describe(booking):
+        site = SiteTable.get_by_id(booking.room.site_id)
+        return {
+            "id": booking.id,
+            "reference": booking.reference,
+            "site": site.code if site else None,
+            "room_name": booking.room.name,
+            "room_type": booking.room.room_type,
+            "seat": booking.seat,
+            "team_name": booking.booked_by_team.name if booking.booked_by_team_id else None,
+            "date": booking.date.isoformat(),
+            "start_time": booking.time_slot.start_time.isoformat(),
+            "end_time": booking.time_slot.end_time.isoformat(),
+            "status": booking.status,
+        }
+
+    @staticmethod
+    def _describe_pending(item):
+        # A write-behind booking not written yet: the index knows its date and slot only.
+        slot, _ = SlotTable.get(item["slot_id"])
+        return {
+            "id": None,
+            "reference": item["reference"],
+            "date": item["date"],
+            "start_time": slot.start_time.isoformat() if slot else None,
+            "end_time": slot.end_time.isoformat() if slot else None,
+            "status": "PENDING",
+        }
+
+    @staticmethod
+    def get(user, after=None, limit=10):
+        """
+        One page of the user's upcoming bookings: {"results": [...], "next_cursor": int or None}.
+        """
+        owners = [redis_setup.booking_owner(user_id=user.id)] + [
+            redis_setup.booking_owner(team_id=team_id) for team_id in TeamMembershipCache.get(user.id)
+        ]
+        versions = ",".join(
+            f"{owner}={version}" for owner, version in zip(owners, BookingIndex.versions(owners))
+        )
+        cache_key = f"upcoming_bookings/{user.id}/{versions}/{after or ''}/{limit}"
+        cached = redis_client.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        # One extra item per owner tells whether anything follows the page.
+        page, next_cursor = UpcomingBookingsService._merge(
+            [BookingIndex.upcoming(owner, after=after, limit=limit + 1) for owner in owners], limit
+        )
+        bookings = Booking.objects.select_related('room', 'time_slot', 'booked_by_team').in_bulk(
+            [item["booking_id"] for item in page if item["booking_id"]]
+        )
+
+        results = []
+        for item in page:
+            booking = bookings.get(item["booking_id"])
+            if booking is not None:
+                if booking.status == 'ACTIVE':
+                    results.append(UpcomingBookingsService._describe(booking))
+            elif item["reference"]:
+                results.append(UpcomingBookingsService._describe_pending(item))
+
+        response = {"results": results, "next_cursor": next_cursor}
+        redis_client.set(cache_key, json.dumps(response), ex=UpcomingBookingsService.CACHE_TTL)
+        return response
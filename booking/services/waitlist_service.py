@@ -0,0 +1,137 @@
+import json
+import time
+
+from booking.models import User
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+from booking.services.booking_request import BookingError, BookingRequest, SiteTable
+from booking.services.redis_booking_service import RedisBookingService
+
+
+class WaitlistService:
+    NOTIFICATION_LIMIT = 50
+    NOTIFICATION_TTL = 7 * 24 * 60 * 60
+    MAX_PROMOTION_ATTEMPTS = 10
+
+    @staticmethod
+    def _key(site_code, date_str, slot_id, room_type):
+        return f"waitlist/{{{site_code}}}/{date_str}/{slot_id}/{room_type}"
+
+    @staticmethod
+    def _notification_key(user_id):
+        return f"notifications/{user_id}"
+
+    @staticmethod
+    def _member(user_id, team_name):
+        return json.dumps({"user_id": user_id, "team_name": team_name or None}, sort_keys=True)
+
+    @staticmethod
+    def join(*, user, data):
+        """
+        Queue the user (or their team) for a fully booked (site, date, slot, room type).
+
+        The queue is per room type and promotion books whichever room of the type frees up,
+        so joining is refused while any room of the type still has a place.
+
+        Returns the 1-based position in the queue.
+        """
+        booking_request = BookingRequest.from_data(user, data)
+
+        available = RedisBookingService.get_available_count_for_type(
+            site=booking_request.site, date_obj=booking_request.date, slot=booking_request.slot,
+            room_type=booking_request.room_type,
+        )
+        if available > 0:
+            raise BookingError("slot_available", "The selected slot still has availability. Please book it directly.")
+
+        key = WaitlistService._key(
+            booking_request.site.code, booking_request.date_str, booking_request.slot.id, booking_request.room_type
+        )
+        team = booking_request.team
+        member = WaitlistService._member(user.id, team.name if team else None)
+
+        pipe = redis_client.pipeline()
+        pipe.zadd(key, {member: time.time()}, nx=True)
+        # Kept until the end of the booking day, like the availability keys; nothing is promoted after that.
+        pipe.expireat(key, redis_setup.day_expiry(booking_request.date))
+        pipe.zrank(key, member)
+        _, _, rank = pipe.execute()
+        return rank + 1
+
+    @staticmethod
+    def leave(*, user, site_code, date_str, slot_id, room_type, team_name=None):
+        key = WaitlistService._key(site_code, date_str, slot_id, room_type)
+        removed = redis_client.zrem(key, WaitlistService._member(user.id, team_name))
+        if not removed:
+            return {"error": "You are not on the waitlist for this slot."}
+        return {"success": "Removed from the waitlist."}
+
+    @staticmethod
+    def promote(booking):
+        """
+        Hand the capacity freed by a cancelled booking to the head of its waitlist.
+
+        ZPOPMIN is atomic, so concurrent cancellations never promote the same entry twice.
+        Entries that can no longer be booked (e.g. the user booked elsewhere meanwhile) are
+        dropped and the next one is tried.
+        """
+        site = SiteTable.get_by_id(booking.room.site_id)
+        key = WaitlistService._key(site.code, booking.date.isoformat(), booking.time_slot_id, booking.room.room_type)
+
+        for _ in range(WaitlistService.MAX_PROMOTION_ATTEMPTS):
+            popped = redis_client.zpopmin(key)
+            if not popped:
+                return None
+
+            member, score = popped[0]
+            entry = json.loads(member)
+            user = User.objects.filter(id=entry["user_id"], is_active=True).first()
+            if user is None:
+                continue
+
+            data = {
+                "site": site.code,
+                "date": booking.date.isoformat(),
+                "slot_id": booking.time_slot_id,
+                "room_type": booking.room.room_type,
+                "room_name": booking.room.name,
+                "team_name": entry["team_name"],
+            }
+            try:
+                booking_id, message = RedisBookingService.book_room(user=user, data=data)
+            except Exception as err:
+                WaitlistService.notify(user.id, f"Waitlist promotion failed: {err}")
+                continue
+
+            if booking_id is None:
+                # Someone booking directly won the freed seat; keep this entry at the head.
+                redis_client.zadd(key, {member: score})
+                return None
+
+            WaitlistService.notify(
+                user.id, "A seat opened up and you have been booked from the waitlist.", booking_id=booking_id
+            )
+            return booking_id
+
+        return None
+
+    @staticmethod
+    def notify(user_id, message, booking_id=None):
+        key = WaitlistService._notification_key(user_id)
+        payload = json.dumps({"message": message, "booking_id": booking_id, "created_at": time.time()})
+
+        pipe = redis_client.pipeline()
+        pipe.lpush(key, payload)
+        pipe.ltrim(key, 0, WaitlistService.NOTIFICATION_LIMIT - 1)
+        pipe.expire(key, WaitlistService.NOTIFICATION_TTL)
+        pipe.execute()
+
+    @staticmethod
+    def pop_notifications(user_id):
+        key = WaitlistService._notification_key(user_id)
+
+        pipe = redis_client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
@@ -0,0 +1,332 @@
+import uuid
+from collections import Counter
+from datetime import date
+
+import redis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from booking.models import Booking, Room, Site, TimeSlot
+from booking.orm_manager.usage_manager import UsageManager
+from booking.redis_config import redis_client
+from booking.services import redis_setup
+from booking.services.availability_events import AvailabilityEvents
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import BookingError, BookingRequest, SiteTable
+from booking.services.redis_booking_service import RedisBookingService
+from booking.services.seat_map import SeatMap
+
+
+DEFAULT_WRITE_BEHIND = {
+    "ENABLED": False,
+    "STREAM": "booking_writes",
+    "GROUP": "booking_writers",
+    "BATCH_SIZE": 200,
+    "BLOCK_MS": 1000,
+    # Entries a worker has held this long without acknowledging are taken over by another worker.
+    "CLAIM_IDLE_MS": 30000,
+    "STATUS_TTL": 24 * 60 * 60,
+}
+
+
+def write_behind_settings():
+    return {**DEFAULT_WRITE_BEHIND, **getattr(settings, "BOOKING_WRITE_BEHIND", {})}
+
+
+class WriteBehindService:
+    """
+    Bookings confirmed in Redis and written to the DB later, in batches, by `manage.py run_booking_writer`.
+
+    The request reserves the seat with the same Redis counter as the synchronous path, claims the
+    slot in the user's or team's booking index, appends the row to a Redis Stream and returns a reference the client
+    polls for confirmation. Entries stay in the consumer group's pending list until their batch is
+    committed, so a worker that dies mid-batch has them replayed; Booking.reference makes the replay
+    skip rows that were already inserted.
+    """
+    PENDING = "PENDING"
+    CONFIRMED = "CONFIRMED"
+    FAILED = "FAILED"
+
+    @staticmethod
+    def _status_key(reference):
+        return f"booking_status/{reference}"
+
+    @staticmethod
+    def book_room(*, user, data):
+        """
+        Reserve a room and queue the Booking row. Returns (reference, message); reference is None
+        if nothing was available.
+        """
+        booking_request = BookingRequest.from_data(user, data)
+        RedisBookingService._check_booking_rules(booking_request)
+
+        site, date_obj, slot, team = booking_request.site, booking_request.date, booking_request.slot, booking_request.team
+        room_type, room_name = booking_request.room_type, booking_request.room_name
+
+        date_str = booking_request.date_str
+        reference = uuid.uuid4().hex
+        owner = RedisBookingService._claim(booking_request, value=f"ref:{reference}")
+
+        reserved = 0
+        seat = None
+        try:
+            available = RedisBookingService._reserve(booking_request)
+            if available is None:
+                BookingIndex.release(owner, date_str, slot.id)
+                return None, "No available room for the selected slot and type"
+            reserved = 1
+            if room_type == 'shared':
+                seat = SeatMap.assign(booking_request)
+                if seat is None:
+                    RedisBookingService._release(site, date_obj, slot, room_type, room_name, reserved)
+                    BookingIndex.release(owner, date_str, slot.id)
+                    return None, "No available room for the selected slot and type"
+
+            config = write_behind_settings()
+            entry = {
+                "reference": reference,
+                "room_id": booking_request.room_id,
+                "user_id": user.id,
+                "team_id": team.id if team else "",
+                "slot_id": slot.id,
+                "date": date_str,
+                "seats": reserved,
+                "seat": seat if seat is not None else "",
+            }
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hset(WriteBehindService._status_key(reference), mapping={
+                "state": WriteBehindService.PENDING, "user_id": user.id,
+            })
+            pipe.expire(WriteBehindService._status_key(reference), config["STATUS_TTL"])
+            pending_key = redis_setup.write_behind_pending_key(site.code, date_str)
+            pipe.hincrby(pending_key, booking_request.availability_field, reserved)
+            pipe.expireat(pending_key, redis_setup.day_expiry(date_obj))
+            pipe.xadd(config["STREAM"], entry)
+            pipe.execute()
+        except Exception:
+            if reserved:
+                RedisBookingService._release(site, date_obj, slot, room_type, room_name, reserved)
+            if seat is not None:
+                SeatMap.release(site.code, date_str, slot.id, room_name, seat)
+            BookingIndex.release(owner, date_str, slot.id)
+            raise
+
+        AvailabilityEvents.publish(
+            site_code=site.code, date_str=date_str, slot_time_str=booking_request.slot_label, room_type=room_type,
+            room_name=room_name, available=available
+        )
+        return reference, "Booking accepted and pending confirmation"
+
+    @staticmethod
+    def get_status(reference, user):
+        status = redis_client.hgetall(WriteBehindService._status_key(reference))
+        if not status or int(status[b"user_id"]) != user.id:
+            return None
+        return {
+            "reference": reference,
+            "status": status[b"state"].decode(),
+            "booking_id": int(status[b"booking_id"]) if b"booking_id" in status else None,
+            "error": status[b"error"].decode() if b"error" in status else None,
+        }
+
+    @staticmethod
+    def ensure_group():
+        config = write_behind_settings()
+        try:
+            redis_client.xgroup_create(config["STREAM"], config["GROUP"], id="0", mkstream=True)
+        except redis.ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise
+
+    @staticmethod
+    def _decode(fields):
+        return {key.decode(): value.decode() for key, value in fields.items()}
+
+    @staticmethod
+    def read_batch(consumer, *, own_pending=False, block_ms=None):
+        """
+        Next entries for `consumer`: its own unacknowledged entries when `own_pending` is set,
+        otherwise entries abandoned by dead workers and then new entries.
+        """
+        config = write_behind_settings()
+        stream, group, count = config["STREAM"], config["GROUP"], config["BATCH_SIZE"]
+
+        if own_pending:
+            response = redis_client.xreadgroup(group, consumer, {stream: "0"}, count=count)
+        else:
+            claimed = redis_client.xautoclaim(
+                stream, group, consumer, min_idle_time=config["CLAIM_IDLE_MS"], start_id="0-0", count=count
+            )
+            entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+            if entries:
+                return entries
+            response = redis_client.xreadgroup(
+                group, consumer, {stream: ">"}, count=count,
+                block=config["BLOCK_MS"] if block_ms is None else block_ms,
+            )
+        return [(entry_id, fields) for _, messages in response or [] for entry_id, fields in messages if fields]
+
+    @staticmethod
+    def _build(entry, rooms):
+        booking = Booking(
+            reference=entry["reference"],
+            room_id=int(entry["room_id"]),
+            booked_by_user_id=int(entry["user_id"]) if entry["user_id"] else None,
+            booked_by_team_id=int(entry["team_id"]) if entry["team_id"] else None,
+            time_slot_id=int(entry["slot_id"]),
+            date=date.fromisoformat(entry["date"]),
+            # Entries queued before seats existed have no "seat" field.
+            seat=int(entry["seat"]) if entry.get("seat") else None,
+            status='ACTIVE',
+        )
+        if booking.room_id in rooms:
+            booking.room = rooms[booking.room_id]
+        return booking
+
+    @staticmethod
+    def write_batch(batch):
+        """
+        Insert the Booking rows for `batch` (a list of (entry id, fields)), record their outcome
+        for status polling, and acknowledge them. Returns (confirmed, failed) counts.
+        """
+        config = write_behind_settings()
+        entries = [WriteBehindService._decode(fields) for _, fields in batch]
+        references = [entry["reference"] for entry in entries]
+        rooms = Room.objects.in_bulk({int(entry["room_id"]) for entry in entries})
+
+        confirmed = dict(Booking.objects.filter(reference__in=references).values_list("reference", "id"))
+        new_entries = [entry for entry in entries if entry["reference"] not in confirmed]
+        failed = []
+
+        try:
+            with transaction.atomic():
+                created = Booking.objects.bulk_create(
+                    [WriteBehindService._build(entry, rooms) for entry in new_entries]
+                )
+                UsageManager.record_bookings(created)
+            confirmed.update((booking.reference, booking.id) for booking in created)
+        except IntegrityError:
+            # A bad row must not hold back the rest of the batch: retry the batch row by row.
+            for entry in new_entries:
+                booking = WriteBehindService._build(entry, rooms)
+                try:
+                    with transaction.atomic():
+                        booking.save()
+                        UsageManager.record_booking(booking)
+                    confirmed[booking.reference] = booking.id
+                except IntegrityError as err:
+                    failed.append((entry, str(err)))
+
+        for entry, _ in failed:
+            WriteBehindService._undo(entry, rooms)
+
+        pipe = redis_client.pipeline(transaction=False)
+        for reference, booking_id in confirmed.items():
+            pipe.hset(WriteBehindService._status_key(reference), mapping={
+                "state": WriteBehindService.CONFIRMED, "booking_id": booking_id,
+            })
+        for entry in entries:
+            if entry["reference"] in confirmed:
+                BookingIndex.confirm(
+                    redis_setup.booking_owner(user_id=entry["user_id"], team_id=entry["team_id"]),
+                    entry["date"], entry["slot_id"], confirmed[entry["reference"]], pipe=pipe,
+                )
+        for entry, error in failed:
+            pipe.hset(WriteBehindService._status_key(entry["reference"]), mapping={
+                "state": WriteBehindService.FAILED, "error": error,
+            })
+        for entry in entries:
+            # Written or given back: either way its places are no longer pending.
+            room = rooms.get(int(entry["room_id"]))
+            if room is not None:
+                pipe.hincrby(
+                    redis_setup.write_behind_pending_key(SiteTable.get_by_id(room.site_id).code, entry["date"]),
+                    redis_setup.availability_field(entry["slot_id"], room.room_type, room.name),
+                    -int(entry["seats"]),
+                )
+        entry_ids = [entry_id for entry_id, _ in batch]
+        pipe.xack(config["STREAM"], config["GROUP"], *entry_ids)
+        pipe.xdel(config["STREAM"], *entry_ids)
+        pipe.execute()
+        return len(confirmed), len(failed)
+
+    @staticmethod
+    def _undo(entry, rooms):
+        """
+        Give back the seats, seat map entry and claim of an entry that could not be written.
+        """
+        room = rooms.get(int(entry["room_id"]))
+        slot = TimeSlot.objects.filter(id=int(entry["slot_id"])).first()
+        if room is None or slot is None:
+            return
+        booking = WriteBehindService._build(entry, rooms)
+        booking.time_slot = slot
+        RedisBookingService.release_booking(booking)
+
+    @staticmethod
+    def pending_counts(site, days):
+        """
+        Places held by queued (not yet written) bookings at a site per (date, slot id, room type, room name).
+
+        Read from the per-site, per-day counters kept alongside the stream, so the cost does not
+        grow with the queue. Empty when write-behind is disabled.
+        """
+        pending = Counter()
+        if not write_behind_settings()["ENABLED"]:
+            return pending
+        pipe = redis_client.pipeline(transaction=False)
+        for day in days:
+            pipe.hgetall(redis_setup.write_behind_pending_key(site.code, day.isoformat()))
+        for day, counts in zip(days, pipe.execute()):
+            for field, places in counts.items():
+                slot_id, room_type, room_name = field.decode().split("/", 2)
+                if int(places) > 0:
+                    pending[(day, int(slot_id), room_type, room_name)] = int(places)
+        return pending
+
+    @staticmethod
+    def check_consistency(days, fix=False):
+        """
+        Compare each site's seeded days' Redis counters with the DB plus the queued bookings.
+
+        Returns a list of (site code, date, field, redis value, expected value) mismatches; with
+        `fix` the Redis counters are overwritten with the expected values. Fixing while bookings
+        are in flight can itself introduce drift, so run it with --fix when the queue is quiet.
+        """
+        mismatches = []
+        pipe = redis_client.pipeline(transaction=False)
+        for site in Site.objects.all():
+            expected = (
+                redis_setup.booked_counts(days, site.id) + redis_setup.closed_counts(days, site.id)
+                + WriteBehindService.pending_counts(site, days)
+            )
+            for day in days:
+                date_str = day.isoformat()
+                if not redis_client.exists(redis_setup.seeded_marker_key(site.code, date_str)):
+                    continue
+                key = redis_setup.availability_key(site.code, date_str)
+                actual = {field.decode(): int(value) for field, value in redis_client.hgetall(key).items()}
+                wanted = {
+                    redis_setup.availability_field(slot_id, room_type, room_name): total
+                    for (booked_day, slot_id, room_type, room_name), total in expected.items() if booked_day == day
+                }
+                for field in sorted(set(actual) | set(wanted)):
+                    if actual.get(field, 0) != wanted.get(field, 0):
+                        mismatches.append((site.code, day, field, actual.get(field, 0), wanted.get(field, 0)))
+                        if wanted.get(field, 0):
+                            pipe.hset(key, field, wanted[field])
+                        else:
+                            pipe.hdel(key, field)
+        if fix:
+            pipe.execute()
+        return mismatches
+
+    @staticmethod
+    def describe_queue():
+        config = write_behind_settings()
+        try:
+            groups = redis_client.xinfo_groups(config["STREAM"])
+        except redis.ResponseError:
+            return {"length": 0, "pending": 0}
+        pending = sum(group["pending"] for group in groups if group["name"].decode() == config["GROUP"])
+        return {"length": redis_client.xlen(config["STREAM"]), "pending": pending}
@@ -1,3 +1,891 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import date, timedelta
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
 
-# Create your tests here.
+import fakeredis
+from redis import exceptions as redis_errors
+from django.apps import apps as django_apps
+from django.core.wsgi import get_wsgi_application
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from booking import apps as booking_apps
+from booking.authentication import ActiveUserCache, CachedJWTAuthentication
+from booking.benchmarks.runner import use_redis_client
+from booking.benchmarks.stress import check_invariants
+from booking.instrumented_redis import InstrumentedRedis
+from booking.models import (
+    ArchivedBooking, Booking, DailyRoomUsage, Room, RoomClosure, Site, Team, TeamMember, TimeSlot, User,
+)
+from booking.orm_manager.archive_manager import ArchiveManager
+from booking.orm_manager.booking_manager import BookingManager
+from booking.orm_manager.usage_manager import UsageManager
+from booking.orm_manager.user_manager import UserManager
+from booking.services import redis_setup
+from booking.services.availability_events import AvailabilityEvents
+from booking.services.booking_index import BookingIndex
+from booking.services.booking_request import BookingError, BookingRequest
+from booking.services.closure_service import ClosureService
+from booking.services.idempotency_service import IdempotencyService
+from booking.services.redis_booking_service import RedisBookingService
+from booking.services.seat_map import SeatMap
+from booking.services.token_blacklist_service import RedisTokenBlacklist
+from booking.services.upcoming_bookings import UpcomingBookingsService
+from booking.services.waitlist_service import WaitlistService
+from booking.services.write_behind_service import WriteBehindService
+from booking.throttling import TeamRateThrottle
+from booking.tokens import RedisBlacklistRefreshToken
+
+
+class FakeRedisMixin:
+    """
+    Points the booking modules at a fresh in-memory Redis for each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patch = use_redis_client(InstrumentedRedis(connection_pool=fakeredis.FakeRedis().connection_pool))
+        self.redis = patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+
+
+class FakeRedisTestCase(FakeRedisMixin, TestCase):
+    pass
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class AvailabilityStreamTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(code="hq", name="Headquarters")
+        self.user = User.objects.create_user(username="streamer", password="x", dob=date(1990, 1, 1))
+
+    def test_event_is_streamed_through_the_wsgi_application(self):
+        date_str = timezone.localdate().isoformat()
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": "/api/bookings-available/stream/",
+            "QUERY_STRING": f"dates={date_str}&site=hq&token={AccessToken.for_user(self.user)}",
+        }
+        setup_testing_defaults(environ)
+        started = []
+        body = get_wsgi_application()(environ, lambda status, headers, exc_info=None: started.append(status))
+        try:
+            chunks = iter(body)
+            self.assertEqual(next(chunks), b"retry: 3000\n\n")
+            self.assertEqual(started, ["200 OK"])
+
+            AvailabilityEvents.publish(
+                site_code="hq", date_str=date_str, slot_time_str="09:00-10:00", room_type="private",
+                room_name="P1", available=0,
+            )
+            event = next(chunks).decode()
+        finally:
+            body.close()
+
+        self.assertTrue(event.startswith("event: availability\ndata: "))
+        self.assertIn('"room_name": "P1"', event)
+
+
+class UtilizationTests(TestCase):
+    def setUp(self):
+        site = Site.objects.create(code="hq", name="Headquarters")
+        self.shared = Room.objects.create(site=site, name="S1", room_type=Room.SHARED, capacity=4)
+        self.private = Room.objects.create(site=site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        for hour in range(9, 18):
+            TimeSlot.objects.create(start_time=f"{hour:02d}:00", end_time=f"{hour + 1:02d}:00")
+        self.day = timezone.localdate()
+
+    def test_shared_rooms_are_measured_in_seat_slots(self):
+        DailyRoomUsage.objects.create(date=self.day, room=self.shared, room_type=Room.SHARED, bookings=4,
+                                      individual_bookings=4)
+        DailyRoomUsage.objects.create(date=self.day, room=self.private, room_type=Room.PRIVATE, bookings=9,
+                                      individual_bookings=9)
+
+        by_day = UsageManager.utilization(start_date=self.day, end_date=self.day)
+        self.assertEqual({row["room_type"]: row["utilization"] for row in by_day},
+                         {Room.SHARED: round(4 / 36, 4), Room.PRIVATE: 1.0})
+        by_room = UsageManager.utilization(start_date=self.day, end_date=self.day, group_by="room")
+        self.assertEqual({row["room_name"]: row["utilization"] for row in by_room},
+                         {"S1": round(4 / 36, 4), "P1": 1.0})
+
+
+class TeamBookingTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        self.room = Room.objects.create(site=site, name="C1", room_type=Room.CONFERENCE, capacity=8)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.members = [
+            User.objects.create_user(username=f"member{n}", password="x", dob=date(1990, 1, 1)) for n in range(3)
+        ]
+        self.team = Team.objects.create(name="Alpha", team_lead=self.members[0])
+        for member in self.members:
+            TeamMember.objects.create(team=self.team, user=member)
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.data = {
+            "site": "hq", "date": self.day.isoformat(), "slot_id": self.slot.id, "room_type": Room.CONFERENCE,
+            "room_name": "C1", "team_name": "Alpha",
+        }
+
+    def test_team_books_a_conference_room_once(self):
+        booking_id, _ = RedisBookingService.book_room(user=self.members[0], data=self.data)
+
+        booking = Booking.objects.get(id=booking_id)
+        self.assertEqual((booking.booked_by_team_id, booking.booked_by_user_id), (self.team.id, self.members[0].id))
+        used = self.redis.hget(redis_setup.availability_key("hq", self.day.isoformat()),
+                               redis_setup.availability_field(self.slot.id, Room.CONFERENCE, "C1"))
+        self.assertEqual(int(used), 1)
+        with self.assertRaises(BookingError) as raised:
+            RedisBookingService.book_room(user=self.members[1], data=self.data)
+        self.assertEqual(raised.exception.code, "team_already_booked")
+
+    def test_booked_room_is_unavailable_to_others(self):
+        RedisBookingService.book_room(user=self.members[0], data=self.data)
+        other = User.objects.create_user(username="other", password="x", dob=date(1990, 1, 1))
+
+        with self.assertRaises(BookingError) as raised:
+            RedisBookingService.book_room(user=other, data={**self.data, "team_name": ""})
+        self.assertEqual(raised.exception.code, "unavailable")
+
+
+class TeamRateThrottleTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = User.objects.create_user(username="member", password="x", dob=date(1990, 1, 1))
+        self.outsider = User.objects.create_user(username="outsider", password="x", dob=date(1990, 1, 1))
+        self.team = Team.objects.create(name="Alpha", team_lead=self.member)
+        TeamMember.objects.create(team=self.team, user=self.member)
+
+    def bucket(self, user, data):
+        request = Request(APIRequestFactory().post("/api/bookings/", data, format="json"), parsers=[JSONParser()])
+        request.user = user
+        return TeamRateThrottle().get_bucket(request, view=None)
+
+    def test_members_share_the_team_bucket(self):
+        self.assertEqual(self.bucket(self.member, {"team_name": "Alpha"}), self.team.id)
+
+    def test_other_requests_use_the_requesters_own_bucket(self):
+        self.assertEqual(self.bucket(self.outsider, {"team_name": "Alpha"}), f"user-{self.outsider.id}")
+        self.assertEqual(self.bucket(self.member, {"team_name": "Nobody"}), f"user-{self.member.id}")
+        self.assertEqual(self.bucket(self.member, {}), f"user-{self.member.id}")
+
+    def test_membership_comes_from_the_cache(self):
+        self.bucket(self.member, {"team_name": "Alpha"})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.bucket(self.member, {"team_name": "Alpha"}), self.team.id)
+
+
+@override_settings(BOOKING_RATE_LIMITS={"USER": {"RATE": 0.001, "BURST": 1}})
+class IdempotentRetryThrottleTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="retrier", password="x", dob=date(1990, 1, 1)))
+        self.data = {"site": "hq", "date": (timezone.localdate() + timedelta(days=1)).isoformat(), "slot_id": slot.id,
+                     "room_type": Room.PRIVATE, "room_name": "P1"}
+
+    def test_retries_are_replayed_without_spending_rate_tokens(self):
+        first = self.client.post("/api/book-room/", self.data, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(first.status_code, 200)
+
+        for _ in range(3):
+            retry = self.client.post("/api/book-room/", self.data, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+            self.assertEqual((retry.status_code, retry.json()), (200, first.json()))
+        other = self.client.post("/api/book-room/", self.data, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(other.status_code, 429)
+
+
+class WaitlistTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        for name in ("P1", "P2"):
+            Room.objects.create(site=site, name=name, room_type=Room.PRIVATE, capacity=1)
+        slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.users = [
+            User.objects.create_user(username=f"user{n}", password="x", dob=date(1990, 1, 1)) for n in range(3)
+        ]
+        self.data = {
+            "site": "hq", "date": (timezone.localdate() + timedelta(days=1)).isoformat(), "slot_id": slot.id,
+            "room_type": Room.PRIVATE, "room_name": "P1",
+        }
+
+    def test_join_is_refused_while_any_room_of_the_type_is_free(self):
+        RedisBookingService.book_room(user=self.users[0], data=self.data)
+
+        with self.assertRaises(BookingError) as raised:
+            WaitlistService.join(user=self.users[2], data=self.data)
+        self.assertEqual(raised.exception.code, "slot_available")
+
+        RedisBookingService.book_room(user=self.users[1], data={**self.data, "room_name": "P2"})
+        self.assertEqual(WaitlistService.join(user=self.users[2], data=self.data), 1)
+
+    def test_queue_expires_with_the_availability_keys(self):
+        RedisBookingService.book_room(user=self.users[0], data=self.data)
+        RedisBookingService.book_room(user=self.users[1], data={**self.data, "room_name": "P2"})
+        WaitlistService.join(user=self.users[2], data=self.data)
+
+        queue_key = WaitlistService._key("hq", self.data["date"], self.data["slot_id"], Room.PRIVATE)
+        self.assertEqual(self.redis.expiretime(queue_key),
+                         self.redis.expiretime(redis_setup.availability_key("hq", self.data["date"])))
+
+
+@override_settings(BOOKING_WRITE_BEHIND={"ENABLED": True})
+class WriteBehindListingTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=self.site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        Room.objects.create(site=self.site, name="S1", room_type=Room.SHARED, capacity=4)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.user = User.objects.create_user(username="writer", password="x", dob=date(1990, 1, 1))
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def book(self, room_type, room_name):
+        data = {"site": "hq", "date": self.day.isoformat(), "slot_id": self.slot.id, "room_type": room_type,
+                "room_name": room_name}
+        reference, _ = WriteBehindService.book_room(user=self.user, data=data)
+        self.assertIsNotNone(reference)
+
+    def test_queued_bookings_are_counted_until_they_are_written(self):
+        self.book(Room.PRIVATE, "P1")
+
+        self.assertEqual(WriteBehindService.pending_counts(self.site, [self.day]),
+                         {(self.day, self.slot.id, Room.PRIVATE, "P1"): 1})
+        listing = BookingManager.get_available_slots_for_date(self.day, site=self.site)
+        self.assertEqual([room_type["type"] for room_type in listing[0]["room_types"]], [Room.SHARED])
+        self.assertEqual(listing[0]["room_types"][0]["count"], 4)
+
+        WriteBehindService.ensure_group()
+        self.assertEqual(WriteBehindService.write_batch(WriteBehindService.read_batch("test", block_ms=0)), (1, 0))
+        self.assertEqual(WriteBehindService.pending_counts(self.site, [self.day]), {})
+        self.assertEqual(WriteBehindService.check_consistency([self.day]), [])
+
+    def test_nothing_is_read_when_write_behind_is_disabled(self):
+        self.book(Room.PRIVATE, "P1")
+
+        with override_settings(BOOKING_WRITE_BEHIND={"ENABLED": False}):
+            self.assertEqual(WriteBehindService.pending_counts(self.site, [self.day]), {})
+
+
+class BookingRequestTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=self.site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        Room.objects.create(site=self.site, name="S1", room_type=Room.SHARED, capacity=4)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.early_slot = TimeSlot.objects.create(start_time="00:00", end_time="00:30")
+        self.user = User.objects.create_user(username="booker", password="x", dob=date(1990, 1, 1))
+        lead = User.objects.create_user(username="lead", password="x", dob=date(1990, 1, 1))
+        self.team = Team.objects.create(name="Alpha", team_lead=lead)
+        TeamMember.objects.create(team=self.team, user=self.user)
+        Team.objects.create(name="Beta", team_lead=lead)
+        self.today = timezone.localdate()
+        self.data = {
+            "site": "hq", "date": (self.today + timedelta(days=1)).isoformat(), "slot_id": self.slot.id,
+            "room_type": Room.PRIVATE, "room_name": "P1",
+        }
+
+    def assertRejected(self, code, user=None, **changes):
+        data = {key: value for key, value in {**self.data, **changes}.items() if value is not None}
+        with self.assertRaises(BookingError) as raised:
+            BookingRequest.from_data(user or self.user, data)
+        self.assertEqual(raised.exception.code, code)
+
+    def test_valid_request(self):
+        booking_request = BookingRequest.from_data(self.user, {**self.data, "team_name": "Alpha"})
+
+        self.assertEqual((booking_request.site, booking_request.slot, booking_request.team),
+                         (self.site, self.slot, self.team))
+        self.assertEqual((booking_request.slot_label, booking_request.capacity), ("09:00-10:00", 1))
+
+    def test_missing_fields(self):
+        for field in ("date", "slot_id", "room_type", "room_name"):
+            with self.subTest(field=field):
+                self.assertRejected("missing_fields", **{field: None})
+
+    def test_invalid_date(self):
+        for value in ("tomorrow", "2030-1-1", "2030-02-30", "20300101"):
+            with self.subTest(date=value):
+                self.assertRejected("invalid_date", date=value)
+
+    def test_unknown_references(self):
+        self.assertRejected("invalid_slot", slot_id=self.slot.id + 100)
+        self.assertRejected("invalid_slot", slot_id="nine")
+        self.assertRejected("invalid_room_type", room_type="cupboard")
+        self.assertRejected("invalid_site", site="nowhere")
+        self.assertRejected("invalid_room", room_name="P9")
+        self.assertRejected("invalid_room", room_type=Room.SHARED)
+
+    def test_dates_outside_the_booking_window(self):
+        self.assertRejected("past_date", date=(self.today - timedelta(days=1)).isoformat())
+        horizon = self.today + timedelta(days=settings.BOOKING_AVAILABILITY_HORIZON_DAYS)
+        self.assertRejected("beyond_horizon", date=horizon.isoformat())
+        self.assertRejected("slot_started", date=self.today.isoformat(), slot_id=self.early_slot.id)
+
+    def test_teams(self):
+        self.assertRejected("invalid_team", team_name="Gamma")
+        self.assertRejected("not_team_member", team_name="Beta")
+        self.assertRejected("not_team_member", room_type=Room.SHARED, room_name="S1", near_team="Beta")
+
+    def test_children_cannot_book_alone(self):
+        child = User.objects.create_user(username="child", password="x", dob=date(self.today.year - 8, 1, 1))
+
+        self.assertRejected("child_booking", user=child)
+
+
+class AvailableSlotsViewTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        for code in ("hq", "annex"):
+            site = Site.objects.create(code=code, name=code)
+            Room.objects.create(site=site, name=f"{code}-P1", room_type=Room.PRIVATE, capacity=1)
+        TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="viewer", password="x", dob=date(1990, 1, 1)))
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def test_date_and_site_come_from_the_query_string(self):
+        response = self.client.get("/api/bookings-available/", {"date": self.day.isoformat(), "site": "annex"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row["site"], row["date"]) for row in response.json()], [("annex", self.day.isoformat())])
+        self.assertEqual(response.json()[0]["room_types"][0]["available_rooms"], ["annex-P1"])
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get("/api/bookings-available/", {"date": "tomorrow"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    def test_seat_and_reference_are_archived(self):
+        site = Site.objects.create(code="hq", name="Headquarters")
+        room = Room.objects.create(site=site, name="S1", room_type=Room.SHARED, capacity=4)
+        slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        user = User.objects.create_user(username="archived", password="x", dob=date(1990, 1, 1))
+        booking = Booking.objects.create(room=room, booked_by_user=user, time_slot=slot, seat=2, reference="abc123",
+                                         date=timezone.localdate() - timedelta(days=100))
+
+        self.assertEqual(ArchiveManager.archive_bookings(older_than_days=90), 1)
+
+        archived = ArchivedBooking.objects.get(id=booking.id)
+        self.assertEqual((archived.seat, archived.reference), (2, "abc123"))
+
+
+class CancelBookingMixin:
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        self.room = Room.objects.create(site=site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.user = User.objects.create_user(username="canceller", password="x", dob=date(1990, 1, 1))
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.booking_id, _ = RedisBookingService.book_room(user=self.user, data={
+            "site": "hq", "date": self.day.isoformat(), "slot_id": self.slot.id, "room_type": Room.PRIVATE,
+            "room_name": "P1",
+        })
+
+    def used(self):
+        used = self.redis.hget(redis_setup.availability_key("hq", self.day.isoformat()),
+                               redis_setup.availability_field(self.slot.id, Room.PRIVATE, "P1"))
+        return int(used or 0)
+
+    def cancellations(self):
+        return DailyRoomUsage.objects.get(date=self.day, room=self.room).cancellations
+
+
+class CancelBookingTests(CancelBookingMixin, FakeRedisTestCase):
+    def test_failed_usage_write_leaves_the_booking_active(self):
+        with mock.patch.object(UsageManager, "record_cancellation", side_effect=DatabaseError("locked")), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            result = BookingManager.cancel_booking(self.booking_id, self.user)
+
+        self.assertIn("error", result)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Booking.objects.get(id=self.booking_id).status, "ACTIVE")
+        self.assertEqual(self.used(), 1)
+
+    def test_failed_release_still_reports_the_cancel(self):
+        with mock.patch.object(RedisBookingService, "release_booking", side_effect=ConnectionError), \
+                self.assertLogs("django", "ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            result = BookingManager.cancel_booking(self.booking_id, self.user)
+
+        self.assertEqual(result, {"success": "Booking cancelled successfully."})
+        self.assertEqual(Booking.objects.get(id=self.booking_id).status, "CANCELLED")
+        self.assertEqual(self.cancellations(), 1)
+
+
+class ConcurrentCancelTests(CancelBookingMixin, FakeRedisMixin, TransactionTestCase):
+    def test_concurrent_cancels_release_the_place_once(self):
+        # Both cancels read the booking as ACTIVE before either updates it.
+        barrier = threading.Barrier(2, timeout=10)
+
+        def synchronized_now():
+            barrier.wait()
+            return timezone.now()
+
+        results = []
+
+        def cancel():
+            try:
+                results.append(BookingManager.cancel_booking(self.booking_id, self.user))
+            finally:
+                connection.close()
+
+        with mock.patch("booking.orm_manager.booking_manager.now", synchronized_now):
+            threads = [threading.Thread(target=cancel) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sum("success" in result for result in results), 1)
+        self.assertEqual(self.used(), 0)
+        self.assertEqual(self.cancellations(), 1)
+
+
+class SeatMapAndIndexConsistencyTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=self.site, name="S1", room_type=Room.SHARED, capacity=4)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.users = [
+            User.objects.create_user(username=f"desk{n}", password="x", dob=date(1990, 1, 1)) for n in range(2)
+        ]
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.data = {"site": "hq", "date": self.day.isoformat(), "slot_id": self.slot.id,
+                     "room_type": Room.SHARED, "room_name": "S1"}
+
+    def assertConsistent(self, holders):
+        invariants = check_invariants(self.site, self.day, [user.id for user in self.users])
+        self.assertTrue(invariants["ok"], invariants)
+        self.assertEqual(SeatMap.holders("hq", self.day.isoformat(), self.slot.id, "S1"), holders)
+        self.assertEqual(SeatMap.taken_counts(self.site, self.day, [(self.slot.id, "S1")]), [len(holders)])
+
+    def indexed(self, user):
+        return [item["booking_id"] for item in BookingIndex.upcoming(redis_setup.booking_owner(user_id=user.id))]
+
+    def test_cancel_frees_the_seat_and_the_index_cell(self):
+        first, _ = RedisBookingService.book_room(user=self.users[0], data=self.data)
+        second, _ = RedisBookingService.book_room(user=self.users[1], data=self.data)
+        self.assertConsistent({0: self.users[0].id, 1: self.users[1].id})
+        self.assertEqual(self.indexed(self.users[0]), [first])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingManager.cancel_booking(first, self.users[0])
+
+        self.assertConsistent({1: self.users[1].id})
+        self.assertEqual(self.indexed(self.users[0]), [])
+        rebooked, _ = RedisBookingService.book_room(user=self.users[0], data=self.data)
+        self.assertEqual(Booking.objects.get(id=rebooked).seat, 0)
+        self.assertEqual(self.indexed(self.users[1]), [second])
+
+    def test_failed_db_write_gives_everything_back(self):
+        with mock.patch.object(UsageManager, "record_booking", side_effect=DatabaseError("locked")), \
+                self.assertRaises(DatabaseError):
+            RedisBookingService.book_room(user=self.users[0], data=self.data)
+
+        self.assertFalse(Booking.objects.exists())
+        self.assertConsistent({})
+        self.assertEqual(self.indexed(self.users[0]), [])
+        booking_id, _ = RedisBookingService.book_room(user=self.users[0], data=self.data)
+        self.assertIsNotNone(booking_id)
+
+    @override_settings(BOOKING_WRITE_BEHIND={"ENABLED": True})
+    def test_failed_write_behind_entry_gives_everything_back(self):
+        reference, _ = WriteBehindService.book_room(user=self.users[0], data=self.data)
+        self.assertEqual(SeatMap.holders("hq", self.day.isoformat(), self.slot.id, "S1"), {0: self.users[0].id})
+
+        WriteBehindService.ensure_group()
+        with mock.patch.object(Booking.objects, "bulk_create", side_effect=IntegrityError), \
+                mock.patch.object(Booking, "save", side_effect=IntegrityError("duplicate")):
+            self.assertEqual(WriteBehindService.write_batch(WriteBehindService.read_batch("test", block_ms=0)), (0, 1))
+
+        self.assertEqual(WriteBehindService.get_status(reference, self.users[0])["status"], WriteBehindService.FAILED)
+        self.assertEqual(WriteBehindService.pending_counts(self.site, [self.day]), {})
+        self.assertConsistent({})
+        self.assertEqual(self.indexed(self.users[0]), [])
+
+
+class CachedJWTAuthenticationTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="cached", password="x", dob=date(1990, 1, 1))
+        self.token = AccessToken.for_user(self.user)
+
+    def authenticate(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_user_is_built_from_the_cache(self):
+        self.authenticate()
+
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.id, user.username, user.dob), (self.user.id, "cached", date(1990, 1, 1)))
+
+    def test_deactivation_through_user_manager_takes_effect_at_once(self):
+        self.authenticate()
+
+        UserManager.deactivate_user(self.user.id)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        UserManager.activate_user(self.user.id)
+        self.assertEqual(self.authenticate().id, self.user.id)
+
+    def test_other_deactivations_are_seen_once_the_entry_expires(self):
+        self.authenticate()
+        User.objects.filter(id=self.user.id).update(is_active=False)
+
+        # Within the window the cached entry still lets the user in, for at most TTL seconds.
+        self.assertEqual(self.authenticate().id, self.user.id)
+        self.assertLessEqual(self.redis.ttl(ActiveUserCache._key(self.user.id)), ActiveUserCache.TTL)
+        self.redis.delete(ActiveUserCache._key(self.user.id))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_unreachable_redis_falls_back_to_the_db(self):
+        with mock.patch.object(self.redis, "get", side_effect=redis_errors.ConnectionError), \
+                mock.patch.object(self.redis, "set", side_effect=redis_errors.ConnectionError):
+            self.assertEqual(self.authenticate().id, self.user.id)
+
+
+class RedisTokenBlacklistTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="leaver", password="x", dob=date(1990, 1, 1))
+        self.token = RedisBlacklistRefreshToken.for_user(self.user)
+        self.jti = self.token["jti"]
+
+    def test_blacklisted_token_is_rejected_from_redis(self):
+        self.token.blacklist()
+
+        self.assertEqual(self.redis.expiretime(RedisTokenBlacklist._key(self.jti)), self.token["exp"])
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            self.token.check_blacklist()
+
+    def test_unreachable_redis_falls_back_to_the_db(self):
+        self.token.blacklist()
+        self.redis.flushall()
+
+        with mock.patch.object(self.redis, "exists", side_effect=redis_errors.ConnectionError):
+            with self.assertRaises(TokenError):
+                self.token.check_blacklist()
+            RedisBlacklistRefreshToken.for_user(self.user).check_blacklist()
+
+    def test_backfill_copies_the_db_blacklist_into_redis(self):
+        self.token.blacklist()
+        self.redis.flushall()
+        self.assertFalse(RedisTokenBlacklist.contains(self.jti))
+
+        call_command("backfill_token_blacklist", stdout=StringIO())
+
+        self.assertTrue(RedisTokenBlacklist.contains(self.jti))
+
+    def test_expired_tokens_are_not_stored(self):
+        RedisTokenBlacklist.add("expired", time.time() - 1)
+
+        self.assertEqual(RedisTokenBlacklist.add_many([("old", time.time() - 1), ("new", time.time() + 60)]), 1)
+        self.assertEqual((RedisTokenBlacklist.contains("expired"), RedisTokenBlacklist.contains("old")), (False, False))
+
+
+class SeedingTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.create(code="hq", name="Headquarters")
+        private = Room.objects.create(site=self.site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        shared = Room.objects.create(site=self.site, name="S1", room_type=Room.SHARED, capacity=4)
+        self.slot = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.user = User.objects.create_user(username="seeded", password="x", dob=date(1990, 1, 1))
+        self.day = timezone.localdate() + timedelta(days=1)
+        Booking.objects.create(room=private, booked_by_user=self.user, time_slot=self.slot, date=self.day)
+        Booking.objects.create(room=shared, booked_by_user=self.user, time_slot=self.slot, date=self.day, seat=2)
+        self.key = redis_setup.availability_key("hq", self.day.isoformat())
+
+    def counters(self):
+        return {field.decode(): int(value) for field, value in self.redis.hgetall(self.key).items()}
+
+    def test_horizon_is_seeded_from_the_db_once(self):
+        seeded = redis_setup.seed_availability_horizon()
+
+        self.assertIn(("hq", self.day), seeded)
+        self.assertEqual(self.counters(), {
+            redis_setup.availability_field(self.slot.id, Room.PRIVATE, "P1"): 1,
+            redis_setup.availability_field(self.slot.id, Room.SHARED, "S1"): 1,
+        })
+        self.assertEqual(SeatMap.holders("hq", self.day.isoformat(), self.slot.id, "S1"), {2: self.user.id})
+        self.assertEqual(self.redis.expiretime(self.key), redis_setup.day_expiry(self.day))
+        self.assertEqual(redis_setup.seed_availability_horizon(), [])
+
+    def test_reseeding_keeps_counters_written_since(self):
+        redis_setup.seed_days(self.site, [self.day])
+        shared_field = redis_setup.availability_field(self.slot.id, Room.SHARED, "S1")
+        # A reservation lands after the first seeding; then the day's marker is lost.
+        self.redis.hincrby(self.key, shared_field, 1)
+        self.redis.delete(redis_setup.seeded_marker_key("hq", self.day.isoformat()))
+
+        redis_setup.seed_days(self.site, [self.day])
+
+        self.assertEqual(self.counters()[shared_field], 2)
+        self.assertEqual(self.counters()[redis_setup.availability_field(self.slot.id, Room.PRIVATE, "P1")], 1)
+
+
+class IdempotencyServiceTests(FakeRedisTestCase):
+    def begin(self, fingerprint="a"):
+        return IdempotencyService.begin(user_id=1, idempotency_key="k", fingerprint=fingerprint)
+
+    def test_finished_request_is_replayed(self):
+        self.assertIsNone(self.begin())
+        IdempotencyService.complete(user_id=1, idempotency_key="k", fingerprint="a", status=200, body={"booking_id": 7})
+
+        self.assertEqual(self.begin(), (200, {"booking_id": 7}))
+        self.assertEqual(IdempotencyService.begin(user_id=2, idempotency_key="k", fingerprint="a"), None)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.assertIsNone(self.begin())
+
+        self.assertEqual(self.begin(fingerprint="b")[0], 422)
+        IdempotencyService.complete(user_id=1, idempotency_key="k", fingerprint="a", status=200, body={})
+        self.assertEqual(self.begin(fingerprint="b")[0], 422)
+
+    @mock.patch.object(IdempotencyService, "WAIT_TIMEOUT", 0.1)
+    def test_retry_of_a_request_still_running_times_out(self):
+        self.assertIsNone(self.begin())
+
+        self.assertEqual(self.begin()[0], 409)
+
+    def test_abandoned_key_can_be_claimed_again(self):
+        self.assertIsNone(self.begin())
+        IdempotencyService.abandon(user_id=1, idempotency_key="k")
+
+        self.assertIsNone(self.begin())
+
+
+class RoomClosureViewTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username="admin", password="x", dob=date(1990, 1, 1), is_admin=True)
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def close(self, **data):
+        return self.client.post("/api/rooms/closures/", {"site": "hq", "start_date": self.day.isoformat(), **data},
+                                format="json")
+
+    def test_invalid_requests_get_a_400_with_a_code(self):
+        yesterday = (self.day - timedelta(days=1)).isoformat()
+        for data, code in [
+            ({"end_date": yesterday}, "invalid_window"),
+            ({"rooms": ["P9"]}, "no_rooms"),
+            ({"slot_ids": [999]}, "no_slots"),
+            ({"start_date": "soon"}, "invalid_date"),
+            ({"site": "nowhere"}, "invalid_site"),
+        ]:
+            with self.subTest(code=code):
+                response = self.close(**data)
+                self.assertEqual((response.status_code, response.json()["code"]), (400, code))
+
+        with mock.patch.object(ClosureService, "MAX_CELLS", 0):
+            self.assertEqual(self.close().json()["code"], "too_many_cells")
+        self.assertFalse(RoomClosure.objects.exists())
+
+
+class ClosureServiceTests(CancelBookingMixin, FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = Site.objects.get(code="hq")
+        self.admin = User.objects.create_user(username="closer", password="x", dob=date(1990, 1, 1), is_admin=True)
+
+    def close(self, **kwargs):
+        return ClosureService.close(site=self.site, user=self.admin, start_date=self.day, end_date=self.day, **kwargs)
+
+    def test_close_blocks_the_cell_and_reopen_restores_it(self):
+        result = self.close()
+
+        self.assertEqual((result["closed"], result["conflicts"]), (1, [self.booking_id]))
+        self.assertEqual(self.used(), 1 + redis_setup.CLOSED_SEATS)
+        self.assertEqual(self.close()["already_closed"], 1)
+        self.assertEqual(self.used(), 1 + redis_setup.CLOSED_SEATS)
+
+        self.assertEqual(ClosureService.reopen(site=self.site, start_date=self.day, end_date=self.day), 1)
+        self.assertEqual(self.used(), 1)
+        self.assertFalse(RoomClosure.objects.exists())
+
+    def test_close_cancelling_bookings_releases_their_seats(self):
+        result = self.close(cancel_bookings=True)
+
+        self.assertEqual(result["cancelled"], [self.booking_id])
+        self.assertEqual(Booking.objects.get(id=self.booking_id).status, "CANCELLED")
+        self.assertEqual(self.used(), redis_setup.CLOSED_SEATS)
+        self.assertEqual(self.cancellations(), 1)
+
+    def test_failed_close_rolls_back_the_block(self):
+        with mock.patch.object(UsageManager, "record_cancellations", side_effect=DatabaseError("locked")):
+            with self.assertRaises(DatabaseError):
+                self.close(cancel_bookings=True)
+
+        self.assertEqual(self.used(), 1)
+        self.assertFalse(RoomClosure.objects.exists())
+        self.assertEqual(Booking.objects.get(id=self.booking_id).status, "ACTIVE")
+
+
+class UpcomingBookingsTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        site = Site.objects.create(code="hq", name="Headquarters")
+        Room.objects.create(site=site, name="P1", room_type=Room.PRIVATE, capacity=1)
+        for name in ("C1", "C2"):
+            Room.objects.create(site=site, name=name, room_type=Room.CONFERENCE, capacity=8)
+        self.nine = TimeSlot.objects.create(start_time="09:00", end_time="10:00")
+        self.ten = TimeSlot.objects.create(start_time="10:00", end_time="11:00")
+        self.user, self.lead, other = (
+            User.objects.create_user(username=name, password="x", dob=date(1990, 1, 1))
+            for name in ("me", "lead", "other")
+        )
+        for team_name in ("Alpha", "Beta"):
+            team = Team.objects.create(name=team_name, team_lead=self.lead)
+            for member in (self.user, self.lead, other):
+                TeamMember.objects.create(team=team, user=member)
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def book(self, user, day, slot, room_name, team_name=""):
+        booking_id, _ = RedisBookingService.book_room(user=user, data={
+            "site": "hq", "date": day.isoformat(), "slot_id": slot.id, "room_name": room_name,
+            "room_type": Room.PRIVATE if room_name == "P1" else Room.CONFERENCE, "team_name": team_name,
+        })
+        return booking_id
+
+    def test_merge_orders_by_score_and_keeps_ties_together(self):
+        pages = [[{"score": 1}, {"score": 3}, {"score": 5}], [{"score": 2}, {"score": 3}], []]
+
+        page, cursor = UpcomingBookingsService._merge(pages, 2)
+        self.assertEqual(([item["score"] for item in page], cursor), ([1, 2], 2))
+        page, cursor = UpcomingBookingsService._merge(pages, 3)
+        self.assertEqual(([item["score"] for item in page], cursor), ([1, 2, 3, 3], 3))
+        page, cursor = UpcomingBookingsService._merge(pages, 5)
+        self.assertEqual(([item["score"] for item in page], cursor), ([1, 2, 3, 3, 5], None))
+
+    def test_own_and_team_bookings_are_merged_in_slot_order(self):
+        later = self.book(self.user, self.day + timedelta(days=1), self.nine, "P1")
+        own = self.book(self.user, self.day, self.ten, "P1")
+        alpha = self.book(self.lead, self.day, self.nine, "C1", team_name="Alpha")
+        beta = self.book(self.lead, self.day, self.ten, "C2", team_name="Beta")
+        self.book(self.lead, self.day, self.nine, "P1")  # the lead's own booking is not listed
+
+        first = UpcomingBookingsService.get(self.user, limit=2)
+        # The page runs past the limit rather than split the two 10:00 bookings.
+        self.assertEqual([(item["id"], item["team_name"]) for item in first["results"][:1]], [(alpha, "Alpha")])
+        self.assertEqual({item["id"] for item in first["results"][1:]}, {own, beta})
+
+        second = UpcomingBookingsService.get(self.user, after=first["next_cursor"], limit=2)
+        self.assertEqual(([item["id"] for item in second["results"]], second["next_cursor"]), ([later], None))
+
+    def test_cancelled_bookings_leave_the_cached_page(self):
+        own = self.book(self.user, self.day, self.ten, "P1")
+        self.assertEqual([item["id"] for item in UpcomingBookingsService.get(self.user)["results"]], [own])
+
+        BookingManager.cancel_booking(own, self.user)
+        self.assertEqual(UpcomingBookingsService.get(self.user)["results"], [])
+
+
+class PostMigrateSeedingTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seed = self.patch(redis_setup, "seed_when_reachable", return_value=[("hq", timezone.localdate())])
+        self.real_is_test_database = booking_apps._is_test_database
+        self.is_test_database = self.patch(booking_apps, "_is_test_database", return_value=False)
+        self.fully_migrated = self.patch(booking_apps, "_fully_migrated", return_value=True)
+
+    def patch(self, target, attribute, **kwargs):
+        patcher = mock.patch.object(target, attribute, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def migrated(self, **kwargs):
+        stdout = StringIO()
+        booking_apps.seed_redis_after_migrate(
+            sender=None, **{"plan": [(mock.Mock(), False)], "apps": django_apps, "stdout": stdout, **kwargs}
+        )
+        return stdout.getvalue()
+
+    def test_seeds_after_a_full_forward_migration(self):
+        self.assertIn("seeded for 1 site day(s)", self.migrated())
+        self.seed.assert_called_once_with()
+
+        self.seed.return_value = None
+        self.assertIn("seeding queued", self.migrated())
+
+    def assertSkipped(self, name, **kwargs):
+        self.seed.reset_mock()
+        with self.subTest(name):
+            self.assertEqual(self.migrated(**kwargs), "")
+            self.seed.assert_not_called()
+
+    def test_guards(self):
+        self.assertSkipped("flush", plan=None)
+        self.assertSkipped("backwards step", plan=[(mock.Mock(), False), (mock.Mock(), True)])
+        self.assertSkipped("other database", using="replica")
+        self.assertSkipped("no booking tables", apps=mock.Mock(get_model=mock.Mock(side_effect=LookupError)))
+        self.assertSkipped("no app registry", apps=None)
+        with override_settings(BOOKING_REDIS_SEED_AFTER_MIGRATE=False):
+            self.assertSkipped("setting off")
+        self.fully_migrated.return_value = False
+        self.assertSkipped("partial migration")
+        self.fully_migrated.return_value = True
+        self.is_test_database.return_value = True
+        self.assertSkipped("test database")
+
+    def test_test_database_is_recognised(self):
+        self.assertTrue(self.real_is_test_database(connection))
+
+
+class SeedPendingFileTests(FakeRedisTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.pending_file = os.path.join(directory.name, "seed_pending")
+        settings_override = override_settings(BOOKING_REDIS_SEED_PENDING_FILE=self.pending_file)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_unreachable_redis_or_database_queues_the_seeding(self):
+        for error in (redis_errors.ConnectionError("down"), DatabaseError("no such table")):
+            with self.subTest(type(error).__name__):
+                with mock.patch.object(redis_setup, "seed_availability_horizon", side_effect=error), \
+                        self.assertLogs("booking", "WARNING"):
+                    self.assertIsNone(redis_setup.seed_when_reachable())
+                self.assertTrue(redis_setup.seeding_pending())
+
+        with mock.patch.object(redis_setup, "seed_availability_horizon", return_value=[]) as seed:
+            self.assertEqual(redis_setup.seed_if_pending(), [])
+            self.assertFalse(os.path.exists(self.pending_file))
+            self.assertIsNone(redis_setup.seed_if_pending())
+        seed.assert_called_once_with()
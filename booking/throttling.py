@@ -0,0 +1,194 @@
+import math
+import uuid
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from booking.instrumentation import registry
+from booking.redis_config import redis_client
+from booking.services.upcoming_bookings import TeamMembershipCache
+
+
+DEFAULT_RATE_LIMITS = {
+    "ENABLED": True,
+    # Token buckets: up to BURST requests at once, refilled at RATE requests per second.
+    "USER": {"RATE": 0.5, "BURST": 5},
+    "TEAM": {"RATE": 1.0, "BURST": 10},
+    "ENDPOINT": {"RATE": 200.0, "BURST": 400},
+    # Booking writes allowed in flight across all workers; the rest are shed with 429.
+    "MAX_IN_FLIGHT": 100,
+    # Seconds after which an in-flight slot left behind by a crashed worker is reclaimed.
+    "IN_FLIGHT_TIMEOUT": 30,
+    "RETRY_AFTER": 1,
+}
+
+
+def rate_limit_settings():
+    return {**DEFAULT_RATE_LIMITS, **getattr(settings, "BOOKING_RATE_LIMITS", {})}
+
+
+# Refill the bucket for the time elapsed since its last use (by the Redis clock, so all
+# workers agree), then try to take one token. Returns {allowed, seconds until a token}.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# Track in-flight requests as a sorted set scored by start time, dropping entries older
+# than the timeout first. Returns 1 if the request was admitted.
+ADMISSION_LUA = """
+local limit = tonumber(ARGV[2])
+local timeout = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - timeout)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], timeout)
+return 1
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    # Registered on first use, so importing this module does not create the Redis client.
+    if source not in _scripts:
+        _scripts[source] = redis_client.register_script(source)
+    return _scripts[source]
+
+
+class RedisTokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle shared by all workers through Redis.
+
+    Subclasses set `scope` (the BOOKING_RATE_LIMITS entry) and implement get_bucket().
+    If Redis is unreachable requests are let through; the booking itself needs Redis anyway.
+    """
+    scope = None
+
+    def get_bucket(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        config = rate_limit_settings()
+        if not config["ENABLED"]:
+            return True
+
+        bucket = self.get_bucket(request, view)
+        if bucket is None:
+            return True
+
+        limits = config[self.scope]
+        try:
+            allowed, wait = _script(TOKEN_BUCKET_LUA)(
+                keys=[f"rate_limit/{self.scope.lower()}/{bucket}"], args=[limits["RATE"], limits["BURST"]],
+                client=redis_client,
+            )
+        except redis.RedisError:
+            return True
+
+        self._wait = float(wait)
+        if allowed:
+            return True
+        registry.inc("booking_rate_limited_total", help_text="Requests rejected by a rate limit.",
+                     scope=self.scope.lower(), endpoint=type(view).__name__)
+        return False
+
+    def wait(self):
+        return math.ceil(self._wait)
+
+
+class UserRateThrottle(RedisTokenBucketThrottle):
+    scope = "USER"
+
+    def get_bucket(self, request, view):
+        return request.user.id if request.user and request.user.is_authenticated else None
+
+
+class TeamRateThrottle(RedisTokenBucketThrottle):
+    """
+    Shared bucket for a team's bookings.
+
+    The team_name in the body is only trusted once the requester is found to be a member,
+    from the cached membership; otherwise the request is counted against a bucket of the
+    requester's own, so naming someone else's team cannot drain theirs.
+    """
+    scope = "TEAM"
+
+    def get_bucket(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        team_name = request.data.get("team_name") if hasattr(request.data, "get") else None
+        team_id = TeamMembershipCache.teams(request.user.id).get(team_name) if isinstance(team_name, str) else None
+        return team_id if team_id is not None else f"user-{request.user.id}"
+
+
+class EndpointRateThrottle(RedisTokenBucketThrottle):
+    scope = "ENDPOINT"
+
+    def get_bucket(self, request, view):
+        return type(view).__name__
+
+
+BOOKING_WRITE_THROTTLES = [UserRateThrottle, TeamRateThrottle, EndpointRateThrottle]
+
+
+@contextmanager
+def admission_control(name):
+    """
+    Cap the number of `name` requests running at once across all workers.
+
+    Raises Throttled (429 with Retry-After) when the cap is reached, before any DB work starts.
+    """
+    config = rate_limit_settings()
+    if not config["ENABLED"]:
+        yield
+        return
+
+    key = f"admission/{name}"
+    ticket = uuid.uuid4().hex
+    try:
+        admitted = _script(ADMISSION_LUA)(
+            keys=[key], args=[ticket, config["MAX_IN_FLIGHT"], config["IN_FLIGHT_TIMEOUT"]], client=redis_client
+        )
+    except redis.RedisError:
+        admitted, ticket = 1, None
+
+    if not admitted:
+        registry.inc("booking_admission_rejected_total", help_text="Requests shed by admission control.",
+                     operation=name)
+        raise Throttled(wait=config["RETRY_AFTER"])
+
+    registry.inc("booking_admission_admitted_total", help_text="Requests admitted by admission control.",
+                 operation=name)
+    try:
+        yield
+    finally:
+        if ticket is not None:
+            try:
+                redis_client.zrem(key, ticket)
+            except redis.RedisError:
+                pass
@@ -0,0 +1,34 @@
+import redis
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from booking.services.token_blacklist_service import RedisTokenBlacklist
+
+
+class RedisBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist checks are served from Redis.
+
+    Issuing a token no longer inserts an OutstandingToken row. Blacklisting still writes
+    the token_blacklist tables so the Redis set can be rebuilt with backfill_token_blacklist.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return Token.for_user.__func__(cls, user)
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        try:
+            blacklisted = RedisTokenBlacklist.contains(jti)
+        except redis.RedisError:
+            return super().check_blacklist()
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        RedisTokenBlacklist.add(self.payload[api_settings.JTI_CLAIM], self.payload["exp"])
+        return result
@@ -3,7 +3,9 @@ from django.urls import path
 
 from .api_views import AvailableSlotsView, CreateBookingView, CustomTokenView, CustomTokenRefreshView, LogoutView, \
     UserCreateView, TeamCreateView, AddUserToTeamView, RemoveUserFromTeamView, DeactivateUserView, ActivateUserView, \
-    BookingHistoryView, CancelBookingView, AllBookingsView
+    BookingHistoryView, CancelBookingView, AllBookingsView, WaitlistJoinView, WaitlistLeaveView, NotificationsView, \
+    AvailabilityStreamView, MetricsView, UtilizationAnalyticsView, BookingStatusView, RoomClosureView, \
+    UpcomingBookingsView
 
 urlpatterns = [
     path('login/', CustomTokenView.as_view(), name='token_obtain_pair'),
@@ -11,10 +13,18 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='token_logout'),
 
     path('book-room/', CreateBookingView.as_view(), name='book-room'),
+    path('bookings/status/<str:reference>/', BookingStatusView.as_view(), name='booking-status'),
     path('bookings-available/', AvailableSlotsView.as_view(), name='bookings-available'),
+    path('bookings-available/stream/', AvailabilityStreamView.as_view(), name='bookings-available-stream'),
     path('bookings/history/', BookingHistoryView.as_view(), name='booking-history'),
+    path('bookings/upcoming/', UpcomingBookingsView.as_view(), name='upcoming-bookings'),
     path('bookings/all/', AllBookingsView.as_view(), name='all-bookings'),
+    path('rooms/closures/', RoomClosureView.as_view(), name='room-closures'),
+    path('analytics/utilization/', UtilizationAnalyticsView.as_view(), name='analytics-utilization'),
     path('cancel/<int:booking_id>/', CancelBookingView.as_view(), name='cancel-booking'),
+    path('waitlist/join/', WaitlistJoinView.as_view(), name='waitlist-join'),
+    path('waitlist/leave/', WaitlistLeaveView.as_view(), name='waitlist-leave'),
+    path('notifications/', NotificationsView.as_view(), name='notifications'),
 
     path('users/add/', UserCreateView.as_view(), name='add-user'),
     path('teams/add/', TeamCreateView.as_view(), name='add-team'),
@@ -22,4 +32,6 @@ urlpatterns = [
     path('teams/remove-user/', RemoveUserFromTeamView.as_view(), name='remove-user-from-team'),
     path('users/deactivate/', DeactivateUserView.as_view(), name='deactivate-user'),
     path('users/activate/', ActivateUserView.as_view(), name='activate-user'),
+
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration for the API, read from the environment:
+
+    gunicorn -c workspace_booking/gunicorn.conf.py workspace_booking.wsgi:application
+
+The project database is SQLite, which lets one connection write at a time: more processes
+or threads only queue on its lock and fail with "database is locked" once the wait runs out.
+The default is therefore two `sync` workers, the best of the measured setups (see
+docs/deployment.md). Raise GUNICORN_WORKERS or switch to `gthread` only on a client/server
+database such as PostgreSQL.
+"""
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# The `stream` service sets GUNICORN_WORKER_CLASS=gthread: an open availability stream holds
+# its thread while the client is connected, which would take a whole sync worker.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+workers = _env_int("GUNICORN_WORKERS", 2)
+threads = _env_int("GUNICORN_THREADS", 1)
+
+# Import the project once in the master and fork the workers from it. Nothing opens a
+# database or Redis connection at import time, so forked workers never share a socket.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Recycle workers now and then so slow leaks cannot build up; the jitter keeps them
+# from all restarting at once.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 200)
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server):
+    # Run Redis seeding queued by a `migrate` that could not reach Redis. Runs once, in the
+    # master; its DB connection is closed again so forked workers do not inherit it.
+    from django.db import connections
+
+    from booking.services import redis_setup
+
+    if redis_setup.seeding_pending():
+        seeded = redis_setup.seed_if_pending()
+        server.log.info("Queued Redis seeding %s", "still pending" if seeded is None else "done")
+        connections.close_all()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.middleware.InstrumentationMiddleware',
+    'booking.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -135,7 +138,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'booking.authentication.CachedJWTAuthentication',
     ],
 }
 
@@ -147,3 +150,79 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
 }
+
+# Booking horizon: how many days ahead (including today) can be booked and are kept seeded in Redis.
+BOOKING_AVAILABILITY_HORIZON_DAYS = int(os.getenv('BOOKING_AVAILABILITY_HORIZON_DAYS', 7))
+
+# Site used when a request does not name one; rooms that predate sites were assigned to it.
+BOOKING_DEFAULT_SITE = os.getenv('BOOKING_DEFAULT_SITE', 'hq')
+
+# After `migrate`, seed Redis availability for the horizon. If Redis cannot be reached the
+# seeding is queued in BOOKING_REDIS_SEED_PENDING_FILE and runs at the next startup.
+BOOKING_REDIS_SEED_AFTER_MIGRATE = os.getenv('BOOKING_REDIS_SEED_AFTER_MIGRATE', '1') == '1'
+BOOKING_REDIS_SEED_PENDING_FILE = os.getenv('BOOKING_REDIS_SEED_PENDING_FILE', str(BASE_DIR / '.redis_seed_pending'))
+
+# Slot granularity used by `manage.py generate_time_slots`.
+BOOKING_SLOT_MINUTES = int(os.getenv('BOOKING_SLOT_MINUTES', 60))
+BOOKING_DAY_START = '09:00'
+BOOKING_DAY_END = '18:00'
+
+# Bookings dated more than this many days ago are moved to booking_data_archive by `archive_bookings`.
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv('BOOKING_ARCHIVE_AFTER_DAYS', 90))
+
+# Token-bucket limits for booking writes (RATE per second, BURST at once) and the global
+# cap on bookings in flight. Rejections show up in the metrics endpoint.
+BOOKING_RATE_LIMITS = {
+    'ENABLED': os.getenv('BOOKING_RATE_LIMITS', '1') == '1',
+    'USER': {'RATE': 0.5, 'BURST': 5},
+    'TEAM': {'RATE': 1.0, 'BURST': 10},
+    'ENDPOINT': {'RATE': 200.0, 'BURST': 400},
+    'MAX_IN_FLIGHT': int(os.getenv('BOOKING_MAX_IN_FLIGHT', 100)),
+    'RETRY_AFTER': 1,
+}
+
+# Write-behind mode: book-room confirms in Redis and queues the Booking row on a Redis Stream
+# for `manage.py run_booking_writer` to insert in batches.
+BOOKING_WRITE_BEHIND = {
+    'ENABLED': os.getenv('BOOKING_WRITE_BEHIND', '') == '1',
+    'BATCH_SIZE': 200,
+    'CLAIM_IDLE_MS': 30000,
+}
+
+BOOKING_INSTRUMENTATION = {
+    'ENABLED': True,
+    # Lower in production to keep per-query timing overhead on a fraction of requests only.
+    'SAMPLE_RATE': float(os.getenv('BOOKING_INSTRUMENTATION_SAMPLE_RATE', 1.0)),
+    'SERVER_TIMING': True,
+    'LOG': True,
+    'METRICS_TOKEN': os.getenv('METRICS_TOKEN'),
+}
+
+BOOKING_PROFILING = {
+    # Off by default: the middleware removes itself and costs nothing.
+    'ENABLED': os.getenv('BOOKING_PROFILING', '') == '1',
+    'SLOW_THRESHOLD_MS': 1000,
+    'SAMPLE_RATE': 0.0,
+    # Requests sending this header with the token as its value are profiled with cProfile.
+    'HEADER': 'X-Profile',
+    'HEADER_TOKEN': os.getenv('BOOKING_PROFILING_TOKEN'),
+    'HEADER_SAMPLE_RATE': 1.0,
+    'DIRECTORY': 'profiles',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'booking.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
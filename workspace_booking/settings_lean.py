@@ -0,0 +1,39 @@
+"""
+Lean settings for API pods and cron/worker containers.
+
+Same as `settings`, minus the apps only the admin site and browser sessions need, so
+`django.setup()` imports and checks less. Select with
+DJANGO_SETTINGS_MODULE=workspace_booking.settings_lean; run the admin site and migrations
+with the full settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+LEAN_REMOVED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in LEAN_REMOVED_APPS]
+
+# The API authenticates with JWTs, so nothing needs a session or a request.user set by Django.
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    )
+]
+
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.contrib.messages.context_processors.messages'
+]
+
+# JSON only: skips loading the browsable API renderer and its templates.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}